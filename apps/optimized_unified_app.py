@@ -35,6 +35,7 @@ logger = logging.getLogger(__name__)
 try:
     from chatbot_pipeline import ChatbotPipeline
     from proposed_rag_system import ProposedRAGSystem
+    from config import RAG_SNAPSHOT_DIRECTORY
     from intent_classifier import IntentClassifier
     from entity_extractor import EntityExtractor
     from synonyms import SYNONYMS, canonicalize
@@ -292,8 +293,10 @@ def load_rag_system():
     
     try:
         rag = ProposedRAGSystem()
-        # Load documents if they exist
-        if os.path.exists("documents"):
+        # Restore a prebuilt snapshot if one is configured, else load documents if they exist
+        if RAG_SNAPSHOT_DIRECTORY and rag.load_snapshot(RAG_SNAPSHOT_DIRECTORY):
+            logger.info(f"✅ RAG system restored from snapshot {RAG_SNAPSHOT_DIRECTORY}")
+        elif os.path.exists("documents"):
             rag.ingest_directory("documents")
             logger.info("✅ RAG system loaded with documents")
         else:
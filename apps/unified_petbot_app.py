@@ -19,6 +19,7 @@ import numpy as np
 
 # Import your existing RAG components
 from rag_system.proposed_rag_system import ProposedRAGManager
+from config import RAG_SNAPSHOT_DIRECTORY, PET_EMBEDDING_DTYPE
 from chatbot_flow.chatbot_pipeline import ChatbotPipeline
 from chatbot_flow.intent_classifier import IntentClassifier
 from chatbot_flow.entity_extractor import EntityExtractor
@@ -26,7 +27,7 @@ from chatbot_flow.entity_extractor import EntityExtractor
 # Import Azure components
 from pet_retrieval.config import get_blob_settings, local_ner_dir, local_mr_dir, local_pets_csv_path
 from pet_retrieval.azure_io import download_prefix_flat, smart_download_single_blob
-from pet_retrieval.models import load_ner_pipeline, load_mr_model, load_faiss_index
+from pet_retrieval.models import load_ner_pipeline, load_mr_model, load_faiss_index, load_quantized_embeddings
 from pet_retrieval.retrieval import (
     only_text, BM25,
     parse_facets_from_text, entity_spans_to_facets, sanitize_facets_ner_light,
@@ -94,9 +95,11 @@ def bootstrap_rag_system():
         # Initialize RAG system
         rag = ProposedRAGManager()
         
-        # Load documents
+        # Restore a prebuilt snapshot if one is configured, else load documents
         documents_dir = os.path.join(project_root, "documents")
-        if os.path.exists(documents_dir):
+        if RAG_SNAPSHOT_DIRECTORY and rag.load_snapshot(RAG_SNAPSHOT_DIRECTORY):
+            st.info(f"RAG system restored from snapshot: {RAG_SNAPSHOT_DIRECTORY}")
+        elif os.path.exists(documents_dir):
             st.info(f"Loading documents from: {documents_dir}")
             result = rag.add_directory(documents_dir)
             st.info(f"Documents loaded: {result}")
@@ -125,9 +128,10 @@ def bootstrap_azure_components():
         
         # Load models
         ner = load_ner_pipeline(local_ner_dir())
-        student, doc_ids, doc_vecs = load_mr_model(local_mr_dir())
+        student, doc_ids, doc_vecs = load_mr_model(local_mr_dir(), mmap_embeddings=PET_EMBEDDING_DTYPE != "float32")
         model_dim = student.get_sentence_embedding_dimension()
         faiss_index = load_faiss_index(local_mr_dir(), model_dim)
+        quantized = load_quantized_embeddings(doc_vecs, PET_EMBEDDING_DTYPE)
         
         # Load pet data
         dfp = pd.read_csv(local_pets_csv_path())
@@ -141,12 +145,12 @@ def bootstrap_azure_components():
         breed_catalog = dfp["breed"].dropna().unique().tolist()
         breed_to_animal = dfp.groupby("breed")["animal"].first().to_dict()
         
-        return ner, student, doc_ids, doc_vecs, faiss_index, dfp, bm25, breed_catalog, breed_to_animal
+        return ner, student, doc_ids, doc_vecs, faiss_index, dfp, bm25, breed_catalog, breed_to_animal, quantized
         
     except Exception as e:
         st.warning(f"Azure components not available: {str(e)}")
         st.info("Pet search functionality will be limited. Please configure Azure credentials in Streamlit secrets for full functionality.")
-        return None, None, None, None, None, None, None, None, None
+        return None, None, None, None, None, None, None, None, None, None
 
 # -------------------------------------------
 # PET SEARCH FUNCTIONS
@@ -157,7 +161,7 @@ def perform_pet_search(query, _azure_components, topk=12):
     if _azure_components[0] is None:
         return None, "Pet search not available"
     
-    ner, student, doc_ids, doc_vecs, faiss_index, dfp, bm25, breed_catalog, breed_to_animal = _azure_components
+    ner, student, doc_ids, doc_vecs, faiss_index, dfp, bm25, breed_catalog, breed_to_animal, quantized = _azure_components
     
     try:
         # Process query - limit NER processing for speed
@@ -221,7 +225,8 @@ def perform_pet_search(query, _azure_components, topk=12):
         # Hybrid search: BM25 + embeddings
         bm25_results = bm25.search(only_text(query), topk=topk)
         bm25_scores = {idx: score for idx, score in bm25_results}
-        emb_results = emb_search(query, student, doc_ids, doc_vecs, pool_topn=topk, faiss_index=faiss_index)
+        emb_results = emb_search(query, student, doc_ids, doc_vecs, pool_topn=topk, faiss_index=faiss_index,
+                                 quantized=quantized)
         emb_scores = {idx: score for idx, score in emb_results}
         
         # Combine scores
@@ -14,7 +14,7 @@ import numpy as np
 
 from pet_retrieval.config import get_blob_settings, local_ner_dir, local_mr_dir, local_pets_csv_path
 from pet_retrieval.azure_io import download_prefix_flat, smart_download_single_blob
-from pet_retrieval.models import load_ner_pipeline, load_mr_model, load_faiss_index
+from pet_retrieval.models import load_ner_pipeline, load_mr_model, load_faiss_index, load_quantized_embeddings
 from pet_retrieval.retrieval import (
     only_text, BM25,
     parse_facets_from_text, entity_spans_to_facets, sanitize_facets_ner_light,
@@ -22,6 +22,7 @@ from pet_retrieval.retrieval import (
     emb_search, mmr_rerank  # mmr_rerank imported but unused (kept for compatibility)
 )
 from pet_retrieval.ui import sidebar_controls
+from config import PET_EMBEDDING_DTYPE
 
 # ---- Optional fuzzy breed mapping ----
 try:
@@ -278,7 +279,8 @@ def bootstrap_and_load():
         smart_download_single_blob(conn, cfg["pets_container"], cfg["pets_csv_blob"], local_pets_csv_path())
 
     ner = load_ner_pipeline(local_ner_dir())
-    student, doc_ids, doc_vecs = load_mr_model(local_mr_dir())
+    student, doc_ids, doc_vecs = load_mr_model(local_mr_dir(), mmap_embeddings=PET_EMBEDDING_DTYPE != "float32")
+    quantized = load_quantized_embeddings(doc_vecs, PET_EMBEDDING_DTYPE)
 
     faiss_index = load_faiss_index(local_mr_dir(), dim=doc_vecs.shape[1])
     if faiss_index is not None:
@@ -326,9 +328,9 @@ def bootstrap_and_load():
     if "breed" in dfp.columns:
         breed_catalog = sorted(set([b for b in dfp["breed"].astype(str).str.lower().tolist() if b]))
 
-    return ner, student, doc_ids, doc_vecs, faiss_index, dfp, bm25, breed_catalog, breed_to_animal
+    return ner, student, doc_ids, doc_vecs, faiss_index, dfp, bm25, breed_catalog, breed_to_animal, quantized
 
-ner, student, doc_ids, doc_vecs, faiss_index, dfp, bm25, breed_catalog, breed_to_animal = bootstrap_and_load()
+ner, student, doc_ids, doc_vecs, faiss_index, dfp, bm25, breed_catalog, breed_to_animal, quantized = bootstrap_and_load()
 
 st.title("🐾 PetBot — NER + Hybrid Search (Cards & Media)")
 
@@ -527,7 +529,7 @@ else:
     # 2) Embedding search over filtered pool
     emb_all = emb_search(
         boost_q, student, doc_ids, doc_vecs,
-        pool_topn=EMB_POOL, faiss_index=faiss_index
+        pool_topn=EMB_POOL, faiss_index=faiss_index, quantized=quantized
     )
     s_emb = {pid: s for pid, s in emb_all if pid in pool_ids}
 
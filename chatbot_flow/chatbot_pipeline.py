@@ -130,9 +130,11 @@ class ChatbotPipeline:
         if self.rag_system is None:
             return "🐾 I'd love to help with pet care questions! However, the RAG system is not available right now. Please try again later."
         
+        pet_type = self._pet_care_pet_type(user_input)
+
         try:
             # Use RAG system to get detailed answer
-            result = self.rag_system.ask(user_input)
+            result = self.rag_system.ask(user_input, pet_type=pet_type)
             answer = result.get('answer', 'Sorry, I couldn\'t find information about that.')
             confidence = result.get('confidence', 0)
             
@@ -171,6 +173,20 @@ class ChatbotPipeline:
             else:
                 return self._provide_fallback_pet_care_answer(user_input)
     
+    def _pet_care_pet_type(self, user_input: str):
+        """Species from this message or earlier in the conversation, used to route retrieval"""
+        try:
+            pet_type = self.ner_extractor.extract(user_input).get("PET_TYPE")
+        except Exception as e:
+            # A failed lookup only loses the routing hint, never the RAG answer
+            print(f"NER lookup failed for pet care question: {e}")
+            pet_type = None
+
+        pet_type = pet_type or self.session["entities"].get("PET_TYPE")
+        if pet_type:
+            self.session["entities"]["PET_TYPE"] = pet_type
+        return pet_type
+
     def _provide_fallback_pet_care_answer(self, user_input: str) -> str:
         """Provide fallback pet care answers when RAG system fails"""
         lower_input = user_input.lower()
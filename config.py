@@ -14,11 +14,73 @@ HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
 
 # Vector Database Settings
 CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+# Ingest manifests and BM25 indexes, one subdirectory per collection
+RAG_INDEX_DIRECTORY = os.getenv("RAG_INDEX_DIRECTORY", "./rag_index")
+# Dense backend: "chroma" (persistent ChromaDB) or "local" (in-process NumPy/FAISS index under RAG_INDEX_DIRECTORY)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# Local backend search: "numpy" (brute force), "flat" or "hnsw" (FAISS, falls back to numpy if not installed)
+LOCAL_INDEX_TYPE = os.getenv("LOCAL_INDEX_TYPE", "numpy")
+# Local backend in-memory precision: "float32", or "float16"/"int8" (quantized search, float32 re-scoring from disk)
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32")
+# Pet search embeddings in memory: "float32", or "float16"/"int8" (quantized search, float32 re-scoring from disk)
+PET_EMBEDDING_DTYPE = os.getenv("PET_EMBEDDING_DTYPE", "float32")
+# Prebuilt snapshot the apps restore from instead of ingesting documents (unset = always ingest)
+RAG_SNAPSHOT_DIRECTORY = os.getenv("RAG_SNAPSHOT_DIRECTORY")
 
 # Document Processing Settings
 CHUNK_SIZE = 2000  # Increased to keep related content together
 CHUNK_OVERLAP = 300  # Increased overlap for better context
 MAX_CHUNKS = 5
+# "characters" (CHUNK_SIZE/CHUNK_OVERLAP characters) or "tokens" (sized with the encoder's own tokenizer)
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "characters")
+# Hugging Face model whose tokenizer and max_seq_length size chunks in "tokens" mode
+CHUNK_TOKENIZER_MODEL = os.getenv("CHUNK_TOKENIZER_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# Tokens per chunk in "tokens" mode (0 = the model's max_seq_length) and tokens shared by neighbouring chunks
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "0"))
+CHUNK_TOKEN_OVERLAP = int(os.getenv("CHUNK_TOKEN_OVERLAP", "32"))
+# Processes used to load and chunk files at ingest (1 = serial, 0 = one per CPU)
+DOCUMENT_LOADER_WORKERS = int(os.getenv("DOCUMENT_LOADER_WORKERS", "1"))
+# Chunks embedded and indexed together during ingest; bounds memory for large corpora
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "4096"))
+# Processes used to extract the pages of one large PDF (1 = serial, 0 = one per CPU)
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", "1"))
+# Extracted PDF text, keyed by file content hash, so a PDF is only parsed once (empty = no cache)
+PDF_TEXT_CACHE_DIRECTORY = os.getenv("PDF_TEXT_CACHE_DIRECTORY", os.path.join(RAG_INDEX_DIRECTORY, "pdf_text"))
+# Index small child passages of each chunk for retrieval and reranking; the generator gets the parent chunk
+PARENT_CHILD_CHUNKS = os.getenv("PARENT_CHILD_CHUNKS", "False").lower() == "true"
+# Characters per child passage and characters shared by neighbouring children
+CHILD_CHUNK_SIZE = int(os.getenv("CHILD_CHUNK_SIZE", "400"))
+CHILD_CHUNK_OVERLAP = int(os.getenv("CHILD_CHUNK_OVERLAP", "50"))
+# Drop a chunk at ingest when an indexed chunk is this similar (MinHash estimate of word-shingle Jaccard; 0 = keep all)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0"))
+
+# BM25 Settings
+# Processes used to tokenize documents at ingest (1 = serial, 0 = one per CPU)
+BM25_TOKENIZER_WORKERS = int(os.getenv("BM25_TOKENIZER_WORKERS", "1"))
+
+# Retrieval Settings
+# Per-retriever time budget for BM25 and dense search in hybrid retrieval
+RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "10"))
+# Two-stage retrieval: pick this many source documents first, then search only their chunks (0 = flat search)
+TWO_STAGE_TOP_DOCUMENTS = int(os.getenv("TWO_STAGE_TOP_DOCUMENTS", "0"))
+
+# Embedding Settings
+# Processes used to encode chunks at ingest with SentenceTransformer (1 = in-process, 0 = one per CPU)
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+# Chunks per encoder forward pass
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# OpenAI-compatible API root for embeddings (unset = api.openai.com)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+# Ingest-time OpenAI embedding requests: texts per request, requests in flight, sustained request rate
+OPENAI_EMBEDDING_BATCH_SIZE = int(os.getenv("OPENAI_EMBEDDING_BATCH_SIZE", "256"))
+OPENAI_EMBEDDING_CONCURRENCY = int(os.getenv("OPENAI_EMBEDDING_CONCURRENCY", "8"))
+OPENAI_EMBEDDING_RPM = float(os.getenv("OPENAI_EMBEDDING_RPM", "3000"))
+
+# Query Embedding Cache
+# Number of query embeddings kept in memory (0 disables the cache)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+# Directory the cache is persisted to across restarts, one file per collection (unset = memory only)
+QUERY_EMBEDDING_CACHE_DIRECTORY = os.getenv("QUERY_EMBEDDING_CACHE_DIRECTORY")
 
 # LLM Settings
 DEFAULT_MODEL = "gpt-3.5-turbo"
@@ -43,11 +43,13 @@ def _build_sentence_transformer_from_hf_folder(model_dir: str):
     )
     return SentenceTransformer(modules=[word_emb, pooling])
 
-def load_mr_model(local_mr_dir: str) -> Tuple[Any, np.ndarray, np.ndarray]:
+def load_mr_model(local_mr_dir: str, mmap_embeddings: bool = False) -> Tuple[Any, np.ndarray, np.ndarray]:
     """
     Returns: (sentence_transformer_model, doc_ids, doc_vecs)
     Always builds ST from local HF files to avoid any repo-id validation.
     Requires doc_ids.npy and doc_embeddings.npy in the same folder.
+    mmap_embeddings=True memory-maps float32 doc_vecs instead of loading them
+    (pair with a quantized copy for emb_search).
     """
     ids_path = os.path.join(local_mr_dir, "doc_ids.npy")
     emb_path = os.path.join(local_mr_dir, "doc_embeddings.npy")
@@ -60,9 +62,24 @@ def load_mr_model(local_mr_dir: str) -> Tuple[Any, np.ndarray, np.ndarray]:
     student = _build_sentence_transformer_from_hf_folder(local_mr_dir)
 
     doc_ids = np.load(ids_path)
-    doc_vecs = np.load(emb_path).astype("float32")
+    if mmap_embeddings:
+        doc_vecs = np.load(emb_path, mmap_mode="r")
+        if doc_vecs.dtype != np.float32:
+            doc_vecs = doc_vecs.astype("float32")
+    else:
+        doc_vecs = np.load(emb_path).astype("float32")
     return student, doc_ids, doc_vecs
 
+def load_quantized_embeddings(doc_vecs: np.ndarray, dtype: str = "float32") -> Optional[Any]:
+    """
+    float16/int8 copy of doc_vecs for emb_search(quantized=...).
+    Returns None for "float32" (search doc_vecs directly).
+    """
+    if dtype == "float32":
+        return None
+    from rag_system.quantization import QuantizedVectors
+    return QuantizedVectors(doc_vecs, dtype)
+
 def load_faiss_index(local_mr_dir: str, dim: int) -> Optional[Any]:
     """
     Load FAISS index if present (pets_hnsw.index / pets_flat.index / faiss.index).
@@ -191,13 +191,19 @@ def emb_search(
     doc_vecs: np.ndarray,
     pool_topn: int = 200,
     faiss_index = None,
+    quantized = None,
 ) -> List[Tuple[int, float]]:
+    # quantized: optional float16/int8 copy of doc_vecs (rag_system.quantization.QuantizedVectors);
+    # candidates are ranked on it and re-scored exactly against doc_vecs, which may be memory-mapped
     qv = student.encode([q], convert_to_numpy=True, normalize_embeddings=True)[0].astype("float32")
     if faiss_index is not None:
         hits = ann_search_faiss(faiss_index, qv, pool_topn)
         # FAISS returns positions; convert to pet IDs if your index was built on doc_vecs in same order
         # If index was built on doc_vecs directly: ids = doc_ids[idx]
         return [(int(doc_ids[i]), float(s)) for (i, s) in hits]
+    if quantized is not None:
+        idx, sims = quantized.search(qv, pool_topn, doc_vecs)
+        return [(int(doc_ids[i]), float(s)) for i, s in zip(idx, sims)]
     # brute force
     sims = doc_vecs @ qv
     if pool_topn < sims.shape[0]:
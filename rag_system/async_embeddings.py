@@ -0,0 +1,155 @@
+"""
+Concurrent, rate-limited OpenAI embedding client
+"""
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class _TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, bursts up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AsyncOpenAIEmbeddings:
+    """
+    OpenAI embeddings with several batch requests in flight at once
+
+    Texts are split into batches; up to ``max_concurrency`` batches are sent
+    concurrently, request starts are paced by a token bucket of
+    ``requests_per_minute``, and 429/5xx responses and transport errors are
+    retried with jittered exponential backoff (honouring ``Retry-After``).
+    Results are returned in input order. Implements the LangChain embeddings
+    interface (``embed_documents`` / ``embed_query``), so it can be handed to
+    the vector store directly. ``base_url`` points it at any OpenAI-compatible
+    server, e.g. a local stand-in for tests.
+    """
+
+    def __init__(self, api_key: str, model: str, base_url: Optional[str] = None,
+                 batch_size: int = 256, max_concurrency: int = 8, requests_per_minute: float = 3000,
+                 max_retries: int = 6, initial_backoff: float = 1.0, max_backoff: float = 30.0,
+                 timeout: float = 60.0):
+        """
+        Initialize the client
+
+        Args:
+            api_key: OpenAI API key
+            model: Embedding model name
+            base_url: API root (defaults to the public OpenAI endpoint)
+            batch_size: Texts per request
+            max_concurrency: Requests in flight at once
+            requests_per_minute: Sustained request rate
+            max_retries: Retries per batch before giving up
+            initial_backoff: First retry delay in seconds, doubled on every retry
+            max_backoff: Upper bound on a single retry delay
+            timeout: Per-request timeout in seconds
+        """
+        self.api_key = api_key
+        self.model = model
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip('/')
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Delay before retry number ``attempt`` (0-based)"""
+        if response is not None:
+            retry_after = response.headers.get('retry-after')
+            if retry_after:
+                try:
+                    return min(self.max_backoff, float(retry_after))
+                except ValueError:
+                    pass
+        delay = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+        # Full jitter spreads out the retries of batches that failed together
+        return random.uniform(0, delay)
+
+    async def _embed_batch(self, client: httpx.AsyncClient, texts: List[str],
+                           semaphore: asyncio.Semaphore, bucket: _TokenBucket) -> List[List[float]]:
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await bucket.acquire()
+                response = None
+                try:
+                    response = await client.post("/embeddings", json={'model': self.model, 'input': texts})
+                except httpx.TransportError as e:
+                    error = f"{type(e).__name__}: {e}"
+                else:
+                    if response.status_code not in RETRYABLE_STATUS and response.status_code < 500:
+                        response.raise_for_status()
+                        data = sorted(response.json()['data'], key=lambda item: item['index'])
+                        if len(data) != len(texts):
+                            raise ValueError(f"Expected {len(texts)} embeddings, got {len(data)}")
+                        return [item['embedding'] for item in data]
+                    error = f"HTTP {response.status_code}"
+
+                if attempt == self.max_retries:
+                    raise RuntimeError(f"Embedding request failed after {attempt + 1} attempts: {error}")
+                delay = self._backoff(attempt, response)
+                logger.warning(f"Embedding request failed ({error}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts concurrently, returning vectors in input order"""
+        if not texts:
+            return []
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        bucket = _TokenBucket(self.requests_per_minute / 60.0, self.max_concurrency)
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+
+        start = time.time()
+        async with httpx.AsyncClient(base_url=self.base_url, headers=headers, timeout=self.timeout) as client:
+            results = await asyncio.gather(*(self._embed_batch(client, batch, semaphore, bucket)
+                                             for batch in batches))
+        elapsed = time.time() - start
+
+        logger.info(f"Embedded {len(texts)} texts in {len(batches)} requests in {elapsed:.1f}s")
+        return [vector for batch in results for vector in batch]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Synchronous wrapper around ``aembed_documents``"""
+        coroutine = self.aembed_documents(texts)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        # Called from inside an event loop: run on a private loop in a worker thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query"""
+        return self.embed_documents([text])[0]
@@ -0,0 +1,709 @@
+"""
+Inverted-index BM25 engine for the proposed RAG configuration
+"""
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import sys
+from array import array
+from collections.abc import Mapping
+from itertools import accumulate, islice
+from typing import AbstractSet, List, Dict, Tuple, Iterable, Iterator, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+META_FILE = "meta.json"
+TERMS_FILE = "terms.bin"
+POSTINGS_FILE = "postings.bin"
+DOC_LENS_FILE = "doc_lens.bin"
+
+
+class DocumentSubset:
+    """
+    A fixed set of document ids to rank within, e.g. a metadata partition
+
+    Holds the ids sorted and as a membership mask over the index's document
+    slots, so each posting list can be cut down to the subset without
+    looking at its other entries one by one. Build a new subset after
+    documents are appended or the index is compacted.
+    """
+
+    def __init__(self, doc_ids: Iterable[int], n_slots: int):
+        """
+        Args:
+            doc_ids: Document ids in the subset
+            n_slots: Number of document slots in the index (``len(index.doc_len)``)
+        """
+        self.ids = np.unique(np.fromiter(doc_ids, dtype=np.int64))
+        self.ids = self.ids[(self.ids >= 0) & (self.ids < n_slots)]
+        self.mask = np.zeros(n_slots, dtype=bool)
+        self.mask[self.ids] = True
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, doc_id) -> bool:
+        return 0 <= doc_id < len(self.mask) and bool(self.mask[doc_id])
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids.tolist())
+
+    def select(self, doc_ids: array) -> np.ndarray:
+        """Positions, ascending, of the entries of a sorted posting list that fall in the subset"""
+        postings = np.frombuffer(doc_ids, dtype=np.intc) if len(doc_ids) else np.zeros(0, dtype=np.intc)
+        if len(postings) > len(self.mask) or (len(postings) and postings[-1] >= len(self.mask)):
+            # Posting list newer than the subset; only its in-range part can match
+            postings = postings[:np.searchsorted(postings, len(self.mask))]
+        # A small subset is looked up in the posting list by binary search, a
+        # large one is checked with the mask; both skip the Python-level loop
+        if len(self.ids) * max(1, int(math.log2(len(postings) + 1))) < len(postings):
+            positions = np.searchsorted(postings, self.ids)
+            found = positions < len(postings)
+            positions = positions[found]
+            return positions[postings[positions] == self.ids[found]]
+        return np.flatnonzero(self.mask[postings])
+
+
+class BM25Index:
+    """BM25 (Okapi) scorer built on postings lists with precomputed term weights.
+
+    Produces exactly the same scores and ranking as ``rank_bm25.BM25Okapi``,
+    but a query only touches the postings of its own terms instead of scoring
+    every document in the corpus.
+
+    Documents can be appended and deleted in place. Deletes only tombstone the
+    document; ``compact`` rewrites the postings without them and renumbers the
+    remaining documents.
+    """
+
+    def __init__(self, tokenized_docs: List[List[str]], k1: float = 1.5, b: float = 0.75,
+                 epsilon: float = 0.25):
+        """
+        Build the index
+
+        Args:
+            tokenized_docs: Tokenized documents, one list of tokens per document
+            k1: Term frequency saturation parameter
+            b: Document length normalization parameter
+            epsilon: Floor for negative IDF values, as a fraction of the average IDF
+        """
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self._reset()
+
+        for tokens in tokenized_docs:
+            self._index_document(tokens)
+        self._refresh()
+        self.precompute_weights()
+
+    def _reset(self):
+        """Clear all postings and statistics"""
+        # term -> (doc ids, term frequencies); insertion order is first appearance
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.doc_freq: Dict[str, int] = {}
+        self.doc_terms: List[Tuple[str, ...]] = []
+        self.doc_len = array('i')
+        self.deleted: Set[int] = set()
+        self.total_len = 0
+        self.avgdl = 0.0
+        self.idf: Dict[str, float] = {}
+        self.average_idf = 0.0
+        # term -> (doc ids, weights) for terms scored since the last refresh
+        self.weights: Dict[str, Tuple[array, array]] = {}
+        self._norms: List[float] = []
+        # (term -> row, CSR term x document weights) for batched scoring
+        self._weight_matrix = None
+        self._dirty = False
+
+    @property
+    def corpus_size(self) -> int:
+        """Number of live (non-deleted) documents in the index"""
+        return len(self.doc_len) - len(self.deleted)
+
+    @property
+    def deleted_ratio(self) -> float:
+        """Fraction of document slots occupied by tombstones"""
+        return len(self.deleted) / len(self.doc_len) if len(self.doc_len) else 0.0
+
+    def _index_document(self, tokens: List[str]) -> int:
+        """Append a document to the postings lists and return its id"""
+        frequencies: Dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        return self._index_frequencies(frequencies, len(tokens))
+
+    def _index_frequencies(self, frequencies: Dict[str, int], length: int) -> int:
+        """Append a document given its term frequencies and token count"""
+        self._ensure_writable()
+        doc_id = len(self.doc_len)
+        for term, freq in frequencies.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = (array('i'), array('i'))
+                self.postings[term] = posting
+            posting[0].append(doc_id)
+            posting[1].append(freq)
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+
+        self.doc_terms.append(tuple(frequencies))
+        self.doc_len.append(length)
+        self.total_len += length
+        return doc_id
+
+    def add_documents(self, tokenized_docs: List[List[str]]) -> List[int]:
+        """
+        Append documents without rebuilding the index
+
+        Args:
+            tokenized_docs: Tokenized documents to add
+
+        Returns:
+            Ids assigned to the new documents
+        """
+        doc_ids = [self._index_document(tokens) for tokens in tokenized_docs]
+        self._dirty = True
+        return doc_ids
+
+    def add_term_frequencies(self, doc_stats: Iterable[Tuple[Dict[str, int], int]]) -> List[int]:
+        """
+        Append documents from precomputed statistics
+
+        Used to merge the partial results of parallel tokenization. Term
+        order within each frequency dict must be first-appearance order for
+        the result to be identical to ``add_documents``.
+
+        Args:
+            doc_stats: (term -> frequency, token count) per document
+
+        Returns:
+            Ids assigned to the new documents
+        """
+        doc_ids = [self._index_frequencies(frequencies, length) for frequencies, length in doc_stats]
+        self._dirty = True
+        return doc_ids
+
+    def precompute_weights(self):
+        """Fill the term weight cache for every term (done once after a bulk build)"""
+        if self._dirty:
+            self._refresh()
+        for term in self.doc_freq:
+            self._term_weights(term)
+
+    def delete_documents(self, doc_ids: List[int]):
+        """
+        Tombstone documents so they no longer match or count towards statistics
+
+        Args:
+            doc_ids: Ids of the documents to delete
+        """
+        self._ensure_writable()
+        for doc_id in doc_ids:
+            if doc_id in self.deleted or not 0 <= doc_id < len(self.doc_len):
+                continue
+            self.deleted.add(doc_id)
+            self.total_len -= self.doc_len[doc_id]
+            for term in self.doc_terms[doc_id]:
+                df = self.doc_freq[term] - 1
+                if df:
+                    self.doc_freq[term] = df
+                else:
+                    del self.doc_freq[term]
+        self._dirty = True
+
+    def _ensure_writable(self):
+        """Copy a memory-mapped index into in-memory postings before mutating it"""
+        if not isinstance(self.postings, _MappedPostings):
+            return
+
+        postings: Dict[str, Tuple[array, array]] = {}
+        doc_terms: List[List[str]] = [[] for _ in range(len(self.doc_len))]
+        for term, (doc_ids, freqs) in self.postings.items():
+            postings[term] = (doc_ids, freqs)
+            for doc_id in doc_ids:
+                doc_terms[doc_id].append(term)
+
+        self.postings = postings
+        self.doc_terms = [tuple(terms) for terms in doc_terms]
+        self.doc_len = array('i', self.doc_len)
+        self.weights = {}
+        self._dirty = True
+
+    def compact(self) -> List[int]:
+        """
+        Drop tombstoned documents from the postings and renumber the rest
+
+        Returns:
+            Old ids of the surviving documents; position in the list is the new id
+        """
+        kept = [doc_id for doc_id in range(len(self.doc_len)) if doc_id not in self.deleted]
+        if len(kept) == len(self.doc_len):
+            return kept
+
+        new_ids = {old_id: new_id for new_id, old_id in enumerate(kept)}
+        postings: Dict[str, Tuple[array, array]] = {}
+        for term, (doc_ids, freqs) in self.postings.items():
+            if term not in self.doc_freq:
+                continue
+            posting = (array('i'), array('i'))
+            for doc_id, freq in zip(doc_ids, freqs):
+                new_id = new_ids.get(doc_id)
+                if new_id is not None:
+                    posting[0].append(new_id)
+                    posting[1].append(freq)
+            postings[term] = posting
+
+        self.postings = postings
+        self.doc_terms = [self.doc_terms[doc_id] for doc_id in kept]
+        self.doc_len = array('i', [self.doc_len[doc_id] for doc_id in kept])
+        self.deleted = set()
+        self._refresh()
+
+        logger.info(f"BM25 index compacted to {len(kept)} documents")
+        return kept
+
+    def _compute_idf(self):
+        """Compute Okapi IDF values, flooring negative ones at epsilon * average IDF"""
+        n_docs = self.corpus_size
+        self.idf = {}
+        idf_sum = 0.0
+        negative_idfs = []
+        for term, df in self.doc_freq.items():
+            idf = math.log(n_docs - df + 0.5) - math.log(df + 0.5)
+            self.idf[term] = idf
+            idf_sum += idf
+            if idf < 0:
+                negative_idfs.append(term)
+
+        self.average_idf = idf_sum / len(self.idf) if self.idf else 0.0
+        eps = self.epsilon * self.average_idf
+        for term in negative_idfs:
+            self.idf[term] = eps
+
+    def _refresh(self):
+        """Recompute corpus statistics and drop cached term weights
+
+        Weights are recomputed lazily, per query term, after an update.
+        """
+        self.avgdl = self.total_len / self.corpus_size if self.corpus_size else 0.0
+        self._compute_idf()
+
+        k1, b, avgdl = self.k1, self.b, self.avgdl
+        if avgdl:
+            self._norms = [k1 * (1 - b + b * dl / avgdl) for dl in self.doc_len]
+        else:
+            self._norms = []
+        self.weights = {}
+        self._weight_matrix = None
+        self._dirty = False
+
+    def _term_weights(self, term: str) -> Optional[Tuple[array, array]]:
+        """Return (and cache) the doc ids and BM25 contribution of each posting of a term"""
+        cached = self.weights.get(term)
+        if cached is not None:
+            return cached
+
+        idf = self.idf.get(term)
+        if idf is None or not self._norms:
+            # Unknown term, only present in deleted documents, or all documents empty
+            return None
+
+        doc_ids, freqs = self.postings[term]
+        norms = self._norms
+        k1_plus_1 = self.k1 + 1
+        weights = array('d', [
+            idf * (freq * k1_plus_1 / (freq + norms[doc_id]))
+            for doc_id, freq in zip(doc_ids, freqs)
+        ])
+        self.weights[term] = (doc_ids, weights)
+        return doc_ids, weights
+
+    def _accumulate(self, query_tokens: List[str], subset: Optional[DocumentSubset] = None) -> Dict[int, float]:
+        """
+        Sum term weights for every live document that contains a query term
+
+        With ``subset``, only the postings of its documents are read, so a
+        small partition costs a fraction of a global search. Each document's
+        terms are summed in the same order either way, so scores are identical.
+        """
+        if self._dirty:
+            self._refresh()
+
+        scores: Dict[int, float] = {}
+        for token in query_tokens:
+            term_weights = self._term_weights(token)
+            if term_weights is None:
+                continue
+            doc_ids, weights = term_weights
+            if subset is not None:
+                positions = subset.select(doc_ids)
+                if not len(positions):
+                    continue
+                doc_ids = np.frombuffer(doc_ids, dtype=np.intc)[positions].tolist()
+                weights = np.frombuffer(weights, dtype=np.float64)[positions].tolist()
+            for doc_id, weight in zip(doc_ids, weights):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+
+        for doc_id in self.deleted.intersection(scores):
+            del scores[doc_id]
+        return scores
+
+    def get_scores(self, query_tokens: List[str]) -> List[float]:
+        """Score every document slot (drop-in for ``BM25Okapi.get_scores``)"""
+        scores = [0.0] * len(self.doc_len)
+        for doc_id, score in self._accumulate(query_tokens).items():
+            scores[doc_id] = score
+        return scores
+
+    def top_k(self, query_tokens: List[str], k: int = 10,
+              allowed: Optional[AbstractSet[int]] = None) -> List[Tuple[int, float]]:
+        """
+        Return the ``k`` best (doc_id, score) pairs
+
+        Ranking matches a stable descending sort over all document scores:
+        ties keep ascending doc id order and documents without any query term
+        fill the remaining slots with a score of 0.0. Deleted documents are
+        never returned. With ``allowed``, only those documents are ranked
+        and only their postings are read (corpus statistics stay global);
+        pass a ``DocumentSubset`` to reuse it across queries.
+        """
+        if k <= 0 or not self.corpus_size:
+            return []
+
+        if allowed is not None and not isinstance(allowed, DocumentSubset):
+            allowed = DocumentSubset(allowed, len(self.doc_len))
+        scores = self._accumulate(query_tokens, allowed)
+        matched = heapq.nsmallest(k, ((-score, doc_id) for doc_id, score in scores.items()))
+        if len(matched) >= k and matched[-1][0] < 0:
+            return [(doc_id, -neg_score) for neg_score, doc_id in matched]
+
+        deleted = self.deleted
+        candidates = range(len(self.doc_len)) if allowed is None else allowed
+        unmatched: Iterator[Tuple[float, int]] = (
+            (0.0, doc_id) for doc_id in candidates
+            if doc_id not in scores and doc_id not in deleted
+        )
+        merged = islice(heapq.merge(matched, unmatched), k)
+        return [(doc_id, -neg_score if neg_score else 0.0) for neg_score, doc_id in merged]
+
+    def _get_weight_matrix(self):
+        """
+        Build (and cache) the BM25 weight matrix over live documents
+
+        Stored term-major, i.e. the transpose of the document x term matrix,
+        as CSR so ``queries @ matrix`` is a single sparse product.
+        """
+        if self._dirty:
+            self._refresh()
+        if self._weight_matrix is not None:
+            return self._weight_matrix
+
+        from scipy.sparse import csr_matrix
+
+        term_rows: Dict[str, int] = {}
+        rows, cols, data = [], [], []
+        deleted = self.deleted
+        for row, term in enumerate(self.doc_freq):
+            term_rows[term] = row
+            term_weights = self._term_weights(term)
+            if term_weights is None:
+                continue
+            doc_ids, weights = term_weights
+            for doc_id, weight in zip(doc_ids, weights):
+                if doc_id not in deleted:
+                    rows.append(row)
+                    cols.append(doc_id)
+                    data.append(weight)
+
+        matrix = csr_matrix(
+            (np.asarray(data, dtype=np.float64), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+            shape=(len(term_rows), len(self.doc_len))
+        )
+        self._weight_matrix = (term_rows, matrix)
+        return self._weight_matrix
+
+    def top_k_batch(self, queries: List[List[str]], k: int = 10,
+                    block_size: int = 256) -> List[List[Tuple[int, float]]]:
+        """
+        Score many tokenized queries in one sparse matrix product
+
+        Builds a sparse query x term count matrix, multiplies it by the cached
+        CSR term x document weight matrix and selects the top ``k`` of every
+        row with ``argpartition``. Rankings follow the same rules as ``top_k``
+        (ties by ascending doc id, zero-score padding, no deleted documents);
+        scores agree with ``top_k`` up to floating point summation order.
+
+        Args:
+            queries: Tokenized queries
+            k: Number of results per query
+            block_size: Queries densified at once, bounding memory to
+                ``block_size`` x documents scores
+
+        Returns:
+            One list of (doc_id, score) pairs per query; empty for queries
+            without tokens
+        """
+        from scipy.sparse import csr_matrix
+
+        results: List[List[Tuple[int, float]]] = [[] for _ in queries]
+        k = min(k, self.corpus_size)
+        if k <= 0 or not queries:
+            return results
+
+        term_rows, weight_matrix = self._get_weight_matrix()
+        n_slots = len(self.doc_len)
+        deleted_ids = np.fromiter(self.deleted, dtype=np.int64, count=len(self.deleted))
+
+        rows, cols = [], []
+        active = []
+        for row, tokens in enumerate(queries):
+            if not tokens:
+                continue
+            active.append(row)
+            for token in tokens:
+                column = term_rows.get(token)
+                if column is not None:
+                    rows.append(len(active) - 1)
+                    cols.append(column)
+
+        # Duplicate (row, column) entries are summed, so repeated query terms count twice
+        query_matrix = csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+            shape=(len(active), len(term_rows))
+        )
+
+        for start in range(0, len(active), block_size):
+            scores = (query_matrix[start:start + block_size] @ weight_matrix).toarray()
+            if len(deleted_ids):
+                scores[:, deleted_ids] = -np.inf
+
+            if k < n_slots:
+                candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                candidates = np.tile(np.arange(n_slots), (len(scores), 1))
+            candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+
+            # argpartition breaks ties at the k-th score arbitrarily; rows where
+            # some tied documents were left out are re-ranked with a stable sort
+            kth = candidate_scores.min(axis=1, keepdims=True)
+            incomplete = (scores >= kth).sum(axis=1) != k
+            if incomplete.any():
+                stable = np.argsort(-scores[incomplete], axis=1, kind='stable')[:, :k]
+                candidates[incomplete] = stable
+                candidate_scores[incomplete] = np.take_along_axis(scores[incomplete], stable, axis=1)
+
+            order = np.lexsort((candidates, -candidate_scores), axis=1)
+            candidates = np.take_along_axis(candidates, order, axis=1)
+            candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+            for offset, (doc_ids, doc_scores) in enumerate(zip(candidates.tolist(), candidate_scores.tolist())):
+                results[active[start + offset]] = list(zip(doc_ids, doc_scores))
+
+        return results
+
+    def save(self, path: str):
+        """
+        Write the index to ``path`` in the on-disk format read by ``load``
+
+        The directory holds ``meta.json`` (parameters and sizes), ``terms.bin``
+        (term dictionary: per term its UTF-8 bytes, document frequency and
+        postings size, all varint-prefixed), ``postings.bin`` (per term:
+        delta-encoded doc ids and term frequencies as varints) and
+        ``doc_lens.bin`` (little-endian int32 document lengths).
+        Files are replaced atomically so processes that still have the previous
+        version mapped keep reading consistent data.
+
+        Args:
+            path: Target directory, created if missing
+        """
+        if self.deleted:
+            raise ValueError("Index has deleted documents; call compact() before saving")
+
+        os.makedirs(path, exist_ok=True)
+
+        postings_buf = bytearray()
+        terms_buf = bytearray()
+        for term, df in self.doc_freq.items():
+            doc_ids, freqs = self.postings[term]
+            offset = len(postings_buf)
+            previous = 0
+            for doc_id, freq in zip(doc_ids, freqs):
+                _encode_varint(doc_id - previous, postings_buf)
+                _encode_varint(freq, postings_buf)
+                previous = doc_id
+
+            term_bytes = term.encode('utf-8')
+            _encode_varint(len(term_bytes), terms_buf)
+            terms_buf += term_bytes
+            _encode_varint(df, terms_buf)
+            _encode_varint(len(postings_buf) - offset, terms_buf)
+
+        doc_lens = array('i', self.doc_len)
+        if sys.byteorder != 'little':
+            doc_lens.byteswap()
+
+        meta = {
+            'format_version': INDEX_FORMAT_VERSION,
+            'k1': self.k1,
+            'b': self.b,
+            'epsilon': self.epsilon,
+            'num_docs': len(self.doc_len),
+            'total_len': self.total_len,
+            'num_terms': len(self.doc_freq),
+            'postings_bytes': len(postings_buf),
+        }
+
+        _write_atomic(os.path.join(path, TERMS_FILE), bytes(terms_buf))
+        _write_atomic(os.path.join(path, POSTINGS_FILE), bytes(postings_buf))
+        _write_atomic(os.path.join(path, DOC_LENS_FILE), doc_lens.tobytes())
+        _write_atomic(os.path.join(path, META_FILE), json.dumps(meta).encode('utf-8'))
+
+        logger.info(f"BM25 index saved to {path}: {len(self.doc_freq)} terms, "
+                    f"{len(self.doc_len)} documents, {len(postings_buf)} postings bytes")
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """
+        Open an index written by ``save``
+
+        Postings and document lengths are memory-mapped read-only, so opening
+        the index costs a file open plus reading the term dictionary, and
+        processes that load the same files share their pages. Postings are
+        decoded on demand per query term. The first update copies the index
+        into memory.
+
+        Args:
+            path: Directory passed to ``save``
+
+        Returns:
+            Loaded index
+        """
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        if meta.get('format_version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index format version: {meta.get('format_version')}")
+
+        postings_map = _map_file(os.path.join(path, POSTINGS_FILE))
+        doc_lens_map = _map_file(os.path.join(path, DOC_LENS_FILE))
+        if len(postings_map) != meta['postings_bytes'] or len(doc_lens_map) != 4 * meta['num_docs']:
+            raise ValueError(f"BM25 index files in {path} do not match meta.json")
+
+        index = cls.__new__(cls)
+        index.k1 = meta['k1']
+        index.b = meta['b']
+        index.epsilon = meta['epsilon']
+        index._reset()
+
+        if sys.byteorder == 'little':
+            index.doc_len = memoryview(doc_lens_map).cast('i')
+        else:
+            index.doc_len = array('i', bytes(doc_lens_map))
+            index.doc_len.byteswap()
+
+        with open(os.path.join(path, TERMS_FILE), 'rb') as f:
+            terms_buf = f.read()
+
+        directory = {}
+        offset = 0
+        pos = 0
+        while pos < len(terms_buf):
+            term_len, pos = _read_varint(terms_buf, pos)
+            term = terms_buf[pos:pos + term_len].decode('utf-8')
+            df, pos = _read_varint(terms_buf, pos + term_len)
+            length, pos = _read_varint(terms_buf, pos)
+            index.doc_freq[term] = df
+            directory[term] = (offset, length)
+            offset += length
+
+        if len(directory) != meta['num_terms'] or offset != meta['postings_bytes']:
+            raise ValueError(f"BM25 term dictionary in {path} does not match meta.json")
+        index.postings = _MappedPostings(postings_map, directory)
+        index.total_len = meta['total_len']
+        index._refresh()
+
+        logger.info(f"BM25 index loaded from {path}: {len(directory)} terms, {meta['num_docs']} documents")
+        return index
+
+
+def _encode_varint(value: int, out: bytearray):
+    """Append ``value`` to ``out`` as an unsigned LEB128 varint"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Read one unsigned LEB128 varint at ``pos``; returns (value, next position)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _decode_varints(data: bytes) -> List[int]:
+    """Decode a run of unsigned LEB128 varints"""
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = 0
+            shift = 0
+    return values
+
+
+def _write_atomic(file_path: str, data: bytes):
+    """Write ``data`` to a temporary file and rename it over ``file_path``"""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+
+
+def _map_file(file_path: str):
+    """Memory-map a file read-only (empty files map to an empty bytes object)"""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _MappedPostings(Mapping):
+    """Read-only term -> (doc ids, term frequencies) view over a mapped postings file"""
+
+    def __init__(self, buffer, directory: Dict[str, Tuple[int, int]]):
+        self._buffer = buffer
+        self._directory = directory
+
+    def __getitem__(self, term: str) -> Tuple[array, array]:
+        offset, length = self._directory[term]
+        values = _decode_varints(self._buffer[offset:offset + length])
+        doc_ids = array('i', accumulate(values[0::2]))
+        freqs = array('i', values[1::2])
+        return doc_ids, freqs
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._directory)
+
+    def __len__(self) -> int:
+        return len(self._directory)
+
+    def __contains__(self, term) -> bool:
+        return term in self._directory
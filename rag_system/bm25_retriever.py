@@ -1,116 +1,137 @@
 """
 BM25 Retrieval System for the proposed RAG configuration
 """
+import json
 import logging
-import nltk
-from typing import List, Dict, Any, Optional
-from rank_bm25 import BM25Okapi
-import re
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 
-# Download required NLTK data with SSL fix
-try:
-    import ssl
-    ssl._create_default_https_context = ssl._create_unverified_context
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-except Exception as e:
-    logger.warning(f"Could not download NLTK data: {e}")
-    pass
+from .bm25_index import BM25Index, DocumentSubset
+from .tokenizer import BM25Tokenizer, get_default_tokenizer
+from .partitioning import filter_rows, group_rows
 
 logger = logging.getLogger(__name__)
 
+# Metadata filters whose matching document ids are kept
+PARTITION_CACHE_SIZE = 256
+
+DOCUMENTS_FILE = "documents.jsonl"
+
+# Below this many documents, process start-up costs more than it saves
+PARALLEL_MIN_DOCUMENTS = 256
+
+
+def _shard_term_frequencies(tokenizer: BM25Tokenizer, documents: List[str]) -> List[Tuple[Dict[str, int], int]]:
+    """Worker entry point: term statistics for one shard of documents"""
+    return [tokenizer.term_frequencies(doc) for doc in documents]
+
+
 class BM25Retriever:
     """BM25-based retrieval system for keyword matching"""
     
-    def __init__(self, documents: List[str], document_metadata: List[Dict[str, Any]] = None):
+    def __init__(self, documents: List[str], document_metadata: List[Dict[str, Any]] = None,
+                 compaction_threshold: float = 0.2, index: Optional[BM25Index] = None,
+                 tokenizer: Optional[BM25Tokenizer] = None, num_workers: int = 1):
         """
         Initialize BM25 retriever
         
         Args:
             documents: List of document texts
             document_metadata: List of metadata for each document
+            compaction_threshold: Fraction of deleted documents that triggers a compaction
+            index: Prebuilt index over ``documents`` (skips tokenization)
+            tokenizer: Tokenizer for documents and queries (defaults to the shared one)
+            num_workers: Processes used to tokenize large batches (1 = serial, 0 = one per CPU)
         """
+        self.tokenizer = tokenizer or get_default_tokenizer()
+        self.num_workers = num_workers
         self.documents = documents
         self.document_metadata = document_metadata or [{}] * len(documents)
-        self.tokenized_docs = self._tokenize_documents(documents)
-        self.bm25 = BM25Okapi(self.tokenized_docs)
+        self.compaction_threshold = compaction_threshold
+        # Metadata filter -> matching documents, reset whenever ids change
+        self._partitions: Dict[str, DocumentSubset] = {}
+        # Document ids per source file, for filters that pick a few documents
+        self._source_rows: Optional[Dict[Any, List[int]]] = None
+        if index is None:
+            index = BM25Index([])
+            index.add_term_frequencies(self._term_frequencies(documents))
+            index.precompute_weights()
+        self.bm25 = index
         
         logger.info(f"BM25 retriever initialized with {len(documents)} documents")
     
-    def _tokenize_documents(self, documents: List[str]) -> List[List[str]]:
-        """Tokenize documents for BM25 indexing"""
+    def _term_frequencies(self, documents: List[str]) -> List[Tuple[Dict[str, int], int]]:
+        """
+        Tokenize documents into per-document term statistics for indexing
+        
+        Large batches are sharded across a process pool. Shards are merged in
+        input order, so the index is identical to the one built serially.
+        """
+        workers = self.num_workers or os.cpu_count() or 1
+        if workers <= 1 or len(documents) < PARALLEL_MIN_DOCUMENTS:
+            return [self.tokenizer.term_frequencies(doc) for doc in documents]
+        
+        shard_size = math.ceil(len(documents) / (workers * 4))
+        shards = [documents[i:i + shard_size] for i in range(0, len(documents), shard_size)]
         try:
-            from nltk.corpus import stopwords
-            from nltk.tokenize import word_tokenize
-            
-            stop_words = set(stopwords.words('english'))
-            tokenized = []
-            
-            for doc in documents:
-                # Clean and tokenize
-                doc_clean = re.sub(r'[^\w\s]', ' ', doc.lower())
-                tokens = word_tokenize(doc_clean)
-                
-                # Remove stopwords and short tokens
-                tokens = [token for token in tokens 
-                         if token not in stop_words and len(token) > 2]
-                
-                tokenized.append(tokens)
-            
-            logger.info("Using NLTK tokenization with stopwords")
-            return tokenized
-            
+            doc_stats = []
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for shard_stats in executor.map(_shard_term_frequencies, [self.tokenizer] * len(shards), shards):
+                    doc_stats.extend(shard_stats)
+            logger.info(f"Tokenized {len(documents)} documents in {len(shards)} shards across {workers} processes")
+            return doc_stats
         except Exception as e:
-            logger.warning(f"Error in NLTK tokenization, using simple tokenization: {e}")
-            # Fallback to simple tokenization
-            tokenized = []
-            for doc in documents:
-                tokens = re.findall(r'\b\w+\b', doc.lower())
-                # Simple stopword removal
-                common_stopwords = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them'}
-                tokens = [token for token in tokens if len(token) > 2 and token not in common_stopwords]
-                tokenized.append(tokens)
-            
-            logger.info("Using simple tokenization fallback")
-            return tokenized
+            logger.warning(f"Parallel tokenization failed, tokenizing serially: {e}")
+            return [self.tokenizer.term_frequencies(doc) for doc in documents]
+    
+    def _partition(self, metadata_filter: Dict[str, Any]) -> DocumentSubset:
+        """Documents whose metadata matches a Chroma-style filter"""
+        key = json.dumps(metadata_filter, sort_keys=True)
+        partition = self._partitions.get(key)
+        if partition is None:
+            if self._source_rows is None:
+                self._source_rows = group_rows(self.document_metadata, 'source')
+            partition = DocumentSubset(filter_rows(self.document_metadata, metadata_filter,
+                                                   {'source': self._source_rows}),
+                                       len(self.bm25.doc_len))
+            # Per-query document filters would otherwise grow the cache without bound
+            if len(self._partitions) >= PARTITION_CACHE_SIZE:
+                self._partitions.clear()
+            self._partitions[key] = partition
+        return partition
     
-    def search(self, query: str, k: int = 10) -> List[Dict[str, Any]]:
+    def search(self, query: str, k: int = 10,
+               metadata_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         Search for relevant documents using BM25
         
         Args:
             query: Search query
             k: Number of results to return
+            metadata_filter: Only rank documents whose metadata matches this
+                Chroma-style filter (e.g. a species partition)
             
         Returns:
             List of search results with scores
         """
         try:
             # Tokenize query
-            query_tokens = self._tokenize_documents([query])[0]
+            query_tokens = self.tokenizer.tokenize_query(query)
             
             if not query_tokens:
                 logger.warning("Empty query tokens after tokenization")
                 return []
             
-            # Get BM25 scores
-            scores = self.bm25.get_scores(query_tokens)
-            
-            # Get top k results (include all results, not just positive scores)
-            top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-            
-            results = []
-            for idx in top_indices:
-                # Include all results, even with zero scores
-                result = {
-                    'document_id': idx,
-                    'content': self.documents[idx],
-                    'score': float(scores[idx]),
-                    'source': self.document_metadata[idx].get('source', f'Document {idx}'),
-                    'metadata': self.document_metadata[idx],
-                    'retrieval_method': 'bm25'
-                }
-                results.append(result)
+            # Score only documents that share a term with the query (and, with a
+            # filter, only the partition's postings); the top k still includes
+            # zero-score documents when fewer than k match
+            allowed = self._partition(metadata_filter) if metadata_filter else None
+            top_hits = self.bm25.top_k(query_tokens, k, allowed)
+            
+            # Include all results, even with zero scores
+            results = self._format_results(top_hits)
             
             logger.info(f"BM25 search returned {len(results)} results for query: {query[:50]}...")
             return results
@@ -119,18 +140,161 @@ class BM25Retriever:
             logger.error(f"Error in BM25 search: {str(e)}")
             return []
     
+    def search_batch(self, queries: List[str], k: int = 10) -> List[List[Dict[str, Any]]]:
+        """
+        Search many queries at once
+        
+        All queries are scored together with sparse matrix products (see
+        ``BM25Index.top_k_batch``), which is much faster than calling ``search``
+        in a loop for offline evaluation or cache warming.
+        
+        Args:
+            queries: Search queries
+            k: Number of results to return per query
+            
+        Returns:
+            One result list per query, in the same format as ``search``
+        """
+        try:
+            tokenized = [self.tokenizer.tokenize_query(query) for query in queries]
+            batch_hits = self.bm25.top_k_batch(tokenized, k)
+            
+            results = [self._format_results(top_hits) for top_hits in batch_hits]
+            logger.info(f"BM25 batch search scored {len(queries)} queries")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error in BM25 batch search: {str(e)}")
+            return [[] for _ in queries]
+    
+    def _format_results(self, top_hits: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """Turn (document_id, score) pairs into search result dicts"""
+        results = []
+        for idx, score in top_hits:
+            result = {
+                'document_id': idx,
+                'content': self.documents[idx],
+                'score': float(score),
+                'source': self.document_metadata[idx].get('source', f'Document {idx}'),
+                'metadata': self.document_metadata[idx],
+                'retrieval_method': 'bm25'
+            }
+            results.append(result)
+        return results
+    
     def get_document_count(self) -> int:
         """Get the number of indexed documents"""
-        return len(self.documents)
+        return self.bm25.corpus_size
     
-    def update_documents(self, new_documents: List[str], new_metadata: List[Dict[str, Any]] = None):
-        """Update the document index with new documents"""
+    def update_documents(self, new_documents: List[str], new_metadata: List[Dict[str, Any]] = None) -> List[int]:
+        """Append new documents to the index in place (no full rebuild)"""
         self.documents.extend(new_documents)
         self.document_metadata.extend(new_metadata or [{}] * len(new_documents))
-        self.tokenized_docs.extend(self._tokenize_documents(new_documents))
-        self.bm25 = BM25Okapi(self.tokenized_docs)
+        self._partitions = {}
+        self._source_rows = None
+        doc_ids = self.bm25.add_term_frequencies(self._term_frequencies(new_documents))
         
         logger.info(f"BM25 index updated with {len(new_documents)} new documents")
+        return doc_ids
+    
+    def delete_documents(self, document_ids: List[int]):
+        """
+        Delete documents by id
+        
+        Documents are tombstoned and stop matching immediately. Once the share of
+        tombstones reaches ``compaction_threshold`` the index is compacted, which
+        renumbers the remaining document ids.
+        """
+        self.bm25.delete_documents(document_ids)
+        logger.info(f"BM25 index marked {len(document_ids)} documents as deleted")
+        
+        if self.bm25.deleted_ratio >= self.compaction_threshold:
+            self.compact()
+    
+    def get_chunk_ids(self) -> set:
+        """``chunk_id`` metadata of all live documents"""
+        deleted = self.bm25.deleted
+        return {metadata.get('chunk_id') for i, metadata in enumerate(self.document_metadata)
+                if i not in deleted and metadata.get('chunk_id')}
+    
+    def get_parent_ids(self) -> set:
+        """``parent_id`` metadata of all live child passages"""
+        deleted = self.bm25.deleted
+        return {metadata.get('parent_id') for i, metadata in enumerate(self.document_metadata)
+                if i not in deleted and metadata.get('parent_id')}
+
+    def find_document_ids(self, chunk_ids) -> List[int]:
+        """Ids of live documents whose ``chunk_id`` metadata is in ``chunk_ids``"""
+        chunk_ids = set(chunk_ids)
+        deleted = self.bm25.deleted
+        return [i for i, metadata in enumerate(self.document_metadata)
+                if i not in deleted and metadata.get('chunk_id') in chunk_ids]
+    
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]):
+        """Merge fields into the metadata of live documents, keyed by ``chunk_id``"""
+        for i in self.find_document_ids(updates):
+            self.document_metadata[i].update(updates[self.document_metadata[i]['chunk_id']])
+        self._partitions = {}
+        self._source_rows = None
+    
+    def compact(self):
+        """Remove tombstoned documents from the index and the document store"""
+        kept = self.bm25.compact()
+        if len(kept) != len(self.documents):
+            self.documents = [self.documents[i] for i in kept]
+            self.document_metadata = [self.document_metadata[i] for i in kept]
+            self._partitions = {}
+            self._source_rows = None
+    
+    def save(self, path: str):
+        """
+        Save the index and document store to a directory
+        
+        Pending deletes are compacted first. The index itself is written in the
+        memory-mappable format described in ``BM25Index.save``; documents and
+        their metadata go to ``documents.jsonl``.
+        """
+        self.compact()
+        self.bm25.save(path)
+        
+        tmp_path = os.path.join(path, f"{DOCUMENTS_FILE}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for content, metadata in zip(self.documents, self.document_metadata):
+                f.write(json.dumps({'content': content, 'metadata': metadata}, default=str) + "\n")
+        os.replace(tmp_path, os.path.join(path, DOCUMENTS_FILE))
+        
+        logger.info(f"BM25 retriever saved {len(self.documents)} documents to {path}")
+    
+    @classmethod
+    def load(cls, path: str, compaction_threshold: float = 0.2,
+             tokenizer: Optional[BM25Tokenizer] = None, num_workers: int = 1) -> "BM25Retriever":
+        """
+        Load a retriever written by ``save`` without re-tokenizing anything
+        
+        Args:
+            path: Directory passed to ``save``
+            compaction_threshold: Fraction of deleted documents that triggers a compaction
+            tokenizer: Query tokenizer; must match the one the index was built with
+            num_workers: Processes used to tokenize later updates
+            
+        Returns:
+            BM25Retriever backed by the memory-mapped index
+        """
+        index = BM25Index.load(path)
+        
+        documents = []
+        document_metadata = []
+        with open(os.path.join(path, DOCUMENTS_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                documents.append(record['content'])
+                document_metadata.append(record['metadata'])
+        
+        if len(documents) != len(index.doc_len):
+            raise ValueError(f"BM25 document store in {path} does not match the index")
+        
+        return cls(documents, document_metadata, compaction_threshold, index=index,
+                   tokenizer=tokenizer, num_workers=num_workers)
 
 
 class HybridRetriever:
@@ -0,0 +1,271 @@
+"""
+Near-duplicate chunk detection with MinHash signatures and LSH banding
+"""
+import json
+import logging
+import os
+import re
+import sys
+import zlib
+from typing import List, Dict, Any, Iterable, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Universal hashing modulus (largest prime below 2**32) and seed of the hash family
+MINHASH_PRIME = 4294967291
+MINHASH_SEED = 1
+
+# Letters only: URLs, dates and ids (e.g. the "Source:"/"Scraped:" header of
+# scraped pages) differ between copies of the same text
+_WORD_PATTERN = re.compile(r"[^\W\d_]+")
+_URL_PATTERN = re.compile(r"https?://\S+")
+
+
+def choose_bands(num_perm: int, threshold: float) -> int:
+    """
+    Fewest LSH bands whose candidate curve starts below ``threshold``
+
+    With ``b`` bands of ``r`` rows, pairs of similarity ``(1/b) ** (1/r)``
+    become candidates half of the time; keeping that point a little under
+    the threshold makes missed duplicates rare without comparing every chunk.
+    """
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands == 0 and (1.0 / bands) ** (bands / num_perm) <= threshold - 0.05:
+            return bands
+    return num_perm
+
+
+def shingles(text: str, size: int = 5) -> Set[str]:
+    """Word ``size``-grams of the lowercased text without URLs and numbers (the whole text if it is shorter)"""
+    words = _WORD_PATTERN.findall(_URL_PATTERN.sub(" ", text.lower()))
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures of the canonical chunks, bucketed for LSH lookups
+
+    A signature holds, per hash function, the smallest hash of the chunk's
+    word shingles; the share of equal positions in two signatures estimates
+    the Jaccard similarity of their shingle sets. Signatures are cut into
+    ``bands`` bands and two chunks become candidates when any band matches
+    exactly, so a lookup touches a handful of buckets instead of every chunk.
+    Candidates count as duplicates only if their estimated similarity
+    reaches ``threshold``.
+
+    Each canonical chunk also keeps its own source and the other sources
+    whose near-copies were dropped in its favour.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: Optional[int] = None,
+                 shingle_size: int = 5):
+        """
+        Initialize an empty index
+
+        Args:
+            threshold: Estimated Jaccard similarity at which two chunks are duplicates
+            num_perm: Hash functions per signature
+            bands: LSH bands; ``num_perm`` must be a multiple. More bands find
+                lower-similarity candidates at the cost of more comparisons
+                (None = ``choose_bands`` for the threshold).
+            shingle_size: Words per shingle
+        """
+        bands = bands or choose_bands(num_perm, threshold)
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(MINHASH_SEED)
+        # a * x + b stays below 2**63 for 32-bit x, so uint64 never overflows
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.sources: Dict[str, str] = {}
+        self.alternates: Dict[str, List[str]] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of a text (None if it has no words)"""
+        shingle_set = shingles(text, self.shingle_size)
+        if not shingle_set:
+            return None
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingle_set),
+                             dtype=np.uint64, count=len(shingle_set))
+        permuted = (hashes[:, None] * self._a + self._b) % MINHASH_PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def find(self, signature: np.ndarray, exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        Most similar canonical chunk at or above the threshold
+
+        Args:
+            signature: Signature from ``signature``
+            exclude: Chunk ids not to match (e.g. ones about to be retracted)
+
+        Returns:
+            Chunk id, or None if the chunk has no near-duplicate
+        """
+        exclude = set(exclude)
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(key, ()))
+        best, best_similarity = None, self.threshold
+        for chunk_id in sorted(candidates - exclude):
+            similarity = float(np.mean(self.signatures[chunk_id] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = chunk_id, similarity
+        return best
+
+    def add(self, chunk_id: str, signature: np.ndarray, source: str = ""):
+        """Register a canonical chunk"""
+        if chunk_id in self.signatures:
+            return
+        self.signatures[chunk_id] = signature
+        self.sources[chunk_id] = source
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, set()).add(chunk_id)
+
+    def add_alternate(self, chunk_id: str, source: str) -> bool:
+        """Record that ``source`` holds a near-copy of a canonical chunk; False if nothing changed"""
+        if source == self.sources.get(chunk_id) or source in self.alternates.get(chunk_id, ()):
+            return False
+        self.alternates.setdefault(chunk_id, []).append(source)
+        return True
+
+    def remove(self, chunk_ids: Iterable[str]) -> Set[str]:
+        """
+        Forget canonical chunks
+
+        Returns:
+            Alternate sources of the removed chunks; their near-copies are not
+            indexed anywhere any more and must be ingested again
+        """
+        orphaned = set()
+        for chunk_id in chunk_ids:
+            signature = self.signatures.pop(chunk_id, None)
+            if signature is None:
+                continue
+            self.sources.pop(chunk_id, None)
+            for band, key in enumerate(self._band_keys(signature)):
+                bucket = self._buckets[band].get(key)
+                if bucket is not None:
+                    bucket.discard(chunk_id)
+                    if not bucket:
+                        del self._buckets[band][key]
+            orphaned.update(self.alternates.pop(chunk_id, ()))
+        return orphaned
+
+    def drop_source(self, source: str) -> Set[str]:
+        """
+        Forget ``source`` as an alternate (it was deleted or is being re-ingested)
+
+        Returns:
+            Ids of canonical chunks whose alternates changed
+        """
+        changed = set()
+        for chunk_id, sources in list(self.alternates.items()):
+            if source in sources:
+                sources.remove(source)
+                changed.add(chunk_id)
+                if not sources:
+                    del self.alternates[chunk_id]
+        return changed
+
+    def save(self, path: str):
+        """Write the index to a ``.npz`` file atomically"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        ids = sorted(self.signatures)
+        signatures = np.stack([self.signatures[chunk_id] for chunk_id in ids]) if ids else \
+            np.zeros((0, self.num_perm), dtype=np.uint32)
+        settings = {'threshold': self.threshold, 'num_perm': self.num_perm,
+                    'bands': self.bands, 'shingle_size': self.shingle_size}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, ids=np.array(ids, dtype=str), signatures=signatures,
+                     sources=np.array([self.sources[chunk_id] for chunk_id in ids], dtype=str),
+                     settings=np.array(json.dumps(settings)), alternates=np.array(json.dumps(self.alternates)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, threshold: Optional[float] = None) -> "NearDuplicateIndex":
+        """
+        Load an index written by ``save``
+
+        Args:
+            path: File passed to ``save``
+            threshold: New similarity threshold (None = the saved one); the
+                LSH bands are re-chosen for it, signatures stay valid
+        """
+        with np.load(path, allow_pickle=False) as data:
+            settings = json.loads(str(data['settings']))
+            if threshold is not None and threshold != settings['threshold']:
+                settings.update(threshold=threshold, bands=None)
+            index = cls(**settings)
+            for chunk_id, signature, source in zip(data['ids'].tolist(), data['signatures'],
+                                                   data['sources'].tolist()):
+                index.add(chunk_id, signature, source)
+            index.alternates = json.loads(str(data['alternates']))
+        return index
+
+
+def dedup_stats(chunks: int, dropped: int, dropped_chars: int, total_chars: int,
+                clusters: int) -> Dict[str, Any]:
+    """Summary of what near-duplicate removal saved, for ingest results"""
+    return {
+        'chunks_seen': chunks,
+        'chunks_dropped': dropped,
+        'clusters': clusters,
+        'chunk_savings': dropped / chunks if chunks else 0.0,
+        'chars_dropped': dropped_chars,
+        'char_savings': dropped_chars / total_chars if total_chars else 0.0
+    }
+
+
+if __name__ == "__main__":
+    # Near-duplicate report for a document directory, without embedding anything:
+    #   python -m rag_system.dedup [directory] [threshold]
+    from .document_processor import DocumentProcessor, scan_directory
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else "documents"
+    threshold = float(sys.argv[2]) if len(sys.argv) > 2 else 0.8
+    logging.basicConfig(level=logging.WARNING)
+
+    index = NearDuplicateIndex(threshold)
+    chunks = dropped = dropped_chars = total_chars = 0
+    for file_path, docs, error in DocumentProcessor().process_files(scan_directory(directory)):
+        if error is not None:
+            print(f"skipped {file_path}: {error}")
+            continue
+        for doc in docs:
+            chunks += 1
+            total_chars += len(doc.page_content)
+            signature = index.signature(doc.page_content)
+            match = index.find(signature) if signature is not None else None
+            if match is None:
+                if signature is not None:
+                    index.add(str(chunks), signature, file_path)
+            else:
+                dropped += 1
+                dropped_chars += len(doc.page_content)
+                index.add_alternate(match, file_path)
+
+    stats = dedup_stats(chunks, dropped, dropped_chars, total_chars, len(index.alternates))
+    print(f"{chunks} chunks, threshold {threshold}: {dropped} near-duplicates in {stats['clusters']} clusters "
+          f"({stats['chunk_savings']:.1%} of chunks, {stats['char_savings']:.1%} of text)")
+    for chunk_id, sources in sorted(index.alternates.items(), key=lambda item: -len(item[1]))[:20]:
+        print(f"  {index.sources[chunk_id]} <- {', '.join(sorted(sources))}")
@@ -0,0 +1,363 @@
+"""
+In-process dense vector index: an alternative to Chroma for small corpora
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from .quantization import QuantizedVectors, QUANTIZATION_MODES, rescore
+from .partitioning import filter_rows, group_rows, matches_filter
+
+try:
+    from langchain_core.documents import Document as LangChainDocument
+except ImportError:
+    from langchain.schema import Document as LangChainDocument
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.jsonl"
+# Candidates re-scored at float32 per requested result when searching quantized codes
+RESCORE_FACTOR = 4
+# Rows read at a time (and at most sampled for training) when building a quantized FAISS index
+FAISS_BLOCK_ROWS = 4096
+FAISS_TRAIN_ROWS = 65536
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LocalDenseIndex:
+    """
+    Chunk store with embeddings held in one contiguous in-memory array
+
+    Implements the subset of LangChain's ``Chroma`` interface that
+    ``VectorStore`` uses (``get``, ``add_documents``, ``delete``, ``persist``
+    and the ``similarity_search*`` methods), so it can stand in for Chroma.
+    Vectors are L2-normalized and searched by inner product, either brute
+    force with NumPy or through a FAISS flat or HNSW index when faiss is
+    installed. With a float16 or int8 ``dtype``, only a quantized copy is held
+    in memory (FAISS indexes store scalar-quantized codes of that precision):
+    candidates are ranked on it and re-scored against the float32 vectors,
+    which stay memory-mapped from disk once persisted.
+    Scores are squared L2 distances between the normalized vectors, matching
+    what Chroma reports with its default metric.
+    """
+
+    def __init__(self, embedding_function, persist_directory: str, index_type: str = "numpy",
+                 dtype: str = "float32", hnsw_m: int = 32):
+        """
+        Initialize the index, loading previously persisted chunks
+
+        Args:
+            embedding_function: LangChain embeddings object
+            persist_directory: Directory holding the embeddings and chunk store
+            index_type: 'numpy' (brute force), 'flat' or 'hnsw' (FAISS)
+            dtype: In-memory precision: 'float32', 'float16' or 'int8' (quantized, re-scored at float32)
+            hnsw_m: Neighbours per node for the HNSW index
+        """
+        if index_type not in ("numpy", "flat", "hnsw"):
+            raise ValueError(f"Unknown dense index type: {index_type}")
+
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.index_type = index_type
+        if dtype != "float32" and dtype not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown dense index dtype: {dtype}")
+        self.dtype = dtype
+        self.hnsw_m = hnsw_m
+
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        # Full-precision vectors; a read-only memmap when quantized and persisted
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._positions: Dict[str, int] = {}
+        self._faiss_index = None
+        self._quantized = None
+        # Rows per source document, so a filter on a few documents skips the others
+        self._source_rows = None
+        self._lock = threading.Lock()
+
+        if index_type != "numpy":
+            try:
+                import faiss  # noqa
+                self._faiss = faiss
+            except ImportError:
+                logger.warning(f"faiss is not installed, using NumPy search instead of a FAISS {index_type} index")
+                self.index_type = "numpy"
+
+        self._load()
+
+    def _load(self):
+        embeddings_path = os.path.join(self.persist_directory, EMBEDDINGS_FILE)
+        chunks_path = os.path.join(self.persist_directory, CHUNKS_FILE)
+        if not (os.path.exists(embeddings_path) and os.path.exists(chunks_path)):
+            return
+
+        with open(chunks_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record['id'])
+                self.texts.append(record['content'])
+                self.metadatas.append(record['metadata'])
+        self.vectors = np.load(embeddings_path, mmap_mode='r' if self.quantized else None)
+        if len(self.vectors) != len(self.ids):
+            raise ValueError(f"Dense index in {self.persist_directory} is inconsistent")
+        self._positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        logger.info(f"Loaded {len(self.ids)} vectors from {self.persist_directory}")
+
+    @property
+    def quantized(self) -> bool:
+        """Whether searches run on a float16/int8 copy"""
+        return self.dtype != "float32"
+
+    def count(self) -> int:
+        """Number of stored chunks"""
+        return len(self.ids)
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str],
+               metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Insert or replace chunks with precomputed embeddings"""
+        if not ids:
+            return
+        if metadatas is None:
+            metadatas = [{} for _ in ids]
+        vectors = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+        with self._lock:
+            if not len(self.vectors):
+                self.vectors = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            elif isinstance(self.vectors, np.memmap):
+                # Load into memory until the next persist
+                self.vectors = np.array(self.vectors)
+
+            new_rows = []
+            for row, (chunk_id, text, metadata) in enumerate(zip(ids, documents, metadatas)):
+                position = self._positions.get(chunk_id)
+                if position is None:
+                    # Later duplicates in the same call replace earlier ones
+                    self._positions[chunk_id] = len(self.ids)
+                    self.ids.append(chunk_id)
+                    self.texts.append(text)
+                    self.metadatas.append(metadata)
+                    new_rows.append(row)
+                elif position >= len(self.vectors):
+                    new_rows[position - len(self.vectors)] = row
+                    self.texts[position] = text
+                    self.metadatas[position] = metadata
+                else:
+                    self.vectors[position] = vectors[row]
+                    self.texts[position] = text
+                    self.metadatas[position] = metadata
+
+            if new_rows:
+                self.vectors = np.vstack([self.vectors, vectors[new_rows]])
+            self._faiss_index = None
+            self._quantized = None
+            self._source_rows = None
+
+    def add_documents(self, documents: List[LangChainDocument], ids: List[str]) -> List[str]:
+        """Embed and store documents"""
+        texts = [doc.page_content for doc in documents]
+        embeddings = self.embedding_function.embed_documents(texts)
+        self.upsert(ids, embeddings, texts, [doc.metadata for doc in documents])
+        return ids
+
+    def delete(self, ids: List[str]):
+        """Remove chunks by id (unknown ids are ignored)"""
+        with self._lock:
+            drop = {self._positions[chunk_id] for chunk_id in ids if chunk_id in self._positions}
+            if not drop:
+                return
+            keep = [i for i in range(len(self.ids)) if i not in drop]
+            self.ids = [self.ids[i] for i in keep]
+            self.texts = [self.texts[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self.vectors = np.asarray(self.vectors[keep])
+            self._positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+            self._faiss_index = None
+            self._quantized = None
+            self._source_rows = None
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace the metadata of stored chunks, keeping their text and vectors (unknown ids are ignored)"""
+        with self._lock:
+            for chunk_id, metadata in zip(ids, metadatas):
+                position = self._positions.get(chunk_id)
+                if position is not None:
+                    self.metadatas[position] = metadata
+            self._source_rows = None
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: int = 0,
+            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Read stored chunks, in the shape returned by ``Chroma.get``"""
+        if include is None:
+            include = ['documents', 'metadatas']
+
+        if ids is not None:
+            positions = [self._positions[chunk_id] for chunk_id in ids if chunk_id in self._positions]
+        else:
+            positions = range(len(self.ids))
+        if where:
+            positions = [i for i in positions if matches_filter(self.metadatas[i], where)]
+        positions = list(positions)[offset:None if limit is None else offset + limit]
+
+        return {
+            'ids': [self.ids[i] for i in positions],
+            'documents': [self.texts[i] for i in positions] if 'documents' in include else None,
+            'metadatas': [self.metadatas[i] for i in positions] if 'metadatas' in include else None,
+            'embeddings': np.asarray(self.vectors[positions]) if 'embeddings' in include else None
+        }
+
+    def persist(self):
+        """Write the embeddings and chunk store atomically"""
+        os.makedirs(self.persist_directory, exist_ok=True)
+        with self._lock:
+            ids, texts, metadatas, vectors = list(self.ids), list(self.texts), list(self.metadatas), self.vectors
+
+        tmp_embeddings = os.path.join(self.persist_directory, f"{EMBEDDINGS_FILE}.tmp")
+        with open(tmp_embeddings, 'wb') as f:
+            np.save(f, vectors)
+        tmp_chunks = os.path.join(self.persist_directory, f"{CHUNKS_FILE}.tmp")
+        with open(tmp_chunks, 'w', encoding='utf-8') as f:
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                f.write(json.dumps({'id': chunk_id, 'content': text, 'metadata': metadata}, default=str) + "\n")
+        os.replace(tmp_embeddings, os.path.join(self.persist_directory, EMBEDDINGS_FILE))
+        os.replace(tmp_chunks, os.path.join(self.persist_directory, CHUNKS_FILE))
+
+        if self.quantized and len(vectors):
+            # Hand the full-precision vectors back to the page cache
+            mapped = np.load(os.path.join(self.persist_directory, EMBEDDINGS_FILE), mmap_mode='r')
+            with self._lock:
+                if self.vectors is vectors:
+                    self.vectors = mapped
+
+    def delete_collection(self):
+        """Drop every chunk and the files on disk"""
+        with self._lock:
+            self.ids, self.texts, self.metadatas = [], [], []
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+            self._positions = {}
+            self._faiss_index = None
+            self._quantized = None
+            self._source_rows = None
+        shutil.rmtree(self.persist_directory, ignore_errors=True)
+
+    def _get_faiss_index(self):
+        """
+        FAISS index over the current vectors, rebuilt after any change
+
+        When quantized, the index holds float16 or 8-bit scalar-quantized
+        codes and is filled block by block, so the float32 vectors are never
+        loaded into memory as a whole.
+        """
+        with self._lock:
+            if self._faiss_index is None:
+                faiss, vectors = self._faiss, self.vectors
+                dim, metric = vectors.shape[1], self._faiss.METRIC_INNER_PRODUCT
+                if not self.quantized:
+                    index = faiss.IndexHNSWFlat(dim, self.hnsw_m, metric) if self.index_type == "hnsw" \
+                        else faiss.IndexFlatIP(dim)
+                else:
+                    qtype = faiss.ScalarQuantizer.QT_fp16 if self.dtype == "float16" else faiss.ScalarQuantizer.QT_8bit
+                    index = faiss.IndexHNSWSQ(dim, qtype, self.hnsw_m, metric) if self.index_type == "hnsw" \
+                        else faiss.IndexScalarQuantizer(dim, qtype, metric)
+                    if not index.is_trained:
+                        # 8-bit codes need per-dimension ranges; a strided sample covers the corpus
+                        index.train(np.ascontiguousarray(vectors[::max(1, len(vectors) // FAISS_TRAIN_ROWS)],
+                                                         dtype=np.float32))
+                for i in range(0, len(vectors), FAISS_BLOCK_ROWS):
+                    index.add(np.ascontiguousarray(vectors[i:i + FAISS_BLOCK_ROWS], dtype=np.float32))
+                self._faiss_index = index
+            return self._faiss_index
+
+    def _get_quantized(self) -> QuantizedVectors:
+        """Quantized copy of the current vectors, rebuilt after any change"""
+        with self._lock:
+            if self._quantized is None or len(self._quantized) != len(self.vectors):
+                self._quantized = QuantizedVectors(self.vectors, self.dtype)
+            return self._quantized
+
+    def _get_source_rows(self) -> Dict[Any, List[int]]:
+        """Rows grouped by 'source' metadata, rebuilt after any change"""
+        with self._lock:
+            if self._source_rows is None:
+                self._source_rows = group_rows(self.metadatas, 'source')
+            return self._source_rows
+
+    def _search(self, embedding, k: int, filter: Optional[Dict[str, Any]] = None) -> List[tuple]:
+        """Return (document, inner product) of the top ``k`` chunks"""
+        faiss_index = quantized = None
+        if not filter and self.index_type != "numpy":
+            faiss_index = self._get_faiss_index()
+        elif self.quantized:
+            quantized = self._get_quantized()
+        # Writers replace these rather than shrink them, so the references stay consistent
+        with self._lock:
+            texts, metadatas, vectors = self.texts, self.metadatas, self.vectors
+        if not len(vectors) or k <= 0:
+            return []
+        query = _normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+
+        candidates = None
+        if filter:
+            candidates = np.array(filter_rows(metadatas[:len(vectors)], filter,
+                                              {'source': self._get_source_rows()}), dtype=np.int64)
+            if not len(candidates):
+                return []
+
+        if faiss_index is not None:
+            pool = min(k * RESCORE_FACTOR if self.quantized else k, len(vectors))
+            scores, positions = faiss_index.search(query.reshape(1, -1), pool)
+            hits = [(int(i), float(s)) for i, s in zip(positions[0], scores[0]) if 0 <= i < len(vectors)]
+            if self.quantized and hits:
+                # Scores from the codes are approximate; rank the candidates at full precision
+                rows, exact = rescore(query, np.array([i for i, _ in hits]), vectors, k)
+                hits = [(int(i), float(s)) for i, s in zip(rows, exact)]
+        elif quantized is not None and len(quantized) == len(vectors):
+            positions, scores = quantized.search(query, k, vectors, rows=candidates)
+            hits = [(int(i), float(s)) for i, s in zip(positions, scores)]
+        else:
+            if candidates is None:
+                candidates = np.arange(len(vectors))
+                sims = vectors @ query
+            else:
+                sims = vectors[candidates] @ query
+            if k < len(sims):
+                top = np.argpartition(-sims, k)[:k]
+                top = top[np.argsort(-sims[top], kind='stable')]
+            else:
+                top = np.argsort(-sims, kind='stable')
+            hits = [(int(candidates[j]), float(sims[j])) for j in top]
+
+        return [(LangChainDocument(page_content=texts[i], metadata=metadatas[i]), sim) for i, sim in hits]
+
+    def similarity_search_by_vector_with_score(self, embedding, k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None) -> List[tuple]:
+        """Nearest chunks to an embedding with their squared L2 distances"""
+        return [(doc, max(0.0, 2.0 - 2.0 * sim)) for doc, sim in self._search(embedding, k, filter)]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None) -> List[LangChainDocument]:
+        """Nearest chunks to an embedding"""
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None) -> List[tuple]:
+        """Nearest chunks to a query with their squared L2 distances"""
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4,
+                          filter: Optional[Dict[str, Any]] = None) -> List[LangChainDocument]:
+        """Nearest chunks to a query"""
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k, filter)
@@ -0,0 +1,157 @@
+"""
+Document-level index for two-stage retrieval: pick source documents, then search their chunks
+"""
+import json
+import logging
+import os
+import shutil
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from .bm25_index import BM25Index
+from .tokenizer import BM25Tokenizer, get_default_tokenizer
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+CENTROIDS_FILE = "centroids.npy"
+BM25_DIRECTORY = "bm25"
+
+
+class DocumentIndex:
+    """
+    One centroid embedding and one BM25 term profile per source document
+
+    The centroid is the normalized mean of a document's normalized chunk
+    embeddings; the term profile is the BM25 "document" made of all its
+    chunks' terms. ``select`` ranks documents on both and fuses the two
+    rankings with reciprocal rank fusion, like the chunk-level pipeline.
+    """
+
+    def __init__(self, sources: List[str], centroids: np.ndarray, bm25: BM25Index,
+                 chunk_count: int, tokenizer: Optional[BM25Tokenizer] = None, rrf_k: int = 60):
+        """
+        Initialize from built parts (see ``build`` and ``load``)
+
+        Args:
+            sources: Source document per row
+            centroids: Normalized centroid per source, one row each
+            bm25: BM25 index with one entry per source, in the same order
+            chunk_count: Number of chunks the index was built from
+            tokenizer: Query tokenizer; must match the one used to build ``bm25``
+            rrf_k: RRF constant for fusing the dense and BM25 document rankings
+        """
+        self.sources = sources
+        self.centroids = centroids
+        self.bm25 = bm25
+        self.chunk_count = chunk_count
+        self.tokenizer = tokenizer or get_default_tokenizer()
+        self.rrf_k = rrf_k
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    @classmethod
+    def build(cls, texts: List[str], metadatas: List[Dict[str, Any]], embeddings: np.ndarray,
+              tokenizer: Optional[BM25Tokenizer] = None, source_field: str = 'source') -> "DocumentIndex":
+        """
+        Build the index from every stored chunk
+
+        Args:
+            texts: Chunk texts
+            metadatas: Chunk metadata; ``source_field`` names the document
+            embeddings: Chunk embeddings, one row per chunk
+            tokenizer: BM25 tokenizer for the term profiles
+            source_field: Metadata key identifying a chunk's document
+
+        Returns:
+            DocumentIndex over the distinct sources
+        """
+        tokenizer = tokenizer or get_default_tokenizer()
+        rows_by_source: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            rows_by_source.setdefault(str(metadata.get(source_field, '')), []).append(i)
+        sources = sorted(rows_by_source)
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        centroids = np.zeros((len(sources), embeddings.shape[1] if embeddings.ndim == 2 else 0),
+                             dtype=np.float32)
+        profiles = []
+        for row, source in enumerate(sources):
+            rows = rows_by_source[source]
+            vectors = embeddings[rows]
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroid = (vectors / norms).mean(axis=0)
+            norm = np.linalg.norm(centroid)
+            centroids[row] = centroid / norm if norm else centroid
+
+            frequencies: Counter = Counter()
+            length = 0
+            for i in rows:
+                chunk_frequencies, chunk_length = tokenizer.term_frequencies(texts[i])
+                frequencies.update(chunk_frequencies)
+                length += chunk_length
+            profiles.append((dict(frequencies), length))
+
+        bm25 = BM25Index([])
+        bm25.add_term_frequencies(profiles)
+        logger.info(f"Built document index over {len(sources)} documents from {len(texts)} chunks")
+        return cls(sources, centroids, bm25, len(texts), tokenizer)
+
+    def select(self, query: str, query_vector=None, m: int = 5) -> List[Tuple[str, float]]:
+        """
+        Pick the ``m`` documents most likely to hold the answer
+
+        Args:
+            query: Search query
+            query_vector: Query embedding (None = rank on BM25 only)
+            m: Number of documents
+
+        Returns:
+            (source, fused score) pairs, best first
+        """
+        if not self.sources or m <= 0:
+            return []
+        depth = min(len(self.sources), max(4 * m, 20))
+        fused: Dict[int, float] = {}
+
+        if query_vector is not None and self.centroids.size:
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+            norm = np.linalg.norm(query_vector)
+            sims = self.centroids @ (query_vector / norm if norm else query_vector)
+            top = np.argsort(-sims, kind='stable')[:depth]
+            for rank, row in enumerate(top):
+                fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (self.rrf_k + rank + 1)
+
+        # Documents sharing no term with the query are padding, not evidence
+        hits = [(row, score) for row, score in self.bm25.top_k(self.tokenizer.tokenize_query(query), depth)
+                if score > 0]
+        for rank, (row, _) in enumerate(hits):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+
+        ranked = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:m]
+        return [(self.sources[row], score) for row, score in ranked]
+
+    def save(self, path: str):
+        """Write the index to a directory, replacing its previous contents"""
+        tmp_path = f"{path.rstrip(os.sep)}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, CENTROIDS_FILE), self.centroids)
+        self.bm25.save(os.path.join(tmp_path, BM25_DIRECTORY))
+        with open(os.path.join(tmp_path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'sources': self.sources, 'chunk_count': self.chunk_count}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, tokenizer: Optional[BM25Tokenizer] = None) -> "DocumentIndex":
+        """Load an index written by ``save``"""
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        centroids = np.load(os.path.join(path, CENTROIDS_FILE))
+        bm25 = BM25Index.load(os.path.join(path, BM25_DIRECTORY))
+        return cls(meta['sources'], centroids, bm25, meta['chunk_count'], tokenizer)
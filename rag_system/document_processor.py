@@ -2,8 +2,13 @@
 Document processing and chunking functionality for RAG system
 """
 import os
+import re
+import json
+import math
+import hashlib
 import logging
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from pathlib import Path
 
 # Document processing libraries
@@ -21,27 +26,291 @@ except ImportError:
     from langchain.text_splitter import RecursiveCharacterTextSplitter
     from langchain.schema import Document as LangChainDocument
 
-from config import CHUNK_SIZE, CHUNK_OVERLAP, SUPPORTED_EXTENSIONS
+from config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, SUPPORTED_EXTENSIONS,
+    CHUNKING_MODE, CHUNK_TOKENIZER_MODEL, CHUNK_TOKENS, CHUNK_TOKEN_OVERLAP,
+    PARENT_CHILD_CHUNKS, CHILD_CHUNK_SIZE, CHILD_CHUNK_OVERLAP, DOCUMENT_LOADER_WORKERS,
+    PDF_EXTRACTION_WORKERS, PDF_TEXT_CACHE_DIRECTORY
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Better separators for markdown
+SEPARATORS = ["\n\n\n", "\n\n", "\n", ". ", " ", ""]
+
+# Rough characters per token for English text, used when the tokenizer is unavailable
+CHARS_PER_TOKEN = 4
+
+
+def scan_directory(directory_path: str, extensions: Iterable[str] = SUPPORTED_EXTENSIONS) -> List[str]:
+    """
+    All files under a directory with a supported extension, in sorted path order
+    
+    One ``os.scandir`` pass over the tree; directory entries carry their type,
+    so no file is stat-ed twice.
+    """
+    extensions = {ext.lower() for ext in extensions}
+    found = []
+    pending = [directory_path]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    # Hidden files and directories are skipped, as with glob
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions:
+                        found.append(entry.path)
+        except OSError as e:
+            logger.error(f"Error scanning {current}: {str(e)}")
+    return sorted(found)
+
+
+# Characters of text buffered by iter_chunks before chunks are emitted
+STREAM_BUFFER_CHARS = 1_000_000
+
+# Characters read at a time from plain-text files
+READ_BLOCK_CHARS = 1 << 20
+
+
+# ATX heading ("## Title", optional closing hashes) and code fence opener
+_MARKDOWN_HEADING = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+_MARKDOWN_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+
+
+def iter_markdown_sections(lines: Iterable[str]) -> Iterator[Tuple[List[str], str]]:
+    """
+    Split Markdown into header-scoped sections in a single pass
+    
+    Every ATX heading starts a section that runs to the next heading; text
+    before the first heading is a section with an empty path. Lines inside
+    fenced code blocks are never headings. Sections holding nothing but
+    their heading are skipped, their title survives in the paths of their
+    subsections (which ``DocumentProcessor`` writes into each chunk's
+    text). Setext (underlined) headings are treated as body text.
+    
+    Args:
+        lines: Lines of the document, with or without line endings
+        
+    Yields:
+        (heading path from the top-level heading down, section text starting
+        with its heading line); the section texts concatenate to the input
+        minus the skipped heading-only sections
+    """
+    path: List[Tuple[int, str]] = []
+    current: List[str] = []
+    has_body = False
+    fence = None
+    
+    for line in lines:
+        stripped = line.rstrip('\r\n')
+        if fence is not None:
+            if stripped.lstrip().startswith(fence):
+                fence = None
+        else:
+            fence_match = _MARKDOWN_FENCE.match(stripped)
+            heading = None if fence_match else _MARKDOWN_HEADING.match(stripped)
+            if fence_match:
+                fence = fence_match.group(1)
+            elif heading:
+                if has_body:
+                    yield [title for _, title in path], "".join(current)
+                level = len(heading.group(1))
+                while path and path[-1][0] >= level:
+                    path.pop()
+                path.append((level, (heading.group(2) or "").strip()))
+                current, has_body = [line], False
+                continue
+        current.append(line)
+        has_body = has_body or bool(stripped.strip())
+    
+    if has_body:
+        yield [title for _, title in path], "".join(current)
+
+
+# PDFs with fewer pages are extracted serially; process start-up would cost more than it saves
+PDF_PARALLEL_MIN_PAGES = 32
+
+
+def _pdf_digest(file_path: Path) -> str:
+    """Cache key of a PDF: hash of its bytes and the extractor version"""
+    digest = hashlib.sha256(f"PyPDF2 {getattr(PyPDF2, '__version__', '')}\0".encode('utf-8'))
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extract_pdf_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """Worker entry point: text of pages ``start`` to ``stop - 1``, each followed by a newline"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[i].extract_text() + "\n" for i in range(start, stop)]
+
+
+# Set in each loader process by _init_loader_worker
+_worker_processor = None
+
+
+def _init_loader_worker(settings: Dict[str, Any]):
+    """Worker initializer: one DocumentProcessor (and tokenizer) per process"""
+    global _worker_processor
+    _worker_processor = DocumentProcessor(**settings, num_workers=1, pdf_workers=1)
+
+
+def _load_file_worker(file_path: str) -> Tuple[str, Optional[List[LangChainDocument]], Optional[str]]:
+    """Worker entry point: chunk one file, returning the error instead of raising"""
+    try:
+        return file_path, _worker_processor.process_file(file_path), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+def load_model_tokenizer(model_name: str) -> Tuple[Any, int]:
+    """
+    Load a model's tokenizer and the number of tokens its encoder actually reads
+    
+    Sentence-transformers models truncate to the ``max_seq_length`` in their
+    sentence_bert_config.json (256 for all-MiniLM-L6-v2), which is often
+    shorter than the tokenizer's own ``model_max_length``.
+    
+    Args:
+        model_name: Hugging Face model id or local model directory
+        
+    Returns:
+        (tokenizer, maximum sequence length including special tokens)
+    """
+    from transformers import AutoTokenizer
+    
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    # Tokenizers without a configured limit report a huge sentinel value
+    max_seq_length = tokenizer.model_max_length if tokenizer.model_max_length < 100000 else 512
+    
+    try:
+        if os.path.isdir(model_name):
+            config_path = os.path.join(model_name, "sentence_bert_config.json")
+        else:
+            from huggingface_hub import hf_hub_download
+            config_path = hf_hub_download(model_name, "sentence_bert_config.json")
+        with open(config_path, 'r', encoding='utf-8') as f:
+            max_seq_length = min(max_seq_length, int(json.load(f)["max_seq_length"]))
+    except Exception as e:
+        logger.info(f"No sentence-transformers config for {model_name}, using tokenizer limit: {e}")
+    
+    return tokenizer, max_seq_length
+
 
 class DocumentProcessor:
     """Handles document loading, processing, and chunking"""
     
-    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                 chunking_mode: str = CHUNKING_MODE, tokenizer_model: str = CHUNK_TOKENIZER_MODEL,
+                 chunk_tokens: int = CHUNK_TOKENS, chunk_token_overlap: int = CHUNK_TOKEN_OVERLAP,
+                 parent_child: bool = PARENT_CHILD_CHUNKS, child_chunk_size: int = CHILD_CHUNK_SIZE,
+                 child_chunk_overlap: int = CHILD_CHUNK_OVERLAP, num_workers: int = DOCUMENT_LOADER_WORKERS,
+                 pdf_workers: int = PDF_EXTRACTION_WORKERS, pdf_cache_dir: Optional[str] = PDF_TEXT_CACHE_DIRECTORY):
+        """
+        Initialize the processor
+        
+        Args:
+            chunk_size: Characters per chunk in "characters" mode
+            chunk_overlap: Characters shared by neighbouring chunks in "characters" mode
+            chunking_mode: "characters", or "tokens" to size chunks with the
+                tokenizer of ``tokenizer_model`` so the encoders never truncate them
+            tokenizer_model: Model whose tokenizer and window size chunks in "tokens" mode
+            chunk_tokens: Tokens per chunk in "tokens" mode (0 = the model's window)
+            chunk_token_overlap: Tokens shared by neighbouring chunks in "tokens" mode
+            parent_child: Split every chunk into small child passages that
+                carry their parent chunk in metadata (see ``chunk_document``)
+            child_chunk_size: Characters per child passage
+            child_chunk_overlap: Characters shared by neighbouring child passages
+            num_workers: Processes used by ``process_files`` (1 = serial, 0 = one per CPU)
+            pdf_workers: Processes extracting the pages of one large PDF (1 = serial, 0 = one per CPU)
+            pdf_cache_dir: Directory of extracted PDF text keyed by content hash (None or empty = no cache)
+        """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n\n", "\n\n", "\n", ". ", " ", ""]  # Better separators for markdown
+        self.chunking_mode = chunking_mode
+        self.tokenizer_model = tokenizer_model
+        self.chunk_tokens = chunk_tokens
+        self.chunk_token_overlap = chunk_token_overlap
+        
+        if chunking_mode == "tokens":
+            self.text_splitter = self._token_splitter()
+        else:
+            self.text_splitter = self._make_splitter(chunk_size, chunk_overlap, len)
+        
+        self.num_workers = num_workers
+        self.stream_buffer_chars = STREAM_BUFFER_CHARS
+        self.pdf_workers = pdf_workers
+        self.pdf_cache_dir = pdf_cache_dir
+        self.parent_child = parent_child
+        self.child_chunk_size = child_chunk_size
+        self.child_chunk_overlap = child_chunk_overlap
+        self.child_splitter = None
+        if parent_child:
+            self.child_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=child_chunk_size,
+                chunk_overlap=child_chunk_overlap,
+                length_function=len,
+                separators=SEPARATORS
+            )
+    
+    def _token_splitter(self) -> RecursiveCharacterTextSplitter:
+        """
+        Splitter that measures chunks in model tokens
+        
+        The budget is the model's window minus its special tokens ([CLS] and
+        [SEP] for BERT-style encoders), so every token of a chunk is embedded.
+        Sets ``chunk_tokens`` to the budget actually used.
+        """
+        try:
+            tokenizer, max_seq_length = load_model_tokenizer(self.tokenizer_model)
+            budget = max_seq_length - tokenizer.num_special_tokens_to_add(pair=False)
+            if self.chunk_tokens > 0:
+                budget = min(budget, self.chunk_tokens)
+            self.chunk_tokens = budget
+            logger.info(f"Chunking to {budget} tokens of {self.tokenizer_model} "
+                        f"(window {max_seq_length}, overlap {self.chunk_token_overlap})")
+            
+            def token_length(text: str) -> int:
+                return len(tokenizer.encode(text, add_special_tokens=False))
+            
+            return self._make_splitter(budget, min(self.chunk_token_overlap, budget // 2), token_length)
+        except Exception as e:
+            # Approximate the token budget in characters rather than falling back to CHUNK_SIZE
+            budget = self.chunk_tokens if self.chunk_tokens > 0 else 256
+            logger.error(f"Could not load tokenizer {self.tokenizer_model}, "
+                         f"approximating {budget} tokens as {budget * CHARS_PER_TOKEN} characters: {str(e)}")
+            return self._make_splitter(budget * CHARS_PER_TOKEN,
+                                       min(self.chunk_token_overlap, budget // 2) * CHARS_PER_TOKEN, len)
+    
+    def _make_splitter(self, size: int, overlap: int, length_function) -> RecursiveCharacterTextSplitter:
+        """Chunk splitter; its size, overlap and length measure are kept for splitting Markdown sections"""
+        self._split_size, self._split_overlap, self._split_length = size, overlap, length_function
+        return RecursiveCharacterTextSplitter(
+            chunk_size=size,
+            chunk_overlap=overlap,
+            length_function=length_function,
+            separators=SEPARATORS
         )
     
     def load_document(self, file_path: str) -> str:
         """Load document content based on file extension"""
+        return "".join(self.iter_text(file_path))
+    
+    def iter_text(self, file_path: str) -> Iterator[str]:
+        """
+        Yield a document's text in pieces whose concatenation is the full text
+        
+        Plain text is read in blocks, PDFs page by page and DOCX files
+        paragraph by paragraph, so large files never have to be held as one
+        string; Markdown and HTML are parsed whole.
+        """
         file_path = Path(file_path)
         
         if not file_path.exists():
@@ -52,15 +321,15 @@ class DocumentProcessor:
         
         try:
             if file_path.suffix.lower() == '.pdf':
-                return self._load_pdf(file_path)
+                yield from self._iter_pdf(file_path)
             elif file_path.suffix.lower() == '.docx':
-                return self._load_docx(file_path)
+                yield from self._iter_docx(file_path)
             elif file_path.suffix.lower() == '.txt':
-                return self._load_txt(file_path)
+                yield from self._iter_txt(file_path)
             elif file_path.suffix.lower() == '.md':
-                return self._load_markdown(file_path)
+                yield self._load_markdown(file_path)
             elif file_path.suffix.lower() == '.html':
-                return self._load_html(file_path)
+                yield self._load_html(file_path)
             else:
                 raise ValueError(f"Unsupported file type: {file_path.suffix}")
                 
@@ -70,52 +339,101 @@ class DocumentProcessor:
     
     def _load_pdf(self, file_path: Path) -> str:
         """Load PDF document"""
-        text = ""
+        return "".join(self._iter_pdf(file_path))
+    
+    def _iter_pdf(self, file_path: Path) -> Iterator[str]:
+        """
+        PDF text, one page at a time
+        
+        With ``pdf_cache_dir``, the text of a PDF is written to the cache as it
+        is extracted and later reads of the same bytes stream the cached text
+        instead, which costs the same as reading a .txt file.
+        """
+        if not self.pdf_cache_dir:
+            yield from self._extract_pdf(file_path)
+            return
+        
+        digest = _pdf_digest(file_path)
+        cache_path = os.path.join(self.pdf_cache_dir, digest[:2], f"{digest}.txt")
+        if os.path.exists(cache_path):
+            logger.info(f"Using cached text of {file_path}")
+            # Extracted text can hold lone surrogates, so it is stored with surrogatepass
+            yield from self._iter_txt(Path(cache_path), errors='surrogatepass')
+            return
+        
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8', errors='surrogatepass') as cache_file:
+                for page in self._extract_pdf(file_path):
+                    cache_file.write(page)
+                    yield page
+            os.replace(tmp_path, cache_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def _extract_pdf(self, file_path: Path) -> Iterator[str]:
+        """
+        Extract PDF text page by page, in page order
+        
+        Large PDFs are split into page ranges extracted across ``pdf_workers``
+        processes; if the pool fails, the remaining ranges are extracted here.
+        """
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+            page_count = len(pdf_reader.pages)
+            workers = min(self.pdf_workers or os.cpu_count() or 1, page_count // PDF_PARALLEL_MIN_PAGES)
+            if workers <= 1:
+                for page in pdf_reader.pages:
+                    yield page.extract_text() + "\n"
+                return
+        
+        range_size = math.ceil(page_count / (workers * 4))
+        starts = list(range(0, page_count, range_size))
+        stops = [min(start + range_size, page_count) for start in starts]
+        done = 0
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for pages in executor.map(_extract_pdf_pages, [str(file_path)] * len(starts), starts, stops):
+                    done += 1
+                    yield from pages
+            logger.info(f"Extracted {page_count} pages of {file_path} across {workers} processes")
+            return
+        except Exception as e:
+            logger.warning(f"Parallel PDF extraction failed, continuing serially: {e}")
+        
+        for start, stop in zip(starts[done:], stops[done:]):
+            yield from _extract_pdf_pages(str(file_path), start, stop)
     
     def _load_docx(self, file_path: Path) -> str:
         """Load DOCX document"""
+        return "".join(self._iter_docx(file_path))
+    
+    def _iter_docx(self, file_path: Path) -> Iterator[str]:
+        """DOCX text, one paragraph at a time"""
         doc = Document(file_path)
-        text = ""
         for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
+            yield paragraph.text + "\n"
     
     def _load_txt(self, file_path: Path) -> str:
         """Load text document"""
         with open(file_path, 'r', encoding='utf-8') as file:
             return file.read()
     
+    def _iter_txt(self, file_path: Path, errors: str = 'strict') -> Iterator[str]:
+        """Text file contents in blocks of ``READ_BLOCK_CHARS`` characters"""
+        with open(file_path, 'r', encoding='utf-8', errors=errors) as file:
+            while True:
+                block = file.read(READ_BLOCK_CHARS)
+                if not block:
+                    return
+                yield block
+    
     def _load_markdown(self, file_path: Path) -> str:
-        """Load markdown document with better formatting"""
+        """Load markdown document (sectioned at chunking time, see ``_iter_markdown_chunks``)"""
         with open(file_path, 'r', encoding='utf-8') as file:
-            md_content = file.read()
-            
-        # Process markdown to keep headers with content
-        lines = md_content.split('\n')
-        processed_lines = []
-        
-        for i, line in enumerate(lines):
-            # If this is a header (starts with #), keep it with the next few lines
-            if line.strip().startswith('#'):
-                processed_lines.append(line)
-                # Add the next few lines that aren't headers
-                j = i + 1
-                while j < len(lines) and j < i + 10:  # Look ahead up to 10 lines
-                    next_line = lines[j].strip()
-                    if next_line and not next_line.startswith('#'):
-                        processed_lines.append(lines[j])
-                    elif next_line.startswith('#'):
-                        break
-                    j += 1
-            else:
-                processed_lines.append(line)
-        
-        return '\n'.join(processed_lines)
+            return file.read()
     
     def _load_html(self, file_path: Path) -> str:
         """Load HTML document"""
@@ -125,7 +443,17 @@ class DocumentProcessor:
             return soup.get_text()
     
     def chunk_document(self, text: str, metadata: Dict[str, Any] = None) -> List[LangChainDocument]:
-        """Split document into chunks"""
+        """
+        Split document into chunks
+        
+        With ``parent_child``, the returned chunks are child passages: each
+        chunk is split again into ``child_chunk_size`` pieces whose metadata
+        holds the chunk as 'parent_content', its 'parent_id' and the
+        passage's 'child_index'. Retrieval and reranking then work on the
+        short passages while the generator can be given the parent. At
+        ingest, 'parent_content' moves into a ``ParentStore`` so only the
+        'parent_id' is indexed.
+        """
         if metadata is None:
             metadata = {}
         
@@ -135,46 +463,249 @@ class DocumentProcessor:
         # Split into chunks
         chunks = self.text_splitter.split_documents([doc])
         
+        if self.parent_child:
+            parents = chunks
+            chunks = self._split_children(parents)
+            logger.info(f"Document split into {len(parents)} parent chunks and {len(chunks)} child passages")
+            return chunks
+        
         logger.info(f"Document split into {len(chunks)} chunks")
         return chunks
     
-    def process_file(self, file_path: str) -> List[LangChainDocument]:
-        """Complete processing pipeline for a single file"""
-        logger.info(f"Processing file: {file_path}")
-        
-        # Load document
-        text = self.load_document(file_path)
-        
-        # Create metadata
+    def _split_children(self, parents: List[LangChainDocument]) -> List[LangChainDocument]:
+        """
+        Split parent chunks into child passages linked back to their parent
+
+        The children of a parent share one 'parent_content' string (also
+        when pickled back from a worker); it is not copied per child.
+        """
+        children = []
+        for parent in parents:
+            source = str(parent.metadata.get('source', ''))
+            parent_id = hashlib.sha256(f"{source}\0{parent.page_content}".encode('utf-8')).hexdigest()[:32]
+            for child_index, text in enumerate(self.child_splitter.split_text(parent.page_content)):
+                child_metadata = dict(parent.metadata)
+                child_metadata.update({
+                    'parent_id': parent_id,
+                    'parent_content': parent.page_content,
+                    'child_index': child_index
+                })
+                children.append(LangChainDocument(page_content=text, metadata=child_metadata))
+        return children
+    
+    def _file_metadata(self, file_path: str) -> Dict[str, Any]:
+        """Metadata shared by every chunk of a file"""
         file_path_obj = Path(file_path)
-        metadata = {
+        return {
             "source": str(file_path),
             "filename": file_path_obj.name,
             "file_type": file_path_obj.suffix,
             "file_size": file_path_obj.stat().st_size
         }
+    
+    def _make_chunks(self, texts: List[str], metadata: Dict[str, Any]) -> List[LangChainDocument]:
+        """Documents for split texts (child passages in parent-child mode)"""
+        chunks = [LangChainDocument(page_content=text, metadata=dict(metadata)) for text in texts]
+        return self._split_children(chunks) if self.parent_child else chunks
+    
+    def iter_chunks(self, file_path: str) -> Iterator[LangChainDocument]:
+        """
+        Yield a file's chunks as its text is read
+        
+        At most about ``stream_buffer_chars`` characters of text are held at
+        a time: when the buffer fills, every chunk but the last is emitted and
+        the text from the last chunk on is carried into the next buffer, so
+        chunks never end at a buffer boundary. For files shorter than the
+        buffer the chunks are exactly those of ``chunk_document``.
+        
+        Args:
+            file_path: File to chunk
+            
+        Yields:
+            Chunks with the same metadata ``process_file`` gives them
+        """
+        metadata = self._file_metadata(file_path)
+        if Path(file_path).suffix.lower() == '.md':
+            yield from self._iter_markdown_chunks(file_path, metadata)
+            return
         
-        # Chunk document
-        chunks = self.chunk_document(text, metadata)
+        buffer: List[str] = []
+        buffered = 0
+        for piece in self.iter_text(file_path):
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered < self.stream_buffer_chars:
+                continue
+            text = "".join(buffer)
+            texts = self.text_splitter.split_text(text)
+            # Carry the raw text (not the stripped chunk) so whitespace before the next piece survives
+            tail_start = text.rfind(texts[-1]) if len(texts) > 1 else -1
+            if tail_start < 0:
+                continue
+            yield from self._make_chunks(texts[:-1], metadata)
+            tail = text[tail_start:]
+            buffer, buffered = [tail], len(tail)
         
+        if buffer:
+            yield from self._make_chunks(self.text_splitter.split_text("".join(buffer)), metadata)
+    
+    def _iter_markdown_chunks(self, file_path: str, metadata: Dict[str, Any]) -> Iterator[LangChainDocument]:
+        """
+        Chunks of a Markdown file built from its header-scoped sections
+        
+        Sections come from ``iter_markdown_sections`` as the file is read.
+        Neighbouring sections under the same parent heading are merged while
+        they fit in one chunk, so short sections do not become tiny chunks;
+        a section longer than a chunk is split with the text splitter. Every
+        chunk starts with the headings above its text as a "Title > Subtitle"
+        line, so parent titles are searchable, and records 'heading_path'
+        (the headings all of its text is under) and 'section' (the merged
+        sections' own headings, "; "-separated).
+        """
+        group: List[Tuple[List[str], str]] = []
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for path, text in iter_markdown_sections(file):
+                if group and (path[:-1] != group[0][0][:-1] or
+                              not self._fits(path[:-1], "".join(t for _, t in group) + text)):
+                    yield from self._markdown_group_chunks(group, metadata)
+                    group = []
+                group.append((path, text))
+        if group:
+            yield from self._markdown_group_chunks(group, metadata)
+    
+    @staticmethod
+    def _heading_context(path: List[str]) -> str:
+        """Line naming the headings above a chunk's text (empty at the top of the document)"""
+        titles = [title for title in path if title]
+        return f"{' > '.join(titles)}\n\n" if titles else ""
+    
+    def _fits(self, parent_path: List[str], text: str) -> bool:
+        return self._split_length(self._heading_context(parent_path) + text) <= self._split_size
+    
+    def _markdown_group_chunks(self, group: List[Tuple[List[str], str]],
+                               metadata: Dict[str, Any]) -> Iterator[LangChainDocument]:
+        """Chunks for sibling sections merged by ``_iter_markdown_chunks``"""
+        if len(group) > 1 or self._fits(group[0][0][:-1], group[0][1]):
+            path = group[0][0] if len(group) == 1 else group[0][0][:-1]
+            texts = [self._heading_context(group[0][0][:-1]) + "".join(text for _, text in group).strip()]
+        else:
+            # One long section: the context line names the section itself,
+            # so its heading line is not repeated in the first piece
+            path, text = group[0]
+            if path:
+                text = text.split("\n", 1)[1] if "\n" in text else ""
+            context = self._heading_context(path)
+            size = max(self._split_size - self._split_length(context), self._split_size // 2)
+            texts = [context + piece for piece in self._make_section_splitter(size).split_text(text)]
+        section_metadata = dict(metadata)
+        section_metadata['heading_path'] = " > ".join(path)
+        section_metadata['section'] = "; ".join(section_path[-1] for section_path, _ in group if section_path)
+        yield from self._make_chunks(texts, section_metadata)
+    
+    def _make_section_splitter(self, size: int) -> RecursiveCharacterTextSplitter:
+        """Splitter like ``text_splitter`` with a smaller chunk size"""
+        return RecursiveCharacterTextSplitter(
+            chunk_size=size,
+            chunk_overlap=min(self._split_overlap, size // 2),
+            length_function=self._split_length,
+            separators=SEPARATORS
+        )
+    
+    def iter_directory_chunks(self, directory_path: str) -> Iterator[LangChainDocument]:
+        """
+        Yield the chunks of every supported file under a directory, file by file
+        
+        Files are visited in ``scan_directory`` order. A file that fails to
+        load is logged and skipped; chunks it yielded before failing have
+        already been emitted.
+        """
+        if not os.path.isdir(directory_path):
+            raise FileNotFoundError(f"Directory not found: {directory_path}")
+        
+        for file_path in scan_directory(directory_path):
+            try:
+                yield from self.iter_chunks(file_path)
+            except Exception as e:
+                logger.error(f"Error processing {file_path}: {str(e)}")
+    
+    def process_file(self, file_path: str) -> List[LangChainDocument]:
+        """Complete processing pipeline for a single file"""
+        logger.info(f"Processing file: {file_path}")
+        
+        chunks = list(self.iter_chunks(file_path))
+        
+        logger.info(f"Document split into {len(chunks)} chunks")
         return chunks
     
+    def _settings(self) -> Dict[str, Any]:
+        """Constructor arguments that reproduce this processor in a worker process"""
+        return {
+            'chunk_size': self.chunk_size,
+            'chunk_overlap': self.chunk_overlap,
+            'chunking_mode': self.chunking_mode,
+            'tokenizer_model': self.tokenizer_model,
+            'chunk_tokens': self.chunk_tokens,
+            'chunk_token_overlap': self.chunk_token_overlap,
+            'parent_child': self.parent_child,
+            'child_chunk_size': self.child_chunk_size,
+            'child_chunk_overlap': self.child_chunk_overlap,
+            'pdf_cache_dir': self.pdf_cache_dir
+        }
+    
+    def process_files(self, file_paths: List[str],
+                      stream: bool = False) -> Iterator[Tuple[str, Optional[Iterable[LangChainDocument]], Optional[str]]]:
+        """
+        Load and chunk files, in parallel when ``num_workers`` allows
+        
+        Results stream back in input order whatever order the workers finish
+        in. A file that fails yields its error instead of chunks and does not
+        affect the others. If the pool itself breaks, the remaining files are
+        processed serially.
+        
+        Args:
+            file_paths: Files to process
+            stream: Files processed in this process yield ``iter_chunks``
+                itself, so a large file is never held as a whole list; its
+                errors are raised while the chunks are read instead of being
+                yielded. Pool workers still return each file's chunks as a
+                list (they are pickled back in one piece).
+            
+        Yields:
+            (file_path, chunks, None) on success or (file_path, None, error)
+        """
+        workers = min(self.num_workers or os.cpu_count() or 1, len(file_paths))
+        done = 0
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_loader_worker,
+                                         initargs=(self._settings(),)) as executor:
+                    for result in executor.map(_load_file_worker, file_paths):
+                        done += 1
+                        yield result
+                return
+            except Exception as e:
+                logger.warning(f"Parallel loading failed after {done} files, continuing serially: {e}")
+        
+        for file_path in file_paths[done:]:
+            if stream:
+                yield file_path, self.iter_chunks(file_path), None
+                continue
+            try:
+                yield file_path, self.process_file(file_path), None
+            except Exception as e:
+                yield file_path, None, str(e)
+    
     def process_directory(self, directory_path: str) -> List[LangChainDocument]:
         """Process all supported files in a directory"""
-        directory = Path(directory_path)
-        all_chunks = []
+        if not os.path.isdir(directory_path):
+            raise FileNotFoundError(f"Directory not found: {directory_path}")
         
-        if not directory.exists():
-            raise FileNotFoundError(f"Directory not found: {directory}")
-        
-        for file_path in directory.rglob("*"):
-            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                try:
-                    chunks = self.process_file(str(file_path))
-                    all_chunks.extend(chunks)
-                except Exception as e:
-                    logger.error(f"Error processing {file_path}: {str(e)}")
-                    continue
+        all_chunks = []
+        for file_path, chunks, error in self.process_files(scan_directory(directory_path)):
+            if error is not None:
+                logger.error(f"Error processing {file_path}: {error}")
+                continue
+            all_chunks.extend(chunks)
         
         logger.info(f"Processed {len(all_chunks)} total chunks from directory")
         return all_chunks
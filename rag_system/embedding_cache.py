@@ -0,0 +1,136 @@
+"""
+LRU cache of query embeddings in front of an embedding model
+"""
+import atexit
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Cache key for a query: lowercased, with runs of whitespace collapsed"""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class CachedQueryEmbeddings:
+    """
+    Wraps a LangChain embeddings object and memoizes ``embed_query``
+
+    Document embeddings are passed through untouched. Because the wrapper is
+    handed to Chroma as its embedding function, every similarity search on the
+    vector store goes through the cache.
+    """
+
+    def __init__(self, embeddings, model_name: str, max_size: int = 10000,
+                 cache_path: Optional[str] = None):
+        """
+        Initialize the cache
+
+        Args:
+            embeddings: Underlying LangChain embeddings object
+            model_name: Embedding model name; a persisted cache for another model is ignored
+            max_size: Maximum number of cached queries
+            cache_path: ``.npz`` file the cache is loaded from and saved to at exit (None = memory only)
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_size = max_size
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # Dense searches run on the retrieval thread pool
+        self._lock = threading.Lock()
+
+        if cache_path:
+            self.load()
+            atexit.register(self.save)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents with the underlying model (not cached)"""
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing the stored vector for a repeated question"""
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+            self.misses += 1
+
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return vector.tolist()
+
+    def cache_info(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._cache),
+            'max_size': self.max_size
+        }
+
+    def clear(self):
+        """Drop all cached vectors and reset the counters"""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def load(self):
+        """Load cached vectors from ``cache_path`` if it holds a cache for this model"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as data:
+                if str(data['model']) != self.model_name:
+                    logger.info(f"Ignoring query embedding cache {self.cache_path} built for model {data['model']}")
+                    return
+                keys = data['keys'].tolist()
+                vectors = data['vectors']
+            with self._lock:
+                # Keep the most recently used entries, which are saved last
+                for key, vector in list(zip(keys, vectors))[-self.max_size:]:
+                    self._cache[key] = vector
+            logger.info(f"Loaded {len(self._cache)} cached query embeddings from {self.cache_path}")
+        except Exception as e:
+            logger.warning(f"Could not load query embedding cache {self.cache_path}: {e}")
+
+    def save(self):
+        """Write the cache to ``cache_path`` atomically, least recently used first"""
+        if not self.cache_path:
+            return
+        with self._lock:
+            keys = list(self._cache)
+            vectors = list(self._cache.values())
+        if not keys:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp.npz"
+            np.savez(tmp_path, model=np.array(self.model_name), keys=np.array(keys),
+                     vectors=np.stack(vectors))
+            os.replace(tmp_path, self.cache_path)
+            logger.info(f"Saved {len(keys)} query embeddings to {self.cache_path}")
+        except Exception as e:
+            logger.warning(f"Could not save query embedding cache {self.cache_path}: {e}")
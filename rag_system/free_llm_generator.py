@@ -30,8 +30,10 @@ class LLMAnswerResult:
 class FreeLLMGenerator:
     """Free LLM answer generator supporting multiple providers"""
     
-    def __init__(self, provider: str = "deepseek"):
+    def __init__(self, provider: str = "deepseek", context_chars: Optional[int] = 500):
         self.provider = provider.lower()
+        # Characters of each document put in the prompt (None = the whole document)
+        self.context_chars = context_chars
         self.api_key = self._get_api_key()
         
         if not self.api_key:
@@ -88,7 +90,9 @@ class FreeLLMGenerator:
             content = self._clean_content(content)
             
             if content and len(content) > 50:
-                context_parts.append(f"Source: {source}\nContent: {content[:500]}...")
+                if self.context_chars is not None and len(content) > self.context_chars:
+                    content = f"{content[:self.context_chars]}..."
+                context_parts.append(f"Source: {source}\nContent: {content}")
         
         return "\n\n".join(context_parts)
     
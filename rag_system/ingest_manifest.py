@@ -0,0 +1,115 @@
+"""
+File-level change detection for incremental document ingestion
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import List, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file's contents in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """On-disk record of ingested files and the chunk ids each one produced"""
+
+    def __init__(self, manifest_path: str):
+        """
+        Load the manifest, starting empty if it does not exist yet
+
+        Args:
+            manifest_path: JSON file holding the manifest
+        """
+        self.manifest_path = manifest_path
+        self.files: Dict[str, Dict[str, Any]] = {}
+
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.files = data.get('files', {})
+                else:
+                    logger.warning(f"Ignoring manifest {manifest_path} with unsupported version {data.get('version')}")
+            except Exception as e:
+                logger.warning(f"Could not read manifest {manifest_path}, starting fresh: {e}")
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.normpath(file_path)
+
+    def diff(self, file_paths: List[str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Compare files on disk against the manifest
+
+        Size and mtime are checked first; a file whose stat changed is hashed
+        and only counts as modified if its contents differ.
+
+        Args:
+            file_paths: Files currently present
+
+        Returns:
+            (new or modified paths, unchanged paths, manifest keys of deleted files)
+        """
+        changed, unchanged = [], []
+        present = set()
+
+        for file_path in file_paths:
+            key = self._key(file_path)
+            present.add(key)
+            entry = self.files.get(key)
+            if entry is None:
+                changed.append(file_path)
+                continue
+
+            stat = os.stat(file_path)
+            if stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']:
+                unchanged.append(file_path)
+            elif file_sha256(file_path) == entry['sha256']:
+                # Touched but identical; remember the new stat to skip hashing next time
+                entry['size'] = stat.st_size
+                entry['mtime'] = stat.st_mtime
+                unchanged.append(file_path)
+            else:
+                changed.append(file_path)
+
+        deleted = [key for key in self.files if key not in present]
+        return changed, unchanged, deleted
+
+    def chunk_ids(self, file_path: str) -> List[str]:
+        """Chunk ids recorded for a file (empty if unknown)"""
+        entry = self.files.get(self._key(file_path))
+        return list(entry['chunk_ids']) if entry else []
+
+    def record(self, file_path: str, chunk_ids: List[str]):
+        """Record a freshly ingested file"""
+        stat = os.stat(file_path)
+        self.files[self._key(file_path)] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': file_sha256(file_path),
+            'chunk_ids': chunk_ids
+        }
+
+    def remove(self, file_path: str):
+        """Forget a file"""
+        self.files.pop(self._key(file_path), None)
+
+    def save(self):
+        """Write the manifest atomically"""
+        os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.files}, f)
+        os.replace(tmp_path, self.manifest_path)
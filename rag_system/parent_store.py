@@ -0,0 +1,86 @@
+"""
+Parent chunk texts for parent-child retrieval, stored once per parent
+"""
+import json
+import logging
+import os
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+PARENT_STORE_VERSION = 1
+PARENTS_FILE = "parents.json"
+
+
+class ParentStore:
+    """
+    On-disk map of parent id to parent chunk text
+
+    Child passages only carry their 'parent_id'; the parent text lives here
+    instead of being repeated in the metadata of every child in the vector
+    store, the BM25 document store and snapshots.
+    """
+
+    def __init__(self, path: str):
+        """
+        Load the store, starting empty if it does not exist yet
+
+        Args:
+            path: JSON file holding the store
+        """
+        self.path = path
+        self.parents: Dict[str, str] = {}
+        self._dirty = False
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == PARENT_STORE_VERSION:
+                    self.parents = data.get('parents', {})
+                else:
+                    logger.warning(f"Ignoring parent store {path} with unsupported version {data.get('version')}")
+            except Exception as e:
+                logger.warning(f"Could not read parent store {path}, starting fresh: {e}")
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def add(self, parent_id: str, content: str):
+        """Record a parent chunk (a no-op if it is already known)"""
+        if parent_id not in self.parents:
+            self.parents[parent_id] = content
+            self._dirty = True
+
+    def get(self, parent_id: str) -> Optional[str]:
+        """Text of a parent chunk (None if unknown)"""
+        return self.parents.get(parent_id)
+
+    def prune(self, live_ids: Iterable[str]) -> int:
+        """
+        Forget parents no indexed child refers to any more
+
+        Args:
+            live_ids: Parent ids of every indexed child
+
+        Returns:
+            Number of parents removed
+        """
+        live_ids = set(live_ids)
+        dropped = [parent_id for parent_id in self.parents if parent_id not in live_ids]
+        for parent_id in dropped:
+            del self.parents[parent_id]
+        if dropped:
+            self._dirty = True
+        return len(dropped)
+
+    def save(self):
+        """Write the store atomically if it changed since it was loaded"""
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': PARENT_STORE_VERSION, 'parents': self.parents}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
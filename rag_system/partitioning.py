@@ -0,0 +1,227 @@
+"""
+Species/topic tagging of chunks and routing of queries to index partitions
+"""
+import logging
+import os
+import re
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Mirrors the "dog"/"cat" entries of chatbot_flow.synonyms plus common breeds
+SPECIES_TERMS = {
+    'cat': {'cat', 'cats', 'kitty', 'kitties', 'kitten', 'kittens', 'feline', 'felines', 'tomcat',
+            'persian', 'siamese', 'bengal', 'sphynx', 'ragdoll', 'shorthair'},
+    'dog': {'dog', 'dogs', 'pup', 'pups', 'puppy', 'puppies', 'doggo', 'canine', 'canines',
+            'husky', 'retriever', 'labrador', 'poodle', 'beagle', 'chihuahua', 'shepherd', 'bulldog',
+            'terrier', 'spaniel', 'rottweiler', 'dachshund', 'leash', 'kennel'}
+}
+
+TOPIC_TERMS = {
+    'nutrition': {'food', 'foods', 'feed', 'feeding', 'diet', 'diets', 'nutrition', 'nutrient', 'nutrients',
+                  'protein', 'calorie', 'calories', 'meal', 'meals', 'treat', 'treats', 'eat', 'eating',
+                  'kibble', 'taurine', 'vitamin', 'vitamins', 'water', 'hydration'},
+    'vaccination': {'vaccine', 'vaccines', 'vaccination', 'vaccinations', 'vaccinate', 'booster', 'boosters',
+                    'rabies', 'distemper', 'parvovirus', 'parvo', 'immunization', 'shots', 'titer'},
+    'senior_care': {'senior', 'seniors', 'elderly', 'aging', 'ageing', 'geriatric', 'arthritis', 'older'},
+    'health': {'disease', 'diseases', 'symptom', 'symptoms', 'illness', 'sick', 'vet', 'veterinarian',
+               'parasite', 'parasites', 'flea', 'fleas', 'tick', 'ticks', 'worm', 'worms', 'infection',
+               'vomiting', 'diarrhea', 'diarrhoea', 'medication', 'dental', 'teeth', 'spay', 'neuter'},
+    'behavior': {'behavior', 'behaviour', 'training', 'train', 'bark', 'barking', 'scratch', 'scratching',
+                 'aggression', 'aggressive', 'anxiety', 'socialization', 'socialisation', 'bite', 'biting'},
+    'grooming': {'groom', 'grooming', 'brush', 'brushing', 'bath', 'bathing', 'coat', 'shedding', 'nail',
+                 'nails', 'fur'},
+    'breeds': {'breed', 'breeds', 'breeding', 'pedigree', 'temperament'}
+}
+
+GENERAL = "general"
+BOTH_SPECIES = "both"
+
+_WORD_PATTERN = re.compile(r"[a-z]+")
+
+
+def _term_counts(text: str, vocabularies: Dict[str, set]) -> Dict[str, int]:
+    counts = {name: 0 for name in vocabularies}
+    for word in _WORD_PATTERN.findall(text.lower()):
+        for name, terms in vocabularies.items():
+            if word in terms:
+                counts[name] += 1
+    return counts
+
+
+def tag_chunk(text: str, source: str = "", min_hits: int = 2, dominance: float = 2.0) -> Dict[str, str]:
+    """
+    Tag a chunk with its species and main topic
+
+    The file name counts as strong evidence for species (e.g. "Kitten-book"),
+    so chunks of a single-species guide are tagged even when a passage does
+    not name the animal.
+
+    Args:
+        text: Chunk text
+        source: File name or path of the chunk's document
+        min_hits: Keyword hits needed before a species or topic is assigned
+        dominance: How many times more hits the leading label needs than the runner-up
+
+    Returns:
+        Metadata with 'species' ('cat', 'dog', 'both' or 'general'), 'topic'
+        (main TOPIC_TERMS key or 'general') and a 'topic_<name>' flag per topic
+        (scalar values only, so the tags can be used in Chroma filters)
+    """
+    species_counts = _term_counts(text, SPECIES_TERMS)
+    source_counts = _term_counts(os.path.basename(source).replace('-', ' ').replace('_', ' '), SPECIES_TERMS)
+    for name, hits in source_counts.items():
+        species_counts[name] += hits * min_hits
+
+    cat_hits, dog_hits = species_counts['cat'], species_counts['dog']
+    if max(cat_hits, dog_hits) < min_hits:
+        species = GENERAL
+    elif cat_hits >= dominance * dog_hits:
+        species = 'cat'
+    elif dog_hits >= dominance * cat_hits:
+        species = 'dog'
+    else:
+        species = BOTH_SPECIES
+
+    topic_counts = _term_counts(text, TOPIC_TERMS)
+    ranked = sorted(topic_counts.items(), key=lambda item: -item[1])
+    matched = [name for name, hits in ranked if hits >= min_hits]
+    topic = matched[0] if matched and (len(ranked) < 2 or ranked[0][1] >= dominance * ranked[1][1]) else GENERAL
+
+    tags = {'species': species, 'topic': topic}
+    for name in TOPIC_TERMS:
+        tags[f"topic_{name}"] = name in matched
+    return tags
+
+
+def matches_filter(metadata: Dict[str, Any], filter_dict: Dict[str, Any]) -> bool:
+    """Chroma-style metadata filter: plain equality, ``$eq``, ``$ne``, ``$in``, ``$nin``, ``$and``, ``$or``"""
+    for key, condition in filter_dict.items():
+        if key == '$and':
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == '$eq' and value != operand:
+                    return False
+                if op == '$ne' and value == operand:
+                    return False
+                if op == '$in' and value not in operand:
+                    return False
+                if op == '$nin' and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def group_rows(metadatas: List[Dict[str, Any]], field: str) -> Dict[Any, List[int]]:
+    """Row numbers of ``metadatas`` grouped by the value of ``field``"""
+    groups: Dict[Any, List[int]] = {}
+    for i, metadata in enumerate(metadatas):
+        value = metadata.get(field)
+        if value is not None:
+            groups.setdefault(value, []).append(i)
+    return groups
+
+
+def filter_rows(metadatas: List[Dict[str, Any]], filter_dict: Dict[str, Any],
+                groups: Optional[Dict[str, Dict[Any, List[int]]]] = None) -> List[int]:
+    """
+    Row numbers of ``metadatas`` that match a filter, ascending
+
+    Args:
+        metadatas: Metadata per row
+        filter_dict: Chroma-style filter (see ``matches_filter``)
+        groups: Field -> value -> rows (``group_rows``). When the filter
+            pins a grouped field at top level (plain value, ``$eq`` or ``$in``,
+            possibly inside a top-level ``$and``), only that field's rows are
+            checked instead of every row, e.g. the chunks of a few documents.
+    """
+    rows = None
+    if groups:
+        clauses = filter_dict['$and'] if list(filter_dict) == ['$and'] else [filter_dict]
+        for clause in clauses:
+            for field, condition in clause.items():
+                if field not in groups:
+                    continue
+                if not isinstance(condition, dict):
+                    values = [condition]
+                elif list(condition) == ['$eq']:
+                    values = [condition['$eq']]
+                elif list(condition) == ['$in']:
+                    values = condition['$in']
+                else:
+                    continue
+                pinned = set()
+                for value in values:
+                    pinned.update(groups[field].get(value, ()))
+                rows = pinned if rows is None else rows & pinned
+
+    candidates = range(len(metadatas)) if rows is None else sorted(i for i in rows if i < len(metadatas))
+    return [i for i in candidates if matches_filter(metadatas[i], filter_dict)]
+
+
+class QueryRouter:
+    """Picks the species/topic partition a question should search"""
+
+    def __init__(self, min_confidence: float = 0.5, route_topics: bool = True,
+                 min_topic_hits: int = 2, topic_dominance: float = 2.0):
+        """
+        Initialize router
+
+        Args:
+            min_confidence: Below this the query searches the global index
+            route_topics: Also narrow by topic when the question clearly names one
+            min_topic_hits: Topic keyword hits needed before narrowing by topic
+            topic_dominance: How many times more hits the topic needs than the runner-up
+        """
+        self.min_confidence = min_confidence
+        self.route_topics = route_topics
+        self.min_topic_hits = min_topic_hits
+        self.topic_dominance = topic_dominance
+
+    def route(self, question: str, pet_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Route a question
+
+        Species named in the question win; otherwise ``pet_type`` (e.g. the
+        entity extractor's PET_TYPE) is used with lower confidence.
+
+        Returns:
+            Dict with 'species', 'topic', 'confidence' and 'filter' (a metadata
+            filter for both retrievers, or None to search everything)
+        """
+        species_counts = _term_counts(question, SPECIES_TERMS)
+        named = [name for name, hits in species_counts.items() if hits]
+
+        species, confidence = None, 0.0
+        if len(named) == 1:
+            species, confidence = named[0], 0.9
+        elif not named and pet_type:
+            # PET_TYPE is the word the user typed ("puppy", "kitten", ...)
+            species = next((name for name, terms in SPECIES_TERMS.items() if pet_type.lower() in terms), None)
+            confidence = 0.6 if species else 0.0
+
+        # A single keyword ("water", "older") is too weak to drop the other topics' chunks
+        topic = None
+        if self.route_topics:
+            ranked = sorted(_term_counts(question, TOPIC_TERMS).items(), key=lambda item: -item[1])
+            (leader, hits), (_, runner_up) = ranked[0], ranked[1]
+            if hits >= self.min_topic_hits and hits >= self.topic_dominance * runner_up:
+                topic = leader
+
+        route = {'species': species, 'topic': topic, 'confidence': confidence, 'filter': None}
+        if species is None or confidence < self.min_confidence:
+            return route
+
+        # Chunks specific to the other animal are excluded; shared and species-neutral chunks stay
+        clauses: List[Dict[str, Any]] = [{'species': {'$in': [species, BOTH_SPECIES, GENERAL]}}]
+        if topic is not None:
+            clauses.append({'$or': [{f"topic_{topic}": True}, {'topic': GENERAL}]})
+        route['filter'] = clauses[0] if len(clauses) == 1 else {'$and': clauses}
+        return route
@@ -1,20 +1,61 @@
 """
 Proposed RAG System: BM25 + Dense + RRF + Cross-encoder + Extractive Generation
 """
+import hashlib
+import json
 import logging
+import os
+import shutil
 import time
-from typing import List, Dict, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from dataclasses import dataclass
 
+import numpy as np
+
 from .bm25_retriever import BM25Retriever, HybridRetriever
 from .rrf_fusion import RRFFusion
 from .cross_encoder_reranker import CrossEncoderReranker
 from .free_llm_generator import FreeLLMGenerator, LLMAnswerResult
-from .vector_store import VectorStoreManager
-from .document_processor import DocumentProcessor
+from .vector_store import VectorStoreManager, make_chunk_id
+from .document_processor import DocumentProcessor, scan_directory
+from .ingest_manifest import IngestManifest
+from .parent_store import ParentStore, PARENTS_FILE
+from .tokenizer import get_default_tokenizer
+from .partitioning import QueryRouter, tag_chunk
+from .document_index import DocumentIndex
+from .dedup import NearDuplicateIndex, dedup_stats
+
+from config import (
+    BM25_TOKENIZER_WORKERS, RETRIEVAL_TIMEOUT_SECONDS, RAG_INDEX_DIRECTORY, TWO_STAGE_TOP_DOCUMENTS,
+    INGEST_BATCH_SIZE, NEAR_DUPLICATE_THRESHOLD
+)
 
 logger = logging.getLogger(__name__)
 
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_META_FILE = "snapshot.json"
+SNAPSHOT_CHUNKS_FILE = "chunks.jsonl"
+SNAPSHOT_EMBEDDINGS_FILE = "embeddings.npy"
+NEAR_DUPLICATES_FILE = "near_duplicates.npz"
+
+
+def _merge_ingest_stats(stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the per-batch ``last_ingest_stats`` of a batched ingest"""
+    stats = [batch for batch in stats if batch]
+    if not stats:
+        return {}
+    chunks = sum(batch['chunks'] for batch in stats)
+    embed_seconds = sum(batch['embed_seconds'] for batch in stats)
+    write_seconds = sum(batch['write_seconds'] for batch in stats)
+    total = embed_seconds + write_seconds
+    return {
+        'chunks': chunks,
+        'embed_seconds': embed_seconds,
+        'write_seconds': write_seconds,
+        'chunks_per_second': chunks / total if total > 0 else 0.0
+    }
+
 @dataclass
 class ProposedRAGResult:
     """Result from the proposed RAG system"""
@@ -38,11 +79,30 @@ class ProposedRAGSystem:
         """
         self.collection_name = collection_name
         self.use_openai = use_openai
+        # Manifest and BM25 index kept next to the vector collection
+        self.index_dir = os.path.join(RAG_INDEX_DIRECTORY, collection_name)
         
         # Initialize components
         self.document_processor = DocumentProcessor()
+        # Parent chunk texts of child passages, stored once instead of in every child's metadata
+        self.parent_store = ParentStore(os.path.join(self.index_dir, PARENTS_FILE))
+        # Chunks embedded and indexed at a time, so ingest never holds a whole corpus of documents
+        self.ingest_batch_size = INGEST_BATCH_SIZE
+        # Chunks this similar to an indexed chunk are not indexed again (0 = keep every chunk)
+        self.near_duplicate_threshold = NEAR_DUPLICATE_THRESHOLD
         self.vector_manager = VectorStoreManager(collection_name, use_openai)
         self.bm25_retriever = None
+        # Shared by all queries so BM25 and dense search can overlap
+        self.retrieval_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+        # Retriever -> its last search that timed out; no new search is queued behind it until it ends
+        self._abandoned_searches: Dict[str, Future] = {}
+        self.retrieval_timeout = RETRIEVAL_TIMEOUT_SECONDS
+        # Species/topic routing; a partition search with fewer hits than this falls back to the whole corpus
+        self.router = QueryRouter()
+        self.partition_min_results = 5
+        # Two-stage retrieval: documents searched per query (0 = flat chunk search)
+        self.top_documents = TWO_STAGE_TOP_DOCUMENTS
+        self.document_index: Optional[DocumentIndex] = None
         self.rrf_fusion = RRFFusion(k=60)
         self.reranker = CrossEncoderReranker()
         # Try free LLM providers in order of preference
@@ -57,6 +117,9 @@ class ProposedRAGSystem:
                 # Fallback to basic generation (no LLM)
                 self.answer_generator = FreeLLMGenerator(provider="basic")
                 logger.info("Using basic answer generation (no LLM)")
+        if self.document_processor.parent_child:
+            # Parent chunks are already bounded by the chunk size; pass them whole
+            self.answer_generator.context_chars = None
         
         # Performance tracking
         self.query_count = 0
@@ -64,6 +127,118 @@ class ProposedRAGSystem:
         
         logger.info("Proposed RAG system initialized successfully")
     
+    def _tag_chunks(self, file_path: str, docs: Iterable) -> Iterator:
+        """
+        Tag every chunk of a file with its file path, content-addressed id, species and topic
+        
+        Chunks are tagged as they are read from ``docs``. Child passages are
+        tagged from their parent chunk, which holds more evidence; the parent
+        text moves from their metadata into the parent store.
+        """
+        for doc in docs:
+            doc.metadata['file_path'] = file_path
+            doc.metadata['chunk_id'] = make_chunk_id(doc.page_content, doc.metadata)
+            parent_content = doc.metadata.pop('parent_content', None)
+            if parent_content is not None:
+                self.parent_store.add(doc.metadata['parent_id'], parent_content)
+            doc.metadata.update(tag_chunk(parent_content or doc.page_content, file_path))
+            yield doc
+    
+    def _drop_near_duplicates(self, near_duplicates: NearDuplicateIndex, file_path: str, docs: Iterable,
+                              exclude: set, changed: set, counts: Dict[str, int]) -> Iterator:
+        """
+        Keep the chunks of a file that have no near-copy among the canonical chunks
+        
+        A kept chunk becomes canonical itself. A dropped chunk's file is added
+        to the alternate sources of the chunk it duplicates.
+        
+        Args:
+            near_duplicates: Canonical chunks indexed so far
+            file_path: File the chunks come from
+            docs: Tagged chunks of the file
+            exclude: Canonical chunk ids that may be retracted, which must not
+                absorb copies; read again for every chunk, so the caller may
+                shrink it while the chunks stream
+            changed: Collects ids of canonical chunks whose alternate sources changed
+            counts: Running 'chunks', 'chars', 'dropped' and 'dropped_chars' totals
+            
+        Yields:
+            Chunks to index
+        """
+        source = os.path.normpath(file_path)
+        for doc in docs:
+            chunk_id = doc.metadata['chunk_id']
+            counts['chunks'] += 1
+            counts['chars'] += len(doc.page_content)
+            if chunk_id in near_duplicates.signatures:
+                # Already canonical, e.g. an unchanged passage of an edited file
+                yield doc
+                continue
+            signature = near_duplicates.signature(doc.page_content)
+            match = near_duplicates.find(signature, exclude) if signature is not None else None
+            if match is None:
+                if signature is not None:
+                    near_duplicates.add(chunk_id, signature, source)
+                yield doc
+                continue
+            counts['dropped'] += 1
+            counts['dropped_chars'] += len(doc.page_content)
+            if near_duplicates.add_alternate(match, source):
+                changed.add(match)
+    
+    @staticmethod
+    def _claim_ids(docs: Iterable, retracting: set) -> Iterator:
+        """Pass chunks through, taking each one's id out of ``retracting`` as it arrives"""
+        for doc in docs:
+            retracting.discard(doc.metadata['chunk_id'])
+            yield doc
+    
+    @staticmethod
+    def _alternate_source_updates(near_duplicates: NearDuplicateIndex, chunk_ids) -> Dict[str, Dict[str, Any]]:
+        """'alternate_sources' metadata (sources joined with "; ", empty if none) for canonical chunks"""
+        return {chunk_id: {'alternate_sources': "; ".join(near_duplicates.alternates.get(chunk_id, []))}
+                for chunk_id in chunk_ids if chunk_id in near_duplicates.signatures}
+    
+    @staticmethod
+    def _report_near_duplicates(near_duplicates: NearDuplicateIndex, counts: Dict[str, int]) -> Dict[str, Any]:
+        """Log and return what near-duplicate removal saved during an ingest"""
+        stats = dedup_stats(counts['chunks'], counts['dropped'], counts['dropped_chars'], counts['chars'],
+                            len(near_duplicates.alternates))
+        logger.info(f"Near-duplicate removal dropped {stats['chunks_dropped']} of {stats['chunks_seen']} chunks "
+                    f"({stats['chunk_savings']:.1%} of chunks, {stats['char_savings']:.1%} of text); "
+                    f"{stats['clusters']} indexed chunks have copies in other files")
+        return stats
+    
+    def _load_near_duplicates(self) -> Optional[NearDuplicateIndex]:
+        """
+        Canonical-chunk index saved by a previous ingest (None when near-duplicate removal is off)
+        
+        Without a saved index, the chunks already in the BM25 index are
+        registered as canonical, so new chunks are compared against them too.
+        """
+        if self.near_duplicate_threshold <= 0:
+            return None
+        path = os.path.join(self.index_dir, NEAR_DUPLICATES_FILE)
+        if os.path.exists(path):
+            try:
+                # Signatures do not depend on the threshold; a new one applies to chunks ingested from now on
+                return NearDuplicateIndex.load(path, self.near_duplicate_threshold)
+            except Exception as e:
+                logger.warning(f"Could not load near-duplicate index from {path}, rebuilding: {e}")
+        
+        near_duplicates = NearDuplicateIndex(self.near_duplicate_threshold)
+        if self.bm25_retriever is not None:
+            deleted = self.bm25_retriever.bm25.deleted
+            for i, (text, metadata) in enumerate(zip(self.bm25_retriever.documents,
+                                                     self.bm25_retriever.document_metadata)):
+                if i in deleted or not metadata.get('chunk_id'):
+                    continue
+                signature = near_duplicates.signature(text)
+                if signature is not None:
+                    near_duplicates.add(metadata['chunk_id'], signature,
+                                        os.path.normpath(metadata.get('file_path', metadata.get('source', ''))))
+        return near_duplicates
+    
     def ingest_documents(self, file_paths: List[str]) -> Dict[str, Any]:
         """
         Ingest documents into the system
@@ -77,37 +252,63 @@ class ProposedRAGSystem:
         try:
             logger.info(f"Ingesting {len(file_paths)} documents")
             
-            # Process documents
-            all_documents = []
-            all_metadata = []
-            
-            for file_path in file_paths:
-                docs = self.document_processor.process_file(file_path)
-                all_documents.extend(docs)
-                
-                # Extract metadata
-                for doc in docs:
-                    metadata = doc.metadata.copy()
-                    metadata['file_path'] = file_path
-                    all_metadata.append(metadata)
+            # Chunks stream into the vector store in batches, flushed mid-file for
+            # large files; BM25 is built once from their texts
+            vector_store = self.vector_manager.vector_store
+            document_texts, all_metadata, batch, batch_stats = [], [], [], []
+            near_duplicates = NearDuplicateIndex(self.near_duplicate_threshold) \
+                if self.near_duplicate_threshold > 0 else None
+            dedup_counts = {'chunks': 0, 'chars': 0, 'dropped': 0, 'dropped_chars': 0}
+            with_alternates = set()
             
-            # Add to vector store
-            self.vector_manager.ingest_documents(all_documents)
+            def flush():
+                if batch:
+                    vector_store.add_documents(batch, persist=False)
+                    batch_stats.append(vector_store.last_ingest_stats)
+                    batch.clear()
             
-            # Prepare documents for BM25
-            document_texts = [doc.page_content for doc in all_documents]
+            # One encode pool serves every batch
+            with vector_store.encode_pool():
+                for file_path, docs, error in self.document_processor.process_files(file_paths, stream=True):
+                    if error is not None:
+                        raise RuntimeError(f"Error processing {file_path}: {error}")
+                    docs = self._tag_chunks(file_path, docs)
+                    if near_duplicates is not None:
+                        docs = self._drop_near_duplicates(near_duplicates, file_path, docs, set(),
+                                                          with_alternates, dedup_counts)
+                    for doc in docs:
+                        document_texts.append(doc.page_content)
+                        all_metadata.append(doc.metadata.copy())
+                        batch.append(doc)
+                        if len(batch) >= self.ingest_batch_size:
+                            flush()
+                flush()
+            if with_alternates:
+                updates = self._alternate_source_updates(near_duplicates, with_alternates)
+                vector_store.update_metadata(updates, persist=False)
+                for metadata in all_metadata:
+                    metadata.update(updates.get(metadata['chunk_id'], {}))
+            vector_store.persist()
+            self.parent_store.save()
             
             # Initialize BM25 retriever
-            self.bm25_retriever = BM25Retriever(document_texts, all_metadata)
+            self.bm25_retriever = BM25Retriever(document_texts, all_metadata,
+                                                num_workers=BM25_TOKENIZER_WORKERS)
             
-            logger.info(f"Successfully ingested {len(all_documents)} documents")
+            self._refresh_document_index()
             
-            return {
+            logger.info(f"Successfully ingested {len(document_texts)} documents")
+            
+            result = {
                 'success': True,
-                'documents_processed': len(all_documents),
+                'documents_processed': len(document_texts),
                 'files_processed': len(file_paths),
-                'bm25_indexed': len(document_texts)
+                'bm25_indexed': len(document_texts),
+                'embedding_throughput': _merge_ingest_stats(batch_stats)
             }
+            if near_duplicates is not None:
+                result['near_duplicates'] = self._report_near_duplicates(near_duplicates, dedup_counts)
+            return result
             
         except Exception as e:
             logger.error(f"Error ingesting documents: {str(e)}")
@@ -121,6 +322,10 @@ class ProposedRAGSystem:
         """
         Ingest all documents from a directory
         
+        Only files that are new or changed since the last call are parsed and
+        indexed, and chunks of deleted files are retracted from both indexes
+        (see ``_sync_files``).
+        
         Args:
             directory_path: Path to directory containing documents
             
@@ -128,18 +333,8 @@ class ProposedRAGSystem:
             Ingestion results
         """
         try:
-            # Get all supported files from directory
-            import os
-            import glob
-            
-            supported_extensions = ['.pdf', '.txt', '.docx', '.md', '.html']
-            file_paths = []
-            
-            # First, collect all files
-            all_files = []
-            for ext in supported_extensions:
-                pattern = os.path.join(directory_path, f"**/*{ext}")
-                all_files.extend(glob.glob(pattern, recursive=True))
+            # Get all supported files from directory in one walk
+            all_files = scan_directory(directory_path)
             
             # Filter out PDF files if TXT version exists
             file_paths = self._filter_duplicate_files(all_files)
@@ -152,7 +347,7 @@ class ProposedRAGSystem:
                     'documents_processed': 0
                 }
             
-            return self.ingest_documents(file_paths)
+            return self._sync_files(file_paths)
             
         except Exception as e:
             logger.error(f"Error ingesting directory: {str(e)}")
@@ -162,6 +357,448 @@ class ProposedRAGSystem:
                 'documents_processed': 0
             }
     
+    def _load_bm25_index(self) -> Optional[BM25Retriever]:
+        """Open the BM25 index saved by a previous ingest, if any"""
+        bm25_dir = os.path.join(self.index_dir, "bm25")
+        if not os.path.exists(os.path.join(bm25_dir, "meta.json")):
+            return None
+        try:
+            return BM25Retriever.load(bm25_dir, num_workers=BM25_TOKENIZER_WORKERS)
+        except Exception as e:
+            logger.warning(f"Could not load BM25 index from {bm25_dir}, rebuilding: {e}")
+            return None
+    
+    def _sync_files(self, file_paths: List[str]) -> Dict[str, Any]:
+        """
+        Bring the BM25 index and vector store in line with ``file_paths``
+        
+        A manifest of size, mtime, content hash and produced chunk ids per file
+        decides what to do: unchanged files are skipped, new and modified files
+        are chunked and indexed, and chunks that disappeared (deleted files or
+        edited passages) are removed from both indexes. A file whose recorded
+        chunks are missing from either index is treated as modified. Chunks
+        are indexed in batches of ``ingest_batch_size`` as files are chunked,
+        also in the middle of a large file. The manifest and BM25 index are
+        saved only after both indexes are updated.
+        
+        With near-duplicate removal on, a chunk close to an indexed chunk is
+        not indexed (nor recorded in the manifest); the indexed chunk lists
+        its file in 'alternate_sources'. When an indexed chunk is retracted,
+        the files whose copies it stood for are chunked again in this call.
+        """
+        vector_store = self.vector_manager.vector_store
+        manifest = IngestManifest(os.path.join(self.index_dir, "manifest.json"))
+        if self.bm25_retriever is None:
+            self.bm25_retriever = self._load_bm25_index()
+        
+        near_duplicates = self._load_near_duplicates()
+        dedup_counts = {'chunks': 0, 'chars': 0, 'dropped': 0, 'dropped_chars': 0}
+        with_alternates = set()
+        
+        changed, unchanged, deleted = manifest.diff(file_paths)
+        
+        if unchanged:
+            recorded = {file_path: set(manifest.chunk_ids(file_path)) for file_path in unchanged}
+            in_vector_store = vector_store.existing_ids([cid for ids in recorded.values() for cid in ids])
+            in_bm25 = self.bm25_retriever.get_chunk_ids() if self.bm25_retriever else set()
+            stale = [file_path for file_path, ids in recorded.items()
+                     if not (ids <= in_vector_store and ids <= in_bm25)]
+            if stale:
+                logger.info(f"{len(stale)} unchanged files are missing from an index and will be re-ingested")
+                changed.extend(stale)
+                unchanged = [file_path for file_path in unchanged if file_path not in stale]
+        
+        logger.info(f"Ingest plan: {len(changed)} new/modified, {len(unchanged)} unchanged, {len(deleted)} deleted files")
+        
+        # Chunk new and modified files (across processes, in path order) and index
+        # them in batches as they stream in; a file that fails is retried on the
+        # next call, and chunks it had already indexed are retracted
+        new_chunk_ids: Dict[str, List[str]] = {}
+        failed = []
+        stale_ids = set()
+        for key in deleted:
+            stale_ids.update(manifest.chunk_ids(key))
+        
+        known_ids = self.bm25_retriever.get_chunk_ids() if self.bm25_retriever else set()
+        batch, batch_stats = [], []
+        indexed = 0
+        
+        def flush():
+            # Both indexes skip chunks they already hold
+            if not batch:
+                return
+            vector_store.add_documents(batch, persist=False)
+            batch_stats.append(vector_store.last_ingest_stats)
+            bm25_documents = []
+            for doc in batch:
+                if doc.metadata['chunk_id'] not in known_ids:
+                    known_ids.add(doc.metadata['chunk_id'])
+                    bm25_documents.append(doc)
+            texts = [doc.page_content for doc in bm25_documents]
+            metadata = [doc.metadata.copy() for doc in bm25_documents]
+            if self.bm25_retriever is None:
+                self.bm25_retriever = BM25Retriever(texts, metadata, num_workers=BM25_TOKENIZER_WORKERS)
+            elif texts:
+                self.bm25_retriever.update_documents(texts, metadata)
+            batch.clear()
+        
+        def index_files(paths):
+            nonlocal indexed
+            for file_path, docs, error in self.document_processor.process_files(paths, stream=True):
+                if error is not None:
+                    logger.error(f"Error processing {file_path}: {error}")
+                    failed.append(file_path)
+                    continue
+                previous_ids = set(new_chunk_ids.get(file_path, manifest.chunk_ids(file_path)))
+                docs = self._tag_chunks(file_path, docs)
+                if near_duplicates is not None:
+                    with_alternates.update(near_duplicates.drop_source(os.path.normpath(file_path)))
+                    # Previous chunks of the file may be retracted until they turn up again
+                    retracting = stale_ids | previous_ids
+                    docs = self._drop_near_duplicates(near_duplicates, file_path,
+                                                      self._claim_ids(docs, retracting), retracting,
+                                                      with_alternates, dedup_counts)
+                current_ids = []
+                try:
+                    for doc in docs:
+                        current_ids.append(doc.metadata['chunk_id'])
+                        batch.append(doc)
+                        if len(batch) >= self.ingest_batch_size:
+                            flush()
+                except Exception as e:
+                    logger.error(f"Error processing {file_path}: {e}")
+                    failed.append(file_path)
+                    stale_ids.update(set(current_ids) - previous_ids)
+                    continue
+                new_chunk_ids[file_path] = current_ids
+                stale_ids.update(previous_ids - set(current_ids))
+                indexed += len(current_ids)
+        
+        if near_duplicates is not None:
+            for key in deleted:
+                with_alternates.update(near_duplicates.drop_source(key))
+        # One encode pool serves every batch of the sync
+        with vector_store.encode_pool():
+            index_files(sorted(changed))
+            if near_duplicates is not None:
+                # Copies that were dropped in favour of a chunk now being retracted are indexed from their own files
+                orphaned = near_duplicates.remove(stale_ids)
+                present = {os.path.normpath(file_path): file_path for file_path in file_paths}
+                reindex = sorted(present[key] for key in orphaned if key in present and present[key] not in failed)
+                if reindex:
+                    logger.info(f"Re-chunking {len(reindex)} files whose near-duplicate chunks lost their indexed copy")
+                    index_files(reindex)
+            flush()
+        
+        # Retract chunks that no longer exist. They never share an id with a new
+        # chunk (ids are per source file), so retracting after indexing is safe.
+        if stale_ids:
+            vector_store.delete_documents(list(stale_ids), persist=False)
+            if self.bm25_retriever:
+                self.bm25_retriever.delete_documents(self.bm25_retriever.find_document_ids(stale_ids))
+        if with_alternates:
+            updates = self._alternate_source_updates(near_duplicates, with_alternates)
+            vector_store.update_metadata(updates, persist=False)
+            if self.bm25_retriever:
+                self.bm25_retriever.update_metadata(updates)
+        index_changed = bool(indexed or stale_ids or with_alternates or deleted)
+        if index_changed:
+            vector_store.persist()
+        
+        for key in deleted:
+            manifest.remove(key)
+        for file_path, chunk_ids in new_chunk_ids.items():
+            manifest.record(file_path, chunk_ids)
+        
+        # A no-op sync leaves the saved indexes alone (saving decodes the memory-mapped BM25 index)
+        if index_changed and self.bm25_retriever is not None:
+            self.bm25_retriever.save(os.path.join(self.index_dir, "bm25"))
+        if index_changed and near_duplicates is not None:
+            near_duplicates.save(os.path.join(self.index_dir, NEAR_DUPLICATES_FILE))
+        if index_changed and self.bm25_retriever is not None:
+            self.parent_store.prune(self.bm25_retriever.get_parent_ids())
+        self.parent_store.save()
+        manifest.save()
+        if indexed or stale_ids:
+            self._refresh_document_index()
+        
+        logger.info(f"Successfully ingested {indexed} documents from {len(new_chunk_ids)} files")
+        
+        result = {
+            'success': True,
+            'documents_processed': indexed,
+            'files_processed': len(new_chunk_ids),
+            'files_unchanged': len(unchanged),
+            'files_removed': len(deleted),
+            'files_failed': failed,
+            'chunks_removed': len(stale_ids),
+            'embedding_throughput': _merge_ingest_stats(batch_stats),
+            'bm25_indexed': self.bm25_retriever.get_document_count() if self.bm25_retriever else 0
+        }
+        if near_duplicates is not None:
+            result['near_duplicates'] = self._report_near_duplicates(near_duplicates, dedup_counts)
+        return result
+    
+    def config_fingerprint(self) -> str:
+        """
+        Hash of every setting that shapes the stored chunks, tokens and embeddings
+        
+        A snapshot is only reusable by a system with the same fingerprint.
+        """
+        processor = self.document_processor
+        tokenizer = self.bm25_retriever.tokenizer if self.bm25_retriever else get_default_tokenizer()
+        settings = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'chunk_size': processor.chunk_size,
+            'chunk_overlap': processor.chunk_overlap,
+            'markdown_chunking': 'sections_with_context',
+            # The backend actually embedding: use_openai falls back to local without an API key
+            'use_openai': self.vector_manager.vector_store.use_openai,
+            'embedding_model': self.vector_manager.vector_store.embedding_model_name,
+            'min_token_length': tokenizer.min_token_length,
+            'stopwords': sorted(tokenizer.stopwords)
+        }
+        if processor.parent_child:
+            settings.update({
+                'child_chunk_size': processor.child_chunk_size,
+                'child_chunk_overlap': processor.child_chunk_overlap
+            })
+        if processor.chunking_mode == "tokens":
+            settings.update({
+                'chunking_mode': processor.chunking_mode,
+                'chunk_tokenizer': processor.tokenizer_model,
+                'chunk_tokens': processor.chunk_tokens,
+                'chunk_token_overlap': processor.chunk_token_overlap
+            })
+        if self.near_duplicate_threshold > 0:
+            settings['near_duplicate_threshold'] = self.near_duplicate_threshold
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def save_snapshot(self, snapshot_dir: str) -> Dict[str, Any]:
+        """
+        Write everything needed to serve queries to a directory
+        
+        The snapshot holds the BM25 index and its document store, every
+        vector-store chunk with its metadata and embedding, the ingest manifest
+        (and near-duplicate index and parent store, if any) and the config
+        fingerprint. It is written to a temporary directory and
+        swapped into place, so a reader never sees a half-written snapshot.
+        
+        Args:
+            snapshot_dir: Target directory (replaced if it exists)
+            
+        Returns:
+            Snapshot summary
+        """
+        try:
+            if self.bm25_retriever is None:
+                raise ValueError("Nothing to snapshot: no documents have been ingested")
+            
+            tmp_dir = f"{os.path.normpath(snapshot_dir)}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            
+            self.bm25_retriever.save(os.path.join(tmp_dir, "bm25"))
+            
+            exported = self.vector_manager.vector_store.export_embeddings()
+            with open(os.path.join(tmp_dir, SNAPSHOT_CHUNKS_FILE), 'w', encoding='utf-8') as f:
+                for chunk_id, content, metadata in zip(exported['ids'], exported['documents'], exported['metadatas']):
+                    f.write(json.dumps({'id': chunk_id, 'content': content, 'metadata': metadata}) + "\n")
+            np.save(os.path.join(tmp_dir, SNAPSHOT_EMBEDDINGS_FILE), exported['embeddings'])
+            
+            for name in ("manifest.json", NEAR_DUPLICATES_FILE, PARENTS_FILE):
+                path = os.path.join(self.index_dir, name)
+                if os.path.exists(path):
+                    shutil.copy2(path, os.path.join(tmp_dir, name))
+            
+            meta = {
+                'format_version': SNAPSHOT_FORMAT_VERSION,
+                'fingerprint': self.config_fingerprint(),
+                'created_at': time.time(),
+                'bm25_documents': self.bm25_retriever.get_document_count(),
+                'vector_documents': len(exported['ids']),
+                'embedding_dim': int(exported['embeddings'].shape[1])
+            }
+            with open(os.path.join(tmp_dir, SNAPSHOT_META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2)
+            
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            os.replace(tmp_dir, snapshot_dir)
+            
+            logger.info(f"Saved snapshot with {meta['vector_documents']} chunks to {snapshot_dir}")
+            return {'success': True, **meta}
+            
+        except Exception as e:
+            logger.error(f"Error saving snapshot: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    def load_snapshot(self, snapshot_dir: str) -> bool:
+        """
+        Restore a system from a directory written by ``save_snapshot``
+        
+        No document is parsed, chunked, tokenized or embedded: the BM25 index is
+        memory-mapped in place and stored embeddings are written straight into
+        the vector store (chunks it already holds are skipped). The manifest is
+        copied into ``index_dir`` so a later ``ingest_directory`` only picks up
+        files that changed since the snapshot was built.
+        
+        Args:
+            snapshot_dir: Directory passed to ``save_snapshot``
+            
+        Returns:
+            True if the snapshot was loaded; False if it is missing, unreadable or
+            built with a different configuration
+        """
+        meta_path = os.path.join(snapshot_dir, SNAPSHOT_META_FILE)
+        if not os.path.exists(meta_path):
+            logger.info(f"No snapshot found in {snapshot_dir}")
+            return False
+        
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            
+            fingerprint = self.config_fingerprint()
+            if meta.get('fingerprint') != fingerprint:
+                logger.warning(f"Snapshot in {snapshot_dir} was built with a different configuration, ignoring it")
+                return False
+            
+            bm25_retriever = BM25Retriever.load(os.path.join(snapshot_dir, "bm25"),
+                                                num_workers=BM25_TOKENIZER_WORKERS)
+            
+            ids, texts, metadatas = [], [], []
+            with open(os.path.join(snapshot_dir, SNAPSHOT_CHUNKS_FILE), 'r', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    ids.append(record['id'])
+                    texts.append(record['content'])
+                    metadatas.append(record['metadata'])
+            embeddings = np.load(os.path.join(snapshot_dir, SNAPSHOT_EMBEDDINGS_FILE), mmap_mode='r')
+            if len(embeddings) != len(ids):
+                raise ValueError("Snapshot embeddings do not match its chunk store")
+            
+            vector_store = self.vector_manager.vector_store
+            existing = vector_store.existing_ids(ids)
+            missing = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+            if len(missing) == len(ids):
+                # Fresh store: stream the memory-mapped embeddings batch by batch
+                vector_store.bulk_load(ids, embeddings, texts, metadatas)
+            elif missing:
+                vector_store.bulk_load([ids[i] for i in missing], embeddings[missing],
+                                       [texts[i] for i in missing], [metadatas[i] for i in missing])
+            
+            os.makedirs(self.index_dir, exist_ok=True)
+            for name in ("manifest.json", NEAR_DUPLICATES_FILE, PARENTS_FILE):
+                path = os.path.join(snapshot_dir, name)
+                if os.path.exists(path):
+                    shutil.copy2(path, os.path.join(self.index_dir, name))
+            self.parent_store = ParentStore(os.path.join(self.index_dir, PARENTS_FILE))
+            bm25_dir = os.path.join(self.index_dir, "bm25")
+            if os.path.normpath(bm25_dir) != os.path.normpath(os.path.join(snapshot_dir, "bm25")):
+                bm25_retriever.save(bm25_dir)
+            
+            self.bm25_retriever = bm25_retriever
+            self._refresh_document_index()
+            
+            logger.info(f"Loaded snapshot from {snapshot_dir}: {len(ids)} chunks, {len(missing)} written to the vector store")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error loading snapshot from {snapshot_dir}: {str(e)}")
+            return False
+    
+    def _refresh_document_index(self):
+        """Rebuild the document-level index after the chunk indexes changed (drop it when two-stage is off)"""
+        document_index_dir = os.path.join(self.index_dir, "documents")
+        self.document_index = None
+        if self.top_documents <= 0:
+            shutil.rmtree(document_index_dir, ignore_errors=True)
+            return
+        try:
+            exported = self.vector_manager.vector_store.export_embeddings()
+            tokenizer = self.bm25_retriever.tokenizer if self.bm25_retriever else get_default_tokenizer()
+            self.document_index = DocumentIndex.build(exported['documents'], exported['metadatas'],
+                                                      exported['embeddings'], tokenizer)
+            self.document_index.save(document_index_dir)
+        except Exception as e:
+            logger.error(f"Error building document index: {str(e)}")
+    
+    def _get_document_index(self) -> Optional[DocumentIndex]:
+        """Document-level index for two-stage retrieval, loaded or built on first use"""
+        if self.document_index is not None or self.top_documents <= 0:
+            return self.document_index
+        document_index_dir = os.path.join(self.index_dir, "documents")
+        tokenizer = self.bm25_retriever.tokenizer if self.bm25_retriever else get_default_tokenizer()
+        try:
+            if os.path.exists(os.path.join(document_index_dir, "meta.json")):
+                document_index = DocumentIndex.load(document_index_dir, tokenizer)
+                stored = self.vector_manager.vector_store.get_collection_info().get('document_count')
+                if document_index.chunk_count == stored:
+                    self.document_index = document_index
+                    return document_index
+                logger.info("Document index is out of date, rebuilding")
+        except Exception as e:
+            logger.warning(f"Could not load document index from {document_index_dir}, rebuilding: {e}")
+        self._refresh_document_index()
+        return self.document_index
+    
+    def _select_documents(self, question: str, top_documents: Optional[int] = None) -> Optional[List[str]]:
+        """Sources of the top documents for a question (None = search every document)"""
+        m = self.top_documents if top_documents is None else top_documents
+        document_index = self._get_document_index() if m > 0 else None
+        if document_index is None or len(document_index) <= m:
+            return None
+        query_vector = self.vector_manager.vector_store.embeddings.embed_query(question)
+        return [source for source, _ in document_index.select(question, query_vector, m)]
+    
+    def two_stage_recall(self, questions: List[str], k: int = 20,
+                         top_documents: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Check how much of flat retrieval two-stage retrieval keeps
+        
+        For every question, the top ``k`` chunks of each retriever searched
+        over all documents are compared with the top ``k`` searched only
+        within the selected documents. Use it to pick ``top_documents``.
+        
+        Args:
+            questions: Evaluation questions
+            k: Chunks per retriever
+            top_documents: Documents selected per question (default: the configured value)
+            
+        Returns:
+            Mean recall@k of two-stage against flat search for BM25 and dense
+        """
+        m = self.top_documents if top_documents is None else top_documents
+        vectorstore = self.vector_manager.vector_store.vectorstore
+        bm25_recalls, dense_recalls = [], []
+        
+        for question in questions:
+            sources = self._select_documents(question, m)
+            metadata_filter = {'source': {'$in': sources}} if sources else None
+            
+            if self.bm25_retriever:
+                flat = {r['metadata'].get('chunk_id') for r in self.bm25_retriever.search(question, k) if r['score'] > 0}
+                staged = {r['metadata'].get('chunk_id')
+                          for r in self.bm25_retriever.search(question, k, metadata_filter=metadata_filter)}
+                if flat:
+                    bm25_recalls.append(len(flat & staged) / len(flat))
+            
+            flat = {doc.metadata.get('chunk_id') for doc in vectorstore.similarity_search(question, k=k)}
+            staged_docs = (vectorstore.similarity_search(question, k=k, filter=metadata_filter)
+                           if metadata_filter else vectorstore.similarity_search(question, k=k))
+            staged = {doc.metadata.get('chunk_id') for doc in staged_docs}
+            if flat:
+                dense_recalls.append(len(flat & staged) / len(flat))
+        
+        return {
+            'top_documents': m,
+            'documents': len(self._get_document_index() or []),
+            'k': k,
+            'questions': len(questions),
+            'bm25_recall': float(np.mean(bm25_recalls)) if bm25_recalls else None,
+            'dense_recall': float(np.mean(dense_recalls)) if dense_recalls else None
+        }
+    
     def _filter_duplicate_files(self, file_paths: List[str]) -> List[str]:
         """
         Filter out PDF files if a corresponding TXT file exists with the same name
@@ -172,7 +809,6 @@ class ProposedRAGSystem:
         Returns:
             Filtered list of file paths
         """
-        import os
         from pathlib import Path
         
         # Group files by their base name (without extension)
@@ -208,7 +844,8 @@ class ProposedRAGSystem:
         return filtered_files
     
     def query(self, question: str, use_reranking: bool = True, 
-              rerank_threshold: float = 0.1, max_rerank: int = 20) -> ProposedRAGResult:
+              rerank_threshold: float = 0.1, max_rerank: int = 20,
+              pet_type: Optional[str] = None) -> ProposedRAGResult:
         """
         Process a query through the complete proposed RAG pipeline
         
@@ -217,6 +854,8 @@ class ProposedRAGSystem:
             use_reranking: Whether to use cross-encoder reranking
             rerank_threshold: Minimum score threshold for reranking
             max_rerank: Maximum number of documents to rerank
+            pet_type: Species from the entity extractor (PET_TYPE), used for
+                routing when the question itself names none
             
         Returns:
             ProposedRAGResult with answer and metadata
@@ -229,7 +868,13 @@ class ProposedRAGSystem:
             
             # Step 1: Hybrid Retrieval (BM25 + Dense + RRF)
             retrieval_start = time.time()
-            bm25_results, dense_results = self._hybrid_retrieval(question)
+            route = self.router.route(question, pet_type)
+            metadata_filter = route['filter']
+            selected_documents = self._select_documents(question)
+            if selected_documents:
+                document_filter = {'source': {'$in': selected_documents}}
+                metadata_filter = {'$and': [metadata_filter, document_filter]} if metadata_filter else document_filter
+            bm25_results, dense_results, retrieval_status = self._hybrid_retrieval(question, metadata_filter)
             retrieval_time = (time.time() - retrieval_start) * 1000
             
             # Step 2: RRF Fusion
@@ -246,9 +891,10 @@ class ProposedRAGSystem:
                 reranked_results = fused_results[:5]  # Take top 5 without reranking
             rerank_time = (time.time() - rerank_start) * 1000
             
-            # Step 4: Extractive Answer Generation
+            # Step 4: Extractive Answer Generation (on parent chunks when passages are children)
             generation_start = time.time()
-            answer_result = self._generate_answer(question, reranked_results)
+            context_documents = self._expand_to_parents(reranked_results)
+            answer_result = self._generate_answer(question, context_documents)
             generation_time = (time.time() - generation_start) * 1000
             
             total_time = (time.time() - start_time) * 1000
@@ -257,6 +903,8 @@ class ProposedRAGSystem:
             performance_metrics = {
                 'total_time_ms': total_time,
                 'retrieval_time_ms': retrieval_time,
+                'bm25_time_ms': retrieval_status['bm25']['time_ms'],
+                'dense_time_ms': retrieval_status['dense']['time_ms'],
                 'fusion_time_ms': fusion_time,
                 'rerank_time_ms': rerank_time,
                 'generation_time_ms': generation_time,
@@ -269,7 +917,15 @@ class ProposedRAGSystem:
                 'dense_results': len(dense_results),
                 'fused_results': len(fused_results),
                 'reranked_results': len(reranked_results),
-                'use_reranking': use_reranking
+                'context_documents': len(context_documents),
+                'use_reranking': use_reranking,
+                'bm25_status': retrieval_status['bm25']['status'],
+                'dense_status': retrieval_status['dense']['status'],
+                'route_species': route['species'],
+                'route_topic': route['topic'],
+                'route_confidence': route['confidence'],
+                'documents_selected': len(selected_documents) if selected_documents else 0,
+                'partition_fallback': retrieval_status['fallback']
             }
             
             # Create result
@@ -298,32 +954,103 @@ class ProposedRAGSystem:
             logger.error(f"Error processing query: {str(e)}")
             return self._create_error_result(str(e))
     
-    def _hybrid_retrieval(self, question: str) -> tuple:
-        """Perform hybrid retrieval using BM25 and dense search"""
-        try:
-            # BM25 retrieval
-            bm25_results = self.bm25_retriever.search(question, k=20) if self.bm25_retriever else []
-            
-            # Dense retrieval
-            dense_results = self.vector_manager.vector_store.vectorstore.similarity_search(question, k=20)
-            
-            # Convert dense results to our format
-            dense_formatted = []
-            for i, doc in enumerate(dense_results):
-                dense_formatted.append({
-                    'document_id': f"dense_{i}",
-                    'content': doc.page_content,
-                    'score': 1.0,
-                    'source': doc.metadata.get('source', f'Dense Document {i}'),
-                    'metadata': doc.metadata,
-                    'retrieval_method': 'dense'
-                })
-            
-            return bm25_results, dense_formatted
-            
-        except Exception as e:
-            logger.error(f"Error in hybrid retrieval: {str(e)}")
-            return [], []
+    def _hybrid_retrieval(self, question: str, metadata_filter: Optional[Dict[str, Any]] = None) -> tuple:
+        """
+        Perform hybrid retrieval using BM25 and dense search
+        
+        Both retrievers run concurrently on the shared retrieval pool, so the
+        wall time is that of the slower one. Each gets ``retrieval_timeout``
+        seconds; a retriever that times out or fails contributes no results
+        and the other one's results are still used. A timed-out search keeps
+        its pool thread until it ends, so that retriever is skipped until
+        then instead of tying up another thread.
+        
+        With ``metadata_filter`` (a routed partition), each retriever searches
+        only matching chunks and falls back to the whole corpus when that
+        yields fewer than ``partition_min_results`` hits (for BM25, hits
+        with a positive score).
+        
+        Returns:
+            (bm25_results, dense_results, status) where status holds each
+            retriever's outcome ('ok', 'timeout', 'error' or 'skipped') and time,
+            and 'fallback' lists the retrievers that fell back to the global index
+        """
+        status = {
+            'bm25': {'status': 'skipped', 'time_ms': 0.0},
+            'dense': {'status': 'skipped', 'time_ms': 0.0},
+            'fallback': []
+        }
+        
+        def timed(name, search):
+            # Only the caller writes ``status``: this may still be running after a timeout
+            start = time.time()
+            fell_back = False
+            if metadata_filter:
+                results = search(metadata_filter)
+                # BM25 pads with zero-score chunks; only real matches count
+                hits = [r for r in results if r['score'] > 0] if name == 'bm25' else results
+                if len(hits) < self.partition_min_results:
+                    fell_back = True
+                    results = search(None)
+            else:
+                results = search(None)
+            return results, fell_back, (time.time() - start) * 1000
+        
+        def dense_search(partition):
+            vectorstore = self.vector_manager.vector_store.vectorstore
+            if partition:
+                return vectorstore.similarity_search(question, k=20, filter=partition)
+            return vectorstore.similarity_search(question, k=20)
+        
+        searches = {}
+        if self.bm25_retriever:
+            bm25_retriever = self.bm25_retriever
+            searches['bm25'] = lambda partition: bm25_retriever.search(question, k=20, metadata_filter=partition)
+        searches['dense'] = dense_search
+        
+        futures = {}
+        for name, search in searches.items():
+            abandoned = self._abandoned_searches.get(name)
+            if abandoned is not None and not abandoned.done():
+                logger.warning(f"{name} retrieval skipped: a search that timed out is still running")
+                continue
+            self._abandoned_searches.pop(name, None)
+            futures[name] = self.retrieval_executor.submit(timed, name, search)
+        
+        started = time.time()
+        deadline = started + self.retrieval_timeout
+        results = {'bm25': [], 'dense': []}
+        for name, future in futures.items():
+            try:
+                results[name], fell_back, status[name]['time_ms'] = future.result(
+                    timeout=max(0.0, deadline - time.time()))
+                status[name]['status'] = 'ok'
+                if fell_back:
+                    status['fallback'].append(name)
+            except FutureTimeoutError:
+                # The search keeps running in the pool; its result is discarded
+                self._abandoned_searches[name] = future
+                status[name]['status'] = 'timeout'
+                status[name]['time_ms'] = self.retrieval_timeout * 1000
+                logger.warning(f"{name} retrieval timed out after {self.retrieval_timeout}s, using partial results")
+            except Exception as e:
+                status[name]['status'] = 'error'
+                status[name]['time_ms'] = (time.time() - started) * 1000
+                logger.error(f"Error in {name} retrieval: {str(e)}")
+        
+        # Convert dense results to our format
+        dense_formatted = []
+        for i, doc in enumerate(results['dense']):
+            dense_formatted.append({
+                'document_id': f"dense_{i}",
+                'content': doc.page_content,
+                'score': 1.0,
+                'source': doc.metadata.get('source', f'Dense Document {i}'),
+                'metadata': doc.metadata,
+                'retrieval_method': 'dense'
+            })
+        
+        return results['bm25'], dense_formatted, status
     
     def _rrf_fusion(self, bm25_results: List[Dict], dense_results: List[Dict]) -> List[Dict]:
         """Fuse BM25 and dense results using RRF"""
@@ -364,6 +1091,36 @@ class ProposedRAGSystem:
             logger.error(f"Error in reranking: {str(e)}")
             return documents[:5]  # Fallback to top 5
     
+    def _expand_to_parents(self, documents: List[Dict]) -> List[Dict]:
+        """
+        Replace child passages with their parent chunks, best-ranked first
+        
+        Parent texts come from the parent store (or, for indexes built before
+        it existed, the child's own 'parent_content'). Passages of the same
+        parent collapse into one entry; the passage that matched is kept as
+        'matched_passage'. Documents without a known parent are passed
+        through unchanged.
+        """
+        expanded = []
+        seen_parents = set()
+        for doc in documents:
+            metadata = doc.get('metadata') or {}
+            parent_id = metadata.get('parent_id')
+            parent_content = None
+            if parent_id is not None:
+                parent_content = self.parent_store.get(parent_id) or metadata.get('parent_content')
+            if parent_content is None:
+                expanded.append(doc)
+                continue
+            if parent_id in seen_parents:
+                continue
+            seen_parents.add(parent_id)
+            parent = doc.copy()
+            parent['matched_passage'] = doc.get('content', '')
+            parent['content'] = parent_content
+            expanded.append(parent)
+        return expanded
+    
     def _generate_answer(self, question: str, documents: List[Dict]) -> LLMAnswerResult:
         """Generate hybrid answer from documents"""
         try:
@@ -456,6 +1213,14 @@ class ProposedRAGManager:
         """Add all documents from a directory"""
         return self.system.ingest_directory(directory_path)
     
+    def save_snapshot(self, snapshot_dir: str) -> Dict[str, Any]:
+        """Write a prebuilt snapshot of the system"""
+        return self.system.save_snapshot(snapshot_dir)
+    
+    def load_snapshot(self, snapshot_dir: str) -> bool:
+        """Restore the system from a prebuilt snapshot"""
+        return self.system.load_snapshot(snapshot_dir)
+    
     def ask(self, question: str, **kwargs) -> Dict[str, Any]:
         """Ask a question to the system"""
         if self.system is None:
@@ -0,0 +1,180 @@
+"""
+Compressed copies of embedding matrices for memory-lean dense search
+"""
+import logging
+import sys
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("float16", "int8")
+
+
+class QuantizedVectors:
+    """
+    float16 or int8 copy of a float32 embedding matrix
+
+    int8 codes use one scale per vector (its largest absolute component maps
+    to 127). ``search`` ranks every row on the compressed codes, then
+    re-scores the best ``rescore_factor * k`` candidates against the
+    full-precision matrix, which can stay memory-mapped on disk since only
+    those few rows are read.
+    """
+
+    def __init__(self, vectors: np.ndarray, mode: str = "int8", block_size: int = 4096):
+        """
+        Quantize a matrix
+
+        Args:
+            vectors: float32 matrix, one embedding per row
+            mode: 'float16' or 'int8'
+            block_size: Rows converted at a time (bounds temporary memory)
+        """
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        self.mode = mode
+        self.block_size = block_size
+
+        n, dim = vectors.shape if vectors.ndim == 2 else (0, 0)
+        if mode == "float16":
+            self.codes = np.empty((n, dim), dtype=np.float16)
+            self.scales = None
+        else:
+            self.codes = np.empty((n, dim), dtype=np.int8)
+            self.scales = np.empty(n, dtype=np.float32)
+
+        for i in range(0, n, block_size):
+            block = np.asarray(vectors[i:i + block_size], dtype=np.float32)
+            if mode == "float16":
+                self.codes[i:i + block_size] = block
+            else:
+                scales = np.abs(block).max(axis=1) / 127.0
+                scales[scales == 0] = 1.0
+                self.codes[i:i + block_size] = np.rint(block / scales[:, None])
+                self.scales[i:i + block_size] = scales
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the codes and scales"""
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate inner products of ``query`` with every row (or only ``rows``)"""
+        query = np.asarray(query, dtype=np.float32)
+        codes = self.codes if rows is None else self.codes[rows]
+        # NumPy has no fast float16/int8 matmul; upcast block by block instead
+        sims = np.concatenate([codes[i:i + self.block_size].astype(np.float32) @ query
+                               for i in range(0, len(codes), self.block_size)]) if len(codes) else \
+            np.zeros(0, dtype=np.float32)
+        if self.scales is not None:
+            sims *= self.scales if rows is None else self.scales[rows]
+        return sims
+
+    def search(self, query: np.ndarray, k: int, full_vectors: np.ndarray,
+               rows: Optional[np.ndarray] = None, rescore_factor: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top ``k`` rows by inner product, exact for the returned candidates
+
+        Args:
+            query: float32 query vector
+            k: Number of results
+            full_vectors: float32 matrix the codes were built from (may be a memmap)
+            rows: Restrict the search to these row indices
+            rescore_factor: Candidates re-scored per requested result
+
+        Returns:
+            (row indices, full-precision scores), best first
+        """
+        query = np.asarray(query, dtype=np.float32)
+        sims = self.scores(query, rows)
+        if not len(sims) or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        pool = min(len(sims), max(k, k * rescore_factor))
+        candidates = np.argpartition(-sims, pool - 1)[:pool] if pool < len(sims) else np.arange(len(sims))
+        if rows is not None:
+            candidates = rows[candidates]
+        return rescore(query, candidates, full_vectors, k)
+
+
+def rescore(query: np.ndarray, candidates: np.ndarray, full_vectors: np.ndarray,
+            k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rank candidate rows by their full-precision inner product with ``query``
+
+    Args:
+        query: float32 query vector
+        candidates: Row indices found on compressed codes
+        full_vectors: float32 matrix (may be a memmap; only the candidate rows are read)
+        k: Number of results
+
+    Returns:
+        (row indices, full-precision scores) of the best ``k`` candidates, best first
+    """
+    # Sorted reads keep memory-mapped access sequential
+    candidates = np.sort(np.asarray(candidates, dtype=np.int64))
+    exact = np.asarray(full_vectors[candidates], dtype=np.float32) @ np.asarray(query, dtype=np.float32)
+    order = np.argsort(-exact, kind='stable')[:k]
+    return candidates[order], exact[order]
+
+
+def exact_search(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    """Top ``k`` rows by float32 inner product"""
+    sims = vectors @ query
+    top = np.argpartition(-sims, k - 1)[:k] if k < len(sims) else np.arange(len(sims))
+    return top[np.argsort(-sims[top], kind='stable')]
+
+
+def recall_at_k(vectors: np.ndarray, queries: np.ndarray, k: int = 10, mode: str = "int8",
+                rescore_factor: int = 4) -> float:
+    """
+    Fraction of the exact float32 top ``k`` that the quantized search returns
+
+    Args:
+        vectors: float32 matrix, one embedding per row
+        queries: float32 matrix, one query per row
+        k: Cutoff
+        mode: 'float16' or 'int8'
+        rescore_factor: Candidates re-scored per requested result
+
+    Returns:
+        Mean recall@k over the queries
+    """
+    quantized = QuantizedVectors(vectors, mode)
+    hits = 0
+    for query in queries:
+        expected = set(exact_search(vectors, query, k).tolist())
+        found, _ = quantized.search(query, k, vectors, rescore_factor=rescore_factor)
+        hits += len(expected.intersection(found.tolist()))
+    return hits / (len(queries) * min(k, len(vectors)))
+
+
+if __name__ == "__main__":
+    # Recall@k of quantized search against float32:
+    #   python -m rag_system.quantization [embeddings.npy] [k]
+    # Without a file, a random corpus of normalized 384-d vectors is used.
+    # Queries are corpus rows with a little noise added.
+    rng = np.random.default_rng(0)
+    if len(sys.argv) > 1:
+        corpus = np.load(sys.argv[1]).astype(np.float32)
+    else:
+        corpus = rng.standard_normal((20000, 384)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    sample = corpus[rng.choice(len(corpus), size=min(200, len(corpus)), replace=False)]
+    queries = sample + 0.1 * rng.standard_normal(sample.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, k={k}")
+    print(f"float32: {corpus.nbytes / 1e6:.1f} MB")
+    for mode in QUANTIZATION_MODES:
+        size = QuantizedVectors(corpus, mode).nbytes / 1e6
+        for rescore_factor in (1, 4):
+            recall = recall_at_k(corpus, queries, k, mode, rescore_factor)
+            print(f"{mode:>7} ({size:.1f} MB), rescore x{rescore_factor}: recall@{k} = {recall:.4f}")
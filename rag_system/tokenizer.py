@@ -0,0 +1,100 @@
+"""
+Offline tokenizer for BM25 indexing and search
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+# NLTK's English stopword list (nltk 3.8.1), vendored so tokenization never
+# needs a corpus download
+ENGLISH_STOPWORDS = frozenset("""
+i me my myself we our ours ourselves you you're you've you'll you'd your yours
+yourself yourselves he him his himself she she's her hers herself it it's its
+itself they them their theirs themselves what which who whom this that that'll
+these those am is are was were be been being have has had having do does did
+doing a an the and but if or because as until while of at by for with about
+against between into through during before after above below to from up down
+in out on off over under again further then once here there when where why how
+all any both each few more most other some such no nor not only own same so
+than too very s t can will just don don't should should've now d ll m o re ve
+y ain aren aren't couldn couldn't didn didn't doesn doesn't hadn hadn't hasn
+hasn't haven haven't isn isn't ma mightn mightn't mustn mustn't needn needn't
+shan shan't shouldn shouldn't wasn wasn't weren weren't won won't wouldn
+wouldn't
+""".split())
+
+# Punctuation is treated as a separator, as the NLTK pipeline did by blanking
+# it out before word_tokenize
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class BM25Tokenizer:
+    """Lowercasing word tokenizer with stopword and short-token removal"""
+
+    def __init__(self, stopwords: Iterable[str] = ENGLISH_STOPWORDS, min_token_length: int = 3,
+                 query_cache_size: int = 4096):
+        """
+        Initialize tokenizer
+
+        Args:
+            stopwords: Words dropped from the token stream
+            min_token_length: Shortest token that is kept
+            query_cache_size: Number of tokenized queries kept in the LRU cache
+        """
+        self.stopwords = frozenset(stopwords)
+        self.min_token_length = min_token_length
+        self._cached_query = lru_cache(maxsize=query_cache_size)(self._tokenize_query)
+
+    def tokenize(self, text: str) -> List[str]:
+        """Tokenize a single text"""
+        stopwords = self.stopwords
+        min_length = self.min_token_length
+        return [token for token in _TOKEN_PATTERN.findall(text.lower())
+                if len(token) >= min_length and token not in stopwords]
+
+    def tokenize_documents(self, documents: Iterable[str]) -> List[List[str]]:
+        """Tokenize a batch of documents"""
+        return [self.tokenize(doc) for doc in documents]
+
+    def term_frequencies(self, text: str) -> Tuple[Dict[str, int], int]:
+        """Return (term -> count in first-appearance order, token count) for a text"""
+        frequencies: Dict[str, int] = {}
+        tokens = self.tokenize(text)
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        return frequencies, len(tokens)
+
+    def _tokenize_query(self, query: str) -> Tuple[str, ...]:
+        return tuple(self.tokenize(query))
+
+    def tokenize_query(self, query: str) -> Tuple[str, ...]:
+        """Tokenize a search query, reusing the result for repeated queries"""
+        return self._cached_query(query)
+
+    def cache_info(self):
+        """Hit/miss statistics of the query cache"""
+        return self._cached_query.cache_info()
+
+    def __getstate__(self):
+        # The LRU cache wraps a bound method and cannot be pickled; worker
+        # processes get an empty cache of the same size
+        state = self.__dict__.copy()
+        state['_query_cache_size'] = self._cached_query.cache_parameters()['maxsize']
+        del state['_cached_query']
+        return state
+
+    def __setstate__(self, state):
+        cache_size = state.pop('_query_cache_size')
+        self.__dict__.update(state)
+        self._cached_query = lru_cache(maxsize=cache_size)(self._tokenize_query)
+
+
+_default_tokenizer = None
+
+
+def get_default_tokenizer() -> BM25Tokenizer:
+    """Return the shared process-wide tokenizer, building it on first use"""
+    global _default_tokenizer
+    if _default_tokenizer is None:
+        _default_tokenizer = BM25Tokenizer()
+    return _default_tokenizer
@@ -2,8 +2,12 @@
 Vector database and embedding storage for RAG system
 """
 import os
+import time
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional
+import numpy as np
 import chromadb
 from chromadb.config import Settings
 
@@ -20,42 +24,121 @@ except ImportError:
 
 from config import (
     CHROMA_PERSIST_DIRECTORY, 
+    RAG_INDEX_DIRECTORY,
+    VECTOR_BACKEND,
+    LOCAL_INDEX_TYPE,
+    LOCAL_INDEX_DTYPE,
     OPENAI_API_KEY, 
     EMBEDDING_MODEL,
-    MAX_CHUNKS
+    MAX_CHUNKS,
+    EMBEDDING_WORKERS,
+    EMBEDDING_BATCH_SIZE,
+    OPENAI_BASE_URL,
+    OPENAI_EMBEDDING_BATCH_SIZE,
+    OPENAI_EMBEDDING_CONCURRENCY,
+    OPENAI_EMBEDDING_RPM,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_DIRECTORY
 )
+from .embedding_cache import CachedQueryEmbeddings
+from .async_embeddings import AsyncOpenAIEmbeddings
+from .dense_index import LocalDenseIndex
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def make_chunk_id(content: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Content-addressed id for a chunk
+    
+    Hash of the chunk's source and text, so re-ingesting an unchanged chunk
+    yields the same id while identical text from two different files stays
+    two separate entries.
+    """
+    source = str((metadata or {}).get('source', ''))
+    return hashlib.sha256(f"{source}\0{content}".encode('utf-8')).hexdigest()[:32]
+
+
 class VectorStore:
     """Manages vector database operations for RAG system"""
     
-    def __init__(self, collection_name: str = "rag_documents", use_openai: bool = True):
+    def __init__(self, collection_name: str = "rag_documents", use_openai: bool = True,
+                 backend: str = VECTOR_BACKEND):
         self.collection_name = collection_name
         self.use_openai = use_openai and OPENAI_API_KEY is not None
+        self.backend = backend
         
         # Initialize embeddings
         if self.use_openai:
+            self.embedding_model_name = EMBEDDING_MODEL
             self.embeddings = OpenAIEmbeddings(
                 openai_api_key=OPENAI_API_KEY,
+                openai_api_base=OPENAI_BASE_URL,
                 model=EMBEDDING_MODEL
             )
+            # Ingestion batches go through the concurrent client; queries keep the pooled LangChain client
+            self.ingest_embeddings = AsyncOpenAIEmbeddings(
+                OPENAI_API_KEY,
+                EMBEDDING_MODEL,
+                base_url=OPENAI_BASE_URL,
+                batch_size=OPENAI_EMBEDDING_BATCH_SIZE,
+                max_concurrency=OPENAI_EMBEDDING_CONCURRENCY,
+                requests_per_minute=OPENAI_EMBEDDING_RPM
+            )
             logger.info("Using OpenAI embeddings")
         else:
+            self.embedding_model_name = "all-MiniLM-L6-v2"
             self.embeddings = SentenceTransformerEmbeddings(
-                model_name="all-MiniLM-L6-v2"
+                model_name=self.embedding_model_name
             )
             logger.info("Using SentenceTransformer embeddings")
+        self.base_embeddings = self.embeddings
+        self.last_ingest_stats: Dict[str, Any] = {}
+        # Multi-process encode pool kept for the rest of an ``encode_pool`` block
+        self._encode_pool = None
+        self._keep_encode_pool = False
         
-        # Initialize ChromaDB
-        self._initialize_chroma()
+        # Repeated questions reuse their query embedding instead of re-encoding
+        self.query_cache = None
+        if QUERY_EMBEDDING_CACHE_SIZE > 0:
+            cache_path = None
+            if QUERY_EMBEDDING_CACHE_DIRECTORY:
+                cache_path = os.path.join(QUERY_EMBEDDING_CACHE_DIRECTORY, f"{collection_name}.npz")
+            self.query_cache = CachedQueryEmbeddings(self.embeddings, self.embedding_model_name,
+                                                     QUERY_EMBEDDING_CACHE_SIZE, cache_path)
+            self.embeddings = self.query_cache
+        
+        # Initialize the dense backend
+        if self.backend == "local":
+            self._initialize_local()
+        else:
+            self._initialize_chroma()
+    
+    def _initialize_local(self):
+        """Initialize the in-process dense index"""
+        try:
+            self.chroma_client = None
+            self.persist_directory = os.path.join(RAG_INDEX_DIRECTORY, self.collection_name, "dense")
+            self.vectorstore = LocalDenseIndex(
+                self.embeddings,
+                self.persist_directory,
+                index_type=LOCAL_INDEX_TYPE,
+                dtype=LOCAL_INDEX_DTYPE
+            )
+            
+            logger.info(f"Local dense index initialized with collection: {self.collection_name} "
+                        f"({self.vectorstore.index_type}, {LOCAL_INDEX_DTYPE})")
+            
+        except Exception as e:
+            logger.error(f"Error initializing local dense index: {str(e)}")
+            raise
     
     def _initialize_chroma(self):
         """Initialize ChromaDB client and collection"""
         try:
             # Create persist directory if it doesn't exist
+            self.persist_directory = CHROMA_PERSIST_DIRECTORY
             os.makedirs(CHROMA_PERSIST_DIRECTORY, exist_ok=True)
             
             # Initialize ChromaDB client
@@ -81,41 +164,164 @@ class VectorStore:
             logger.error(f"Error initializing vector store: {str(e)}")
             raise
     
-    def add_documents(self, documents: List[LangChainDocument]) -> List[str]:
-        """Add documents to the vector store"""
+    def existing_ids(self, ids: List[str], batch_size: int = 5000) -> set:
+        """Return the subset of ``ids`` already stored in the collection"""
+        existing = set()
+        for i in range(0, len(ids), batch_size):
+            result = self.vectorstore.get(ids=ids[i:i + batch_size], include=[])
+            existing.update(result.get('ids', []))
+        return existing
+    
+    def add_documents(self, documents: List[LangChainDocument], persist: bool = True) -> List[str]:
+        """
+        Add documents to the vector store
+        
+        Chunks are stored under content-addressed ids (see ``make_chunk_id``,
+        also written to each document's ``chunk_id`` metadata). Chunks already
+        in the collection are skipped without being embedded, so re-ingesting
+        the same files is idempotent. New chunks are embedded with
+        ``embed_texts`` and written in bulk; throughput is kept in
+        ``last_ingest_stats``.
+        
+        Args:
+            documents: Chunks to add
+            persist: Persist the store afterwards; pass False when adding a
+                stream in batches and call ``persist`` once at the end
+        
+        Returns:
+            Ids of all given documents, whether newly added or already present
+        """
         try:
+            self.last_ingest_stats = {}
             if not documents:
                 logger.warning("No documents to add")
                 return []
             
-            # Add documents in smaller batches to avoid batch size limits
-            batch_size = 100
             all_ids = []
+            pending = {}
+            for doc in documents:
+                chunk_id = make_chunk_id(doc.page_content, doc.metadata)
+                doc.metadata['chunk_id'] = chunk_id
+                all_ids.append(chunk_id)
+                pending.setdefault(chunk_id, doc)
+            
+            existing = self.existing_ids(list(pending))
+            new_items = [(chunk_id, doc) for chunk_id, doc in pending.items() if chunk_id not in existing]
             
-            for i in range(0, len(documents), batch_size):
-                batch = documents[i:i + batch_size]
-                batch_ids = self.vectorstore.add_documents(batch)
-                all_ids.extend(batch_ids)
-                logger.info(f"Added batch {i//batch_size + 1}: {len(batch)} documents")
+            if not new_items:
+                logger.info(f"All {len(documents)} documents already in vector store, nothing to embed")
+                return all_ids
             
-            # Persist the changes
-            self.vectorstore.persist()
+            ids = [chunk_id for chunk_id, _ in new_items]
+            texts = [doc.page_content for _, doc in new_items]
+            metadatas = [doc.metadata for _, doc in new_items]
             
-            logger.info(f"Added {len(documents)} documents to vector store in {len(all_ids)} batches")
+            start = time.time()
+            embeddings = self.embed_texts(texts)
+            embed_time = time.time() - start
+            self.bulk_load(ids, embeddings, texts, metadatas, persist=persist)
+            total_time = time.time() - start
+            
+            self.last_ingest_stats = {
+                'chunks': len(ids),
+                'embed_seconds': embed_time,
+                'write_seconds': total_time - embed_time,
+                'chunks_per_second': len(ids) / total_time if total_time > 0 else 0.0
+            }
+            logger.info(f"Added {len(new_items)} new documents to vector store "
+                        f"({len(existing)} already present, {len(documents) - len(pending)} duplicates in input) "
+                        f"at {self.last_ingest_stats['chunks_per_second']:.1f} chunks/s "
+                        f"(embedding {embed_time:.1f}s, writing {total_time - embed_time:.1f}s)")
             return all_ids
             
         except Exception as e:
             logger.error(f"Error adding documents: {str(e)}")
             raise
     
+    @contextmanager
+    def encode_pool(self) -> Iterator[None]:
+        """
+        Share one multi-process encode pool across every ``embed_texts`` call in the block
+        
+        An ingest embeds its chunks batch by batch; without this each batch
+        would start (and load the model into) a fresh set of processes. The
+        pool is only started once a batch needs it and is stopped when the
+        block ends.
+        """
+        if self._keep_encode_pool:
+            yield
+            return
+        self._keep_encode_pool = True
+        try:
+            yield
+        finally:
+            self._keep_encode_pool = False
+            if self._encode_pool is not None:
+                self.base_embeddings.client.stop_multi_process_pool(self._encode_pool)
+                self._encode_pool = None
+    
+    def embed_texts(self, texts: List[str], num_workers: int = EMBEDDING_WORKERS,
+                    batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        """
+        Embed chunks for ingestion
+        
+        Texts are encoded longest first so each batch holds chunks of similar
+        length and little padding. With SentenceTransformer and more than one
+        worker, batches are spread over a multi-process encode pool (started
+        per call, or once per ``encode_pool`` block); with OpenAI, batches are
+        sent concurrently by ``AsyncOpenAIEmbeddings``.
+        
+        Args:
+            texts: Chunks to embed
+            num_workers: SentenceTransformer encoder processes (1 = in-process, 0 = one per CPU)
+            batch_size: Chunks per SentenceTransformer forward pass
+            
+        Returns:
+            float32 array with one row per text, in input order
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        sorted_texts = [texts[i] for i in order]
+        
+        if num_workers == 0:
+            num_workers = os.cpu_count() or 1
+        
+        if self.use_openai:
+            embeddings = self.ingest_embeddings.embed_documents(sorted_texts)
+        elif num_workers > 1 and len(texts) > batch_size:
+            model = self.base_embeddings.client
+            pool = self._encode_pool
+            if pool is None:
+                pool = model.start_multi_process_pool(target_devices=["cpu"] * num_workers)
+                if self._keep_encode_pool:
+                    self._encode_pool = pool
+            try:
+                embeddings = model.encode_multi_process(sorted_texts, pool, batch_size=batch_size,
+                                                        chunk_size=batch_size * 4)
+            finally:
+                if pool is not self._encode_pool:
+                    model.stop_multi_process_pool(pool)
+        else:
+            embeddings = []
+            for i in range(0, len(sorted_texts), batch_size):
+                embeddings.extend(self.base_embeddings.embed_documents(sorted_texts[i:i + batch_size]))
+        
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        result = np.empty_like(embeddings)
+        result[order] = embeddings
+        return result
+    
     def add_texts(self, texts: List[str], metadatas: List[Dict[str, Any]] = None) -> List[str]:
-        """Add texts directly to the vector store"""
+        """Add texts directly to the vector store (content-addressed, like ``add_documents``)"""
         try:
             if metadatas is None:
-                metadatas = [{}] * len(texts)
+                metadatas = [{} for _ in texts]
             
-            ids = self.vectorstore.add_texts(texts, metadatas)
-            self.vectorstore.persist()
+            documents = [LangChainDocument(page_content=text, metadata=dict(metadata))
+                         for text, metadata in zip(texts, metadatas)]
+            ids = self.add_documents(documents)
             
             logger.info(f"Added {len(texts)} texts to vector store")
             return ids
@@ -124,6 +330,136 @@ class VectorStore:
             logger.error(f"Error adding texts: {str(e)}")
             raise
     
+    def export_embeddings(self, batch_size: int = 5000) -> Dict[str, Any]:
+        """
+        Read every stored chunk with its embedding
+        
+        Returns:
+            Dict with 'ids', 'documents', 'metadatas' (lists) and 'embeddings'
+            (float32 array, one row per id)
+        """
+        ids, documents, metadatas, embeddings = [], [], [], []
+        offset = 0
+        while True:
+            batch = self.vectorstore.get(include=['embeddings', 'documents', 'metadatas'],
+                                         limit=batch_size, offset=offset)
+            if not len(batch['ids']):
+                break
+            ids.extend(batch['ids'])
+            documents.extend(batch['documents'])
+            metadatas.extend(batch['metadatas'])
+            embeddings.extend(batch['embeddings'])
+            offset += len(batch['ids'])
+        
+        return {
+            'ids': ids,
+            'documents': documents,
+            'metadatas': metadatas,
+            'embeddings': np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        }
+    
+    def bulk_load(self, ids: List[str], embeddings, texts: List[str],
+                  metadatas: Optional[List[Dict[str, Any]]] = None,
+                  batch_size: Optional[int] = None, persist: bool = True) -> int:
+        """
+        Write chunks with precomputed embeddings straight to the collection
+        
+        Bypasses the LangChain wrapper and the embedding model: rows go to the
+        chromadb collection in upserts as large as the client accepts (each one
+        a single transaction), or to the local index in one call, and the store
+        is persisted once at the end.
+        
+        Args:
+            ids: Chunk ids
+            embeddings: Array-like of shape (len(ids), dim); memory-mapped arrays are read batch by batch
+            texts: Chunk texts
+            metadatas: Chunk metadata (empty if omitted)
+            batch_size: Rows per upsert (defaults to the client's maximum batch size)
+            persist: Persist the store afterwards (see ``add_documents``)
+            
+        Returns:
+            Number of chunks written
+        """
+        try:
+            if metadatas is None:
+                metadatas = [{} for _ in ids]
+            if not (len(ids) == len(embeddings) == len(texts) == len(metadatas)):
+                raise ValueError("ids, embeddings, texts and metadatas must have the same length")
+            if not ids:
+                return 0
+            
+            start = time.time()
+            if self.backend == "local":
+                self.vectorstore.upsert(ids, embeddings, texts, metadatas)
+            else:
+                collection = self.vectorstore._collection
+                if batch_size is None:
+                    batch_size = getattr(self.chroma_client, 'max_batch_size', 5000)
+                for i in range(0, len(ids), batch_size):
+                    collection.upsert(
+                        ids=ids[i:i + batch_size],
+                        embeddings=np.asarray(embeddings[i:i + batch_size], dtype=np.float32).tolist(),
+                        documents=texts[i:i + batch_size],
+                        metadatas=metadatas[i:i + batch_size]
+                    )
+            if persist:
+                self.vectorstore.persist()
+            
+            elapsed = time.time() - start
+            logger.info(f"Bulk loaded {len(ids)} documents with precomputed embeddings in {elapsed:.2f}s")
+            return len(ids)
+            
+        except Exception as e:
+            logger.error(f"Error bulk loading documents: {str(e)}")
+            raise
+    
+    def delete_documents(self, ids: List[str], persist: bool = True):
+        """Delete chunks by id"""
+        try:
+            if not ids:
+                return
+            self.vectorstore.delete(ids=ids)
+            if persist:
+                self.vectorstore.persist()
+            logger.info(f"Deleted {len(ids)} documents from vector store")
+            
+        except Exception as e:
+            logger.error(f"Error deleting documents: {str(e)}")
+            raise
+    
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]], persist: bool = True):
+        """
+        Merge metadata fields into stored chunks without re-embedding them
+        
+        Args:
+            updates: Chunk id -> fields to set (ids not in the collection are ignored)
+            persist: Persist the store afterwards (see ``add_documents``)
+        """
+        try:
+            if not updates:
+                return
+            current = self.vectorstore.get(ids=list(updates), include=['metadatas'])
+            ids = current['ids']
+            metadatas = [dict(metadata or {}, **updates[chunk_id])
+                         for chunk_id, metadata in zip(ids, current['metadatas'])]
+            if not ids:
+                return
+            if self.backend == "local":
+                self.vectorstore.update(ids, metadatas)
+            else:
+                self.vectorstore._collection.update(ids=ids, metadatas=metadatas)
+            if persist:
+                self.vectorstore.persist()
+            logger.info(f"Updated metadata of {len(ids)} documents in vector store")
+            
+        except Exception as e:
+            logger.error(f"Error updating document metadata: {str(e)}")
+            raise
+    
+    def persist(self):
+        """Write pending changes to disk"""
+        self.vectorstore.persist()
+    
     def similarity_search(self, query: str, k: int = MAX_CHUNKS) -> List[LangChainDocument]:
         """Perform similarity search"""
         try:
@@ -160,14 +496,18 @@ class VectorStore:
     def get_collection_info(self) -> Dict[str, Any]:
         """Get information about the collection"""
         try:
-            collection = self.chroma_client.get_collection(self.collection_name)
-            count = collection.count()
+            if self.backend == "local":
+                count = self.vectorstore.count()
+            else:
+                count = self.chroma_client.get_collection(self.collection_name).count()
             
             return {
                 "collection_name": self.collection_name,
                 "document_count": count,
-                "embedding_model": EMBEDDING_MODEL if self.use_openai else "all-MiniLM-L6-v2",
-                "persist_directory": CHROMA_PERSIST_DIRECTORY
+                "embedding_model": self.embedding_model_name,
+                "backend": self.backend,
+                "persist_directory": self.persist_directory,
+                "query_cache": self.query_cache.cache_info() if self.query_cache else None
             }
             
         except Exception as e:
@@ -177,7 +517,10 @@ class VectorStore:
     def delete_collection(self):
         """Delete the entire collection"""
         try:
-            self.chroma_client.delete_collection(self.collection_name)
+            if self.backend == "local":
+                self.vectorstore.delete_collection()
+            else:
+                self.chroma_client.delete_collection(self.collection_name)
             logger.info(f"Deleted collection: {self.collection_name}")
             
         except Exception as e:
@@ -188,7 +531,10 @@ class VectorStore:
         """Reset the collection (delete and recreate)"""
         try:
             self.delete_collection()
-            self._initialize_chroma()
+            if self.backend == "local":
+                self._initialize_local()
+            else:
+                self._initialize_chroma()
             logger.info("Collection reset successfully")
             
         except Exception as e:
@@ -0,0 +1,80 @@
+"""
+Shared fixtures: a ProposedRAGSystem on temporary directories with a deterministic embedder
+"""
+import os
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+EMBEDDING_DIM = 64
+
+
+class HashingEmbeddings:
+    """
+    Bag-of-words vectors hashed into ``EMBEDDING_DIM`` buckets
+
+    Stands in for SentenceTransformerEmbeddings so ingest and retrieval can be
+    tested without downloading a model; texts sharing words get similar vectors.
+    """
+
+    def __init__(self, model_name: str = "hashing", **kwargs):
+        self.model_name = model_name
+
+    def _embed(self, text):
+        vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.strip('.,:;!?#').encode('utf-8')) % EMBEDDING_DIM] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+@pytest.fixture
+def make_system(tmp_path, monkeypatch):
+    """Factory for ProposedRAGSystem instances sharing one temporary Chroma and index directory"""
+    pytest.importorskip("chromadb")
+    pytest.importorskip("langchain_community")
+    from rag_system import proposed_rag_system, vector_store
+
+    monkeypatch.setattr(vector_store, "SentenceTransformerEmbeddings", HashingEmbeddings)
+    monkeypatch.setattr(vector_store, "CHROMA_PERSIST_DIRECTORY", str(tmp_path / "chroma"))
+    monkeypatch.setattr(vector_store, "RAG_INDEX_DIRECTORY", str(tmp_path / "index"))
+    monkeypatch.setattr(proposed_rag_system, "RAG_INDEX_DIRECTORY", str(tmp_path / "index"))
+
+    def make(collection_name="test_documents", **settings):
+        system = proposed_rag_system.ProposedRAGSystem(collection_name, use_openai=False)
+        for name, value in settings.items():
+            setattr(system, name, value)
+        return system
+
+    return make
+
+
+@pytest.fixture
+def pet_documents(tmp_path):
+    """A small directory of pet-care documents"""
+    directory = tmp_path / "documents"
+    (directory / "cats").mkdir(parents=True)
+    files = {
+        "cats/feeding.txt": "Cats need taurine in their food. Feed your cat wet food twice a day.\n\n"
+                            "Kittens eat small meals often. Fresh water helps cats avoid kidney problems.",
+        "cats/grooming.txt": "Brush long haired cats every day to prevent mats.\n\n"
+                             "Trim your cat's claws every two weeks and check the ears.",
+        "dogs.txt": "Dogs need daily walks on a leash. Puppies need vaccines against parvovirus.\n\n"
+                    "Feed an adult dog twice a day and keep treats under ten percent of calories.",
+        "vaccines.md": "# Vaccination\n\nCore vaccines protect pets from rabies.\n\n"
+                       "## Boosters\n\nAdult dogs and cats get booster shots every one to three years.",
+    }
+    for name, text in files.items():
+        (directory / name).write_text(text, encoding="utf-8")
+    return directory
@@ -0,0 +1,112 @@
+"""
+AsyncOpenAIEmbeddings against an in-process OpenAI-compatible HTTP stub
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("httpx")
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from rag_system.async_embeddings import AsyncOpenAIEmbeddings
+
+# Responses per batch, in order: rate limited, server error, then success
+FAILURES = [(429, {'Retry-After': '0'}), (503, {})]
+
+
+class EmbeddingStub(ThreadingHTTPServer):
+    """Serves /embeddings, failing each batch before it succeeds and tracking requests in flight"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _EmbeddingHandler)
+        self.lock = threading.Lock()
+        self.attempts = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+class _EmbeddingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        texts = body['input']
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            attempt = server.attempts.get(texts[0], 0)
+            server.attempts[texts[0]] = attempt + 1
+        try:
+            # Hold the request open so concurrent batches overlap
+            time.sleep(0.05)
+            if attempt < len(FAILURES):
+                status, headers = FAILURES[attempt]
+                self._reply(status, {'error': {'message': 'try again'}}, headers)
+                return
+            # Items come back out of order; the client must sort them by index
+            data = [{'index': i, 'embedding': [float(text), 1.0]} for i, text in enumerate(texts)]
+            self._reply(200, {'data': data[::-1], 'model': body['model']})
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _reply(self, status, payload, headers=None):
+        content = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+@pytest.fixture
+def stub():
+    server = EmbeddingStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, **kwargs):
+    settings = {'batch_size': 4, 'max_concurrency': 3, 'requests_per_minute': 60000,
+                'initial_backoff': 0.01, 'max_backoff': 0.05, 'timeout': 5.0}
+    settings.update(kwargs)
+    host, port = server.server_address
+    return AsyncOpenAIEmbeddings(api_key="test", model="stub-embedding",
+                                 base_url=f"http://{host}:{port}/v1", **settings)
+
+
+def test_retries_concurrency_and_order(stub):
+    texts = [str(i) for i in range(40)]
+
+    vectors = make_client(stub).embed_documents(texts)
+
+    assert vectors == [[float(i), 1.0] for i in range(40)]
+    # 10 batches, each rate limited, then failed, then served
+    assert len(stub.attempts) == 10
+    assert set(stub.attempts.values()) == {len(FAILURES) + 1}
+    assert 1 < stub.max_in_flight <= 3
+
+
+def test_gives_up_after_max_retries(stub):
+    with pytest.raises(RuntimeError, match="HTTP 503"):
+        make_client(stub, max_retries=1).embed_documents(["0", "1"])
+
+    assert stub.attempts == {"0": 2}
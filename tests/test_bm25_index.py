@@ -0,0 +1,117 @@
+"""
+BM25Index scores against rank_bm25.BM25Okapi, the scorer it replaces
+"""
+import os
+import random
+import sys
+
+import pytest
+
+rank_bm25 = pytest.importorskip("rank_bm25")
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from rag_system.bm25_index import BM25Index
+
+# "common" is in most documents, so its raw IDF is negative and the epsilon floor applies
+VOCABULARY = ["common"] * 6 + [f"term{i}" for i in range(40)]
+QUERIES = [
+    ["term1"],
+    ["term2", "term3", "term4"],
+    ["common", "term5"],
+    ["term6", "term6", "term7"],
+    ["missing", "term8"],
+    ["missing"],
+]
+
+
+@pytest.fixture
+def corpus():
+    rng = random.Random(7)
+    return [[rng.choice(VOCABULARY) for _ in range(rng.randint(1, 25))] for _ in range(200)]
+
+
+def assert_matches(index, live_docs, live_ids):
+    """Scores of the index's live documents equal BM25Okapi over just those documents"""
+    reference = rank_bm25.BM25Okapi(live_docs)
+    for query in QUERIES:
+        expected = reference.get_scores(query)
+        scores = index.get_scores(query)
+        assert [scores[doc_id] for doc_id in live_ids] == pytest.approx(list(expected), rel=1e-12, abs=1e-12)
+        assert all(scores[doc_id] == 0.0 for doc_id in set(range(len(scores))) - set(live_ids))
+
+        # top_k is the head of a stable descending sort of the reference scores
+        ranked = sorted(range(len(live_ids)), key=lambda i: -expected[i])[:10]
+        hits = index.top_k(query, 10)
+        assert [doc_id for doc_id, _ in hits] == [live_ids[i] for i in ranked]
+        assert [score for _, score in hits] == pytest.approx([expected[i] for i in ranked], rel=1e-12, abs=1e-12)
+
+
+def test_matches_bm25okapi(corpus):
+    index = BM25Index(corpus)
+
+    assert_matches(index, corpus, list(range(len(corpus))))
+
+
+def test_matches_after_tombstone_and_compaction(corpus):
+    index = BM25Index(corpus)
+    deleted = set(range(0, len(corpus), 3))
+    index.delete_documents(sorted(deleted))
+    live_ids = [doc_id for doc_id in range(len(corpus)) if doc_id not in deleted]
+    live_docs = [corpus[doc_id] for doc_id in live_ids]
+
+    assert_matches(index, live_docs, live_ids)
+
+    index.compact()
+    assert_matches(index, live_docs, list(range(len(live_docs))))
+
+
+def test_matches_after_save_and_mmap_load(corpus, tmp_path):
+    index = BM25Index(corpus)
+    index.delete_documents([1, 2, 50])
+    index.compact()
+    index.save(str(tmp_path))
+    live_docs = [doc for doc_id, doc in enumerate(corpus) if doc_id not in {1, 2, 50}]
+
+    loaded = BM25Index.load(str(tmp_path))
+    assert_matches(loaded, live_docs, list(range(len(live_docs))))
+
+    # Changing the memory-mapped index copies it first and keeps matching
+    extra = [["term9", "term10"], ["common"]]
+    loaded.add_documents(extra)
+    loaded.delete_documents([0])
+    assert_matches(loaded, live_docs[1:] + extra, list(range(1, len(live_docs) + len(extra))))
+
+
+def test_top_k_batch_matches_top_k(corpus):
+    pytest.importorskip("scipy")
+    index = BM25Index(corpus)
+    index.delete_documents([3, 4, 100])
+
+    for k in (1, 10, 250):
+        batch = index.top_k_batch(QUERIES, k, block_size=4)
+        for query, hits in zip(QUERIES, batch):
+            expected = index.top_k(query, k)
+            assert [doc_id for doc_id, _ in hits] == [doc_id for doc_id, _ in expected]
+            assert [score for _, score in hits] == pytest.approx([score for _, score in expected], rel=1e-9, abs=1e-12)
+
+
+def test_parallel_tokenization_matches_serial(caplog):
+    from rag_system import bm25_retriever
+    from rag_system.bm25_retriever import BM25Retriever
+
+    rng = random.Random(5)
+    words = ["cats", "dogs", "feeding", "vaccines", "grooming", "the", "and", "puppies", "kittens", "water"]
+    documents = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 30)))
+                 for _ in range(bm25_retriever.PARALLEL_MIN_DOCUMENTS + 50)]
+
+    serial = BM25Retriever(documents, num_workers=1)
+    with caplog.at_level("INFO", logger="rag_system.bm25_retriever"):
+        parallel = BM25Retriever(documents, num_workers=2)
+
+    assert any("across 2 processes" in record.getMessage() for record in caplog.records)
+    assert parallel._term_frequencies(documents[:10]) == serial._term_frequencies(documents[:10])
+    assert parallel._term_frequencies(documents) == serial._term_frequencies(documents)
+    for query in ("cats and kittens", "feeding puppies water", "unknown"):
+        assert parallel.search(query, k=20) == serial.search(query, k=20)
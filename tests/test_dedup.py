@@ -0,0 +1,55 @@
+"""
+Near-duplicate chunk removal with NearDuplicateIndex
+"""
+from rag_system.dedup import NearDuplicateIndex
+from rag_system.vector_store import make_chunk_id
+
+PASSAGE = ("Adult cats should be fed measured portions of a complete diet twice a day. "
+           "Fresh water must always be available, and wet food helps cats that drink little. "
+           "Sudden changes in appetite are a reason to call your veterinarian.")
+# The same passage as scraped from another site, under a header with its URL and date
+SCRAPED_COPY = "Source: https://example.org/cat-feeding Scraped: 2024-05-01\n" + PASSAGE
+DISTINCT = ("Dogs need a daily walk on a leash and a chance to sniff around. "
+            "Puppies should meet other vaccinated dogs to learn good manners early.")
+
+
+def test_near_identical_chunks_collapse_and_distinct_chunks_survive():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add("original", index.signature(PASSAGE), "site_a.txt")
+
+    assert index.find(index.signature(SCRAPED_COPY)) == "original"
+    assert index.find(index.signature(DISTINCT)) is None
+    # A retracted canonical chunk cannot absorb copies
+    assert index.find(index.signature(SCRAPED_COPY), exclude={"original"}) is None
+
+    assert index.add_alternate("original", "site_b.txt")
+    assert not index.add_alternate("original", "site_b.txt")
+    assert index.remove(["original"]) == {"site_b.txt"}
+    assert len(index) == 0
+
+
+def test_ingest_drops_copies_and_reports_what_it_dropped(make_system, tmp_path):
+    directory = tmp_path / "near_duplicates"
+    directory.mkdir()
+    (directory / "site_a.txt").write_text(PASSAGE, encoding="utf-8")
+    (directory / "site_b.txt").write_text(SCRAPED_COPY, encoding="utf-8")
+    (directory / "dogs.txt").write_text(DISTINCT, encoding="utf-8")
+    system = make_system(near_duplicate_threshold=0.8)
+    all_ids = {make_chunk_id(chunk.page_content, chunk.metadata)
+               for chunk in system.document_processor.iter_directory_chunks(str(directory))}
+
+    result = system.ingest_directory(str(directory))
+
+    indexed = system.bm25_retriever.get_chunk_ids()
+    dropped = all_ids - indexed
+    stats = result['near_duplicates']
+    assert (stats['chunks_seen'], stats['chunks_dropped'], stats['clusters']) == (3, 1, 1)
+    assert stats['chunks_dropped'] == len(dropped)
+    assert stats['chunk_savings'] == len(dropped) / len(all_ids)
+    assert result['documents_processed'] == len(indexed) == 2
+    assert indexed == set(system.vector_manager.vector_store.export_embeddings()['ids'])
+
+    # The kept copy names the file whose copy was dropped
+    kept = [metadata for metadata in system.bm25_retriever.document_metadata if metadata.get('alternate_sources')]
+    assert [metadata['filename'] for metadata in kept] == ["site_a.txt"]
+    assert kept[0]['alternate_sources'].endswith("site_b.txt")
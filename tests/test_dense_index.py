@@ -0,0 +1,75 @@
+"""
+LocalDenseIndex search backends against exact float32 search
+"""
+import numpy as np
+import pytest
+
+from rag_system.dense_index import LocalDenseIndex
+
+K = 5
+EXACT_BACKENDS = [("numpy", "float32"), ("numpy", "float16"), ("numpy", "int8"),
+                  ("flat", "float32"), ("flat", "float16"), ("flat", "int8")]
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((600, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(len(vectors), size=20, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, queries
+
+
+def build(tmp_path, vectors, index_type, dtype):
+    if index_type != "numpy":
+        pytest.importorskip("faiss")
+    index = LocalDenseIndex(None, str(tmp_path / f"{index_type}_{dtype}"), index_type=index_type, dtype=dtype)
+    index.upsert([f"chunk{i}" for i in range(len(vectors))], vectors,
+                 [f"text {i}" for i in range(len(vectors))], [{'row': i} for i in range(len(vectors))])
+    index.persist()
+    return index
+
+
+@pytest.mark.parametrize("index_type, dtype", EXACT_BACKENDS)
+def test_backends_agree_on_top_k(tmp_path, corpus, index_type, dtype):
+    vectors, queries = corpus
+    index = build(tmp_path, vectors, index_type, dtype)
+
+    for query in queries:
+        exact = vectors @ query
+        expected = np.argsort(-exact, kind='stable')[:K]
+        hits = index.similarity_search_by_vector_with_score(query, k=K)
+        assert [doc.metadata['row'] for doc, _ in hits] == expected.tolist()
+        # Quantized candidates are re-scored, so distances are the float32 ones
+        assert [distance for _, distance in hits] == pytest.approx((2.0 - 2.0 * exact[expected]).tolist(), abs=1e-5)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_hnsw_recall_with_exact_scores(tmp_path, corpus, dtype):
+    vectors, queries = corpus
+    index = build(tmp_path, vectors, "hnsw", dtype)
+
+    found = 0
+    for query in queries:
+        exact = vectors @ query
+        hits = index.similarity_search_by_vector_with_score(query, k=K)
+        rows = [doc.metadata['row'] for doc, _ in hits]
+        found += len(set(rows) & set(np.argsort(-exact)[:K].tolist()))
+        assert [distance for _, distance in hits] == pytest.approx((2.0 - 2.0 * exact[rows]).tolist(), abs=1e-5)
+    # HNSW is approximate; its graph search may miss a neighbour now and then
+    assert found / (len(queries) * K) >= 0.95
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_quantized_faiss_search_leaves_float32_vectors_on_disk(tmp_path, corpus, index_type):
+    vectors, queries = corpus
+    index = build(tmp_path, vectors, index_type, "int8")
+
+    index.similarity_search_by_vector(queries[0], k=K)
+
+    assert isinstance(index.vectors, np.memmap)
+    assert index._quantized is None
+    faiss = pytest.importorskip("faiss")
+    assert isinstance(index._faiss_index, (faiss.IndexScalarQuantizer, faiss.IndexHNSWSQ))
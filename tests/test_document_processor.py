@@ -0,0 +1,73 @@
+"""
+DocumentProcessor chunking
+"""
+from rag_system.document_processor import DocumentProcessor, iter_markdown_sections
+from rag_system.vector_store import make_chunk_id
+
+
+def markdown_chunks(tmp_path, text, **settings):
+    path = tmp_path / "page.md"
+    path.write_text(text, encoding="utf-8")
+    return list(DocumentProcessor(**settings).iter_chunks(str(path)))
+
+
+def test_markdown_sections_skip_code_fences():
+    lines = ["# Title\n", "intro\n", "```\n", "# not a heading\n", "```\n", "## Sub\n", "body\n"]
+
+    sections = list(iter_markdown_sections(lines))
+
+    assert sections == [(["Title"], "# Title\nintro\n```\n# not a heading\n```\n"),
+                        (["Title", "Sub"], "## Sub\nbody\n")]
+
+
+def test_markdown_chunks_carry_parent_headings(tmp_path):
+    chunks = markdown_chunks(tmp_path, "# Title\n## Sub A\nbody")
+
+    assert [chunk.page_content for chunk in chunks] == ["Title\n\n## Sub A\nbody"]
+    assert chunks[0].metadata['heading_path'] == "Title > Sub A"
+    assert chunks[0].metadata['section'] == "Sub A"
+
+
+def test_small_sibling_sections_are_merged(tmp_path):
+    text = "# Care\n## Food\nFeed twice a day.\n## Water\nKeep the bowl full.\n# Other\nUnrelated.\n"
+
+    chunks = markdown_chunks(tmp_path, text, chunk_size=200, chunk_overlap=20)
+
+    assert [chunk.page_content for chunk in chunks] == [
+        "Care\n\n## Food\nFeed twice a day.\n## Water\nKeep the bowl full.",
+        "# Other\nUnrelated.",
+    ]
+    assert chunks[0].metadata['heading_path'] == "Care"
+    assert chunks[0].metadata['section'] == "Food; Water"
+
+
+def test_long_sections_are_split_within_the_chunk_size(tmp_path):
+    text = "# Guide\n## Grooming\n" + "Brush the coat gently every day. " * 20 + "\n## Bathing\nRarely.\n"
+
+    chunks = markdown_chunks(tmp_path, text, chunk_size=150, chunk_overlap=20)
+
+    grooming = [chunk for chunk in chunks if chunk.metadata['section'] == "Grooming"]
+    assert len(grooming) > 1
+    assert all(chunk.page_content.startswith("Guide > Grooming\n\n") for chunk in grooming)
+    assert all(len(chunk.page_content) <= 150 for chunk in chunks)
+    assert chunks[-1].page_content == "Guide\n\n## Bathing\nRarely."
+
+
+def test_streamed_chunks_match_whole_file_chunking(tmp_path):
+    sentences = [f"Sentence {i} says cats and dogs need care number {i * 7}." for i in range(120)]
+    text = "\n\n".join(" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5))
+    path = tmp_path / "care.txt"
+    path.write_text(text, encoding="utf-8")
+    processor = DocumentProcessor(chunk_size=200, chunk_overlap=40)
+    processor.stream_buffer_chars = 500
+
+    streamed = list(processor.iter_chunks(str(path)))
+    # The pre-streaming path: load the whole file, then split it
+    whole = processor.chunk_document(processor.load_document(str(path)), processor._file_metadata(str(path)))
+
+    assert len(whole) > 10
+    assert [make_chunk_id(chunk.page_content, chunk.metadata) for chunk in streamed] == \
+        [make_chunk_id(chunk.page_content, chunk.metadata) for chunk in whole]
+    assert [chunk.metadata for chunk in streamed] == [chunk.metadata for chunk in whole]
+    assert [chunk.page_content for chunk in processor.process_directory(str(tmp_path))] == \
+        [chunk.page_content for chunk in whole]
@@ -0,0 +1,93 @@
+"""
+Incremental directory sync: batching, the ingest manifest and retraction
+"""
+import os
+
+from rag_system.bm25_retriever import BM25Retriever
+from rag_system.ingest_manifest import IngestManifest
+from rag_system.vector_store import make_chunk_id
+
+QUESTIONS = ["how often should I feed my cat", "booster shots for dogs", "brush the coat"]
+
+
+def index_state(system):
+    """Live chunk ids of both indexes and the BM25 hits for a few questions"""
+    bm25 = system.bm25_retriever
+    return {
+        'bm25_ids': bm25.get_chunk_ids(),
+        'vector_ids': set(system.vector_manager.vector_store.export_embeddings()['ids']),
+        'bm25_hits': [[(hit['metadata']['chunk_id'], round(hit['score'], 9)) for hit in bm25.search(question, k=5)]
+                      for question in QUESTIONS],
+    }
+
+
+def test_batched_sync_matches_single_batch(make_system, pet_documents):
+    single = make_system("single_batch", ingest_batch_size=1000)
+    batched = make_system("small_batches", ingest_batch_size=2)
+
+    assert single.ingest_directory(str(pet_documents))['success']
+    result = batched.ingest_directory(str(pet_documents))
+
+    assert result['success']
+    assert result['documents_processed'] > 2
+    assert index_state(batched) == index_state(single)
+    assert index_state(batched)['bm25_ids'] == index_state(batched)['vector_ids']
+
+    # The saved BM25 index is the one built in batches
+    reopened = make_system("small_batches")
+    reopened.bm25_retriever = reopened._load_bm25_index()
+    assert index_state(reopened) == index_state(single)
+
+
+def expected_chunk_ids(system, directory):
+    """Chunk ids of every file under ``directory`` chunked from scratch"""
+    return {make_chunk_id(chunk.page_content, chunk.metadata)
+            for chunk in system.document_processor.iter_directory_chunks(str(directory))}
+
+
+def bm25_texts(system):
+    """Texts of the live BM25 documents"""
+    bm25 = system.bm25_retriever
+    return sorted(text for i, text in enumerate(bm25.documents) if i not in bm25.bm25.deleted)
+
+
+def test_sync_follows_modified_and_deleted_files(make_system, pet_documents, monkeypatch):
+    system = make_system()
+    result = system.ingest_directory(str(pet_documents))
+    initial_ids = expected_chunk_ids(system, pet_documents)
+
+    assert result['files_processed'] == 4
+    assert index_state(system)['bm25_ids'] == index_state(system)['vector_ids'] == initial_ids
+    manifest = IngestManifest(os.path.join(system.index_dir, "manifest.json"))
+    assert set().union(*(manifest.chunk_ids(path) for path in manifest.files)) == initial_ids
+
+    # Nothing changed: no chunking and nothing saved
+    saves = []
+    with monkeypatch.context() as patch:
+        patch.setattr(BM25Retriever, "save", lambda self, path: saves.append(path))
+        result = system.ingest_directory(str(pet_documents))
+    assert (result['files_processed'], result['documents_processed']) == (0, 0)
+    assert saves == []
+    assert index_state(system)['bm25_ids'] == initial_ids
+
+    # One file modified, another deleted
+    (pet_documents / "dogs.txt").write_text("Dogs love fetch. Walk your dog after every meal.", encoding="utf-8")
+    grooming_ids = {make_chunk_id(chunk.page_content, chunk.metadata)
+                    for chunk in system.document_processor.iter_chunks(str(pet_documents / "cats" / "grooming.txt"))}
+    os.remove(pet_documents / "cats" / "grooming.txt")
+
+    result = system.ingest_directory(str(pet_documents))
+    current_ids = expected_chunk_ids(system, pet_documents)
+
+    assert result['files_processed'] == 1
+    assert not grooming_ids & current_ids
+    assert index_state(system)['bm25_ids'] == index_state(system)['vector_ids'] == current_ids
+    assert bm25_texts(system) == sorted(chunk.page_content for chunk in
+                                        system.document_processor.iter_directory_chunks(str(pet_documents)))
+    assert all("Brush" not in hit['content'] for hit in system.bm25_retriever.search("brush claws mats", k=10))
+
+    # A fresh system reads the saved manifest and BM25 index and finds nothing to do
+    reopened = make_system()
+    result = reopened.ingest_directory(str(pet_documents))
+    assert (result['files_processed'], result['documents_processed']) == (0, 0)
+    assert index_state(reopened)['bm25_ids'] == current_ids
@@ -0,0 +1,88 @@
+"""
+Species/topic tagging, query routing and partition-restricted BM25 ranking
+"""
+import random
+
+import pytest
+
+from rag_system.bm25_index import BM25Index, DocumentSubset
+from rag_system.partitioning import QueryRouter, filter_rows, tag_chunk
+
+
+@pytest.mark.parametrize("text, source, species", [
+    ("A cat may hide when stressed.", "", "general"),
+    ("A cat may hide. Give the cat a box.", "", "cat"),
+    ("Cats and dogs can live together if the cat and the dog are introduced slowly.", "", "both"),
+    ("A dog barks at a cat, the dog and the dog's puppy chase it.", "", "dog"),
+    ("Give them a quiet place to hide.", "Kitten-book.pdf", "cat"),
+])
+def test_tag_chunk_species_thresholds(text, source, species):
+    assert tag_chunk(text, source)['species'] == species
+
+
+def test_tag_chunk_topic_needs_hits_and_dominance():
+    assert tag_chunk("Fresh food every morning.")['topic'] == "general"
+    assert tag_chunk("Fresh food and a balanced diet.")['topic'] == "nutrition"
+
+    # Two topics with the same support: both flags set, no main topic
+    tags = tag_chunk("Feed a good diet and keep rabies vaccine boosters current.")
+    assert tags['topic'] == "general"
+    assert tags['topic_nutrition'] and tags['topic_vaccination']
+    assert not tags['topic_grooming']
+
+
+def test_router_filters():
+    router = QueryRouter()
+
+    species_only = router.route("how much water for my cat")
+    assert (species_only['species'], species_only['topic']) == ("cat", None)
+    assert species_only['filter'] == {'species': {'$in': ['cat', 'both', 'general']}}
+
+    narrowed = router.route("what food and diet suits my kitten")
+    assert narrowed['filter'] == {'$and': [{'species': {'$in': ['cat', 'both', 'general']}},
+                                           {'$or': [{'topic_nutrition': True}, {'topic': 'general'}]}]}
+
+    assert router.route("do cats and dogs get along")['filter'] is None
+    assert QueryRouter(route_topics=False).route("what food and diet suits my kitten")['topic'] is None
+
+    # The extracted pet type routes with lower confidence
+    from_entity = router.route("how often should I brush the coat", pet_type="Puppy")
+    assert (from_entity['species'], from_entity['confidence']) == ("dog", 0.6)
+    assert from_entity['filter'] is not None
+    assert QueryRouter(min_confidence=0.7).route("how often should I brush the coat", pet_type="puppy")['filter'] is None
+
+
+def test_route_filter_keeps_shared_and_general_chunks():
+    chunks = ["Feed your cat a cat food with taurine, cat diet matters.",
+              "Feed your dog a dog food, dog diet matters.",
+              "Cats and dogs both need food, a cat and a dog eat daily.",
+              "Wash your hands after cleaning up."]
+    metadatas = [tag_chunk(text) for text in chunks]
+
+    route = QueryRouter().route("what food and diet suits my kitten")
+
+    assert filter_rows(metadatas, route['filter']) == [0, 2, 3]
+
+
+@pytest.fixture
+def index():
+    rng = random.Random(11)
+    vocabulary = ["common"] * 5 + [f"term{i}" for i in range(30)]
+    return BM25Index([[rng.choice(vocabulary) for _ in range(rng.randint(1, 20))] for _ in range(300)])
+
+
+@pytest.mark.parametrize("subset_size", [5, 40, 250])
+def test_partition_top_k_equals_restricted_full_ranking(index, subset_size):
+    rng = random.Random(subset_size)
+    index.delete_documents(rng.sample(range(300), 20))
+    subset_ids = set(rng.sample(range(300), subset_size))
+    subset = DocumentSubset(subset_ids, len(index.doc_len))
+
+    for query in (["term1"], ["term2", "term3"], ["common", "term4", "term4"], ["missing"]):
+        full = [(doc_id, score) for doc_id, score in index.top_k(query, 300) if doc_id in subset_ids]
+        for k in (1, 10, 300):
+            hits = index.top_k(query, k, allowed=subset)
+            assert [doc_id for doc_id, _ in hits] == [doc_id for doc_id, _ in full[:k]]
+            assert [score for _, score in hits] == pytest.approx([score for _, score in full[:k]], rel=1e-12)
+            # A plain id set is converted to the same subset
+            assert index.top_k(query, k, allowed=subset_ids) == hits
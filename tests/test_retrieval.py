@@ -0,0 +1,81 @@
+"""
+Parent-child expansion and two-stage (document, then chunk) retrieval
+"""
+import json
+
+from rag_system.document_processor import DocumentProcessor
+from rag_system.parent_store import PARENTS_FILE
+
+TOPICS = {
+    "feeding.txt": "Cats need taurine in their food. Feed kittens small meals four times a day. "
+                   "Adult cats eat twice a day and need fresh water next to the bowl.",
+    "grooming.txt": "Brush long haired cats every day to prevent mats in the coat. "
+                    "Trim the claws every two weeks and check the ears for wax.",
+    "walking.txt": "Dogs need a walk on a leash every morning and evening. "
+                   "Let the dog sniff around the park and carry bags for cleaning up.",
+    "vaccines.txt": "Puppies get vaccines against parvovirus and distemper at eight weeks. "
+                    "Rabies shots follow at sixteen weeks, then boosters every year or three.",
+    "teeth.txt": "Dental disease is common in older pets. Brush teeth with pet toothpaste "
+                 "and book a dental cleaning at the vet once a year.",
+    "training.txt": "Train a puppy with short sessions and treats. Reward sitting calmly "
+                    "and ignore barking for attention so the habit fades.",
+}
+QUESTIONS = ["how often should kittens eat meals", "when do puppies get parvovirus vaccines",
+             "trim the claws and brush the coat", "how to stop barking with treats"]
+
+
+def test_child_hits_return_their_parent_stored_once(make_system, pet_documents):
+    processor = DocumentProcessor(chunk_size=160, chunk_overlap=0, parent_child=True,
+                                  child_chunk_size=50, child_chunk_overlap=0, num_workers=1)
+    system = make_system(document_processor=processor)
+    assert system.ingest_directory(str(pet_documents))['success']
+
+    metadatas = system.bm25_retriever.document_metadata
+    parent_ids = {metadata['parent_id'] for metadata in metadatas}
+    assert len(parent_ids) < len(metadatas)
+    # Parent texts live in the parent store, once each, not in the chunk metadata
+    assert not any('parent_content' in metadata for metadata in metadatas)
+    assert not any('parent_content' in metadata
+                   for metadata in system.vector_manager.vector_store.export_embeddings()['metadatas'])
+    with open(system.parent_store.path, encoding='utf-8') as f:
+        stored = json.load(f)['parents']
+    assert set(stored) == parent_ids
+    assert system.parent_store.path.endswith(PARENTS_FILE)
+
+    hits = system.bm25_retriever.search("taurine kittens small meals", k=3)
+    taurine = next(hit for hit in hits if "taurine" in hit['content'])
+    parent_text = stored[taurine['metadata']['parent_id']]
+    assert taurine['content'] in parent_text and len(parent_text) > len(taurine['content'])
+
+    siblings = [{'content': text, 'metadata': metadata}
+                for text, metadata in zip(system.bm25_retriever.documents, metadatas)
+                if metadata['parent_id'] == taurine['metadata']['parent_id']]
+    expanded = system._expand_to_parents([taurine] + siblings)
+    assert expanded[0]['content'] == parent_text
+    assert expanded[0]['matched_passage'] == taurine['content']
+    assert [doc['metadata']['parent_id'] for doc in expanded].count(taurine['metadata']['parent_id']) == 1
+
+
+def test_two_stage_retrieval_keeps_the_flat_top_chunks(make_system, tmp_path):
+    directory = tmp_path / "topics"
+    directory.mkdir()
+    for name, text in TOPICS.items():
+        (directory / name).write_text(text, encoding="utf-8")
+    # No fallback to the whole corpus when the selected documents return few hits
+    system = make_system(top_documents=2, partition_min_results=0)
+    assert system.ingest_directory(str(directory))['success']
+
+    for question in QUESTIONS:
+        selected = system._select_documents(question)
+        assert selected is not None and len(selected) == 2
+        document_filter = {'source': {'$in': selected}}
+        flat_bm25, flat_dense, _ = system._hybrid_retrieval(question)
+        staged_bm25, staged_dense, status = system._hybrid_retrieval(question, document_filter)
+        assert not status['fallback']
+        assert {hit['source'] for hit in staged_bm25 + staged_dense} <= set(selected)
+        for flat, staged in ((flat_bm25, staged_bm25), (flat_dense, staged_dense)):
+            assert [hit['metadata']['chunk_id'] for hit in staged[:1]] == \
+                [hit['metadata']['chunk_id'] for hit in flat[:1]]
+
+    recall = system.two_stage_recall(QUESTIONS, k=1)
+    assert (recall['bm25_recall'], recall['dense_recall']) == (1.0, 1.0)
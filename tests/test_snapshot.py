@@ -0,0 +1,57 @@
+"""
+Snapshot save/load round trip and configuration checks
+"""
+import pytest
+
+QUESTIONS = ["how often should I feed my cat", "booster shots for dogs", "brush the coat and trim claws"]
+
+
+def retrieval(system):
+    """Chunk ids and rounded scores of both retrievers for a few questions"""
+    results = []
+    for question in QUESTIONS:
+        bm25_results, dense_results, _ = system._hybrid_retrieval(question)
+        results.append([[(hit['metadata']['chunk_id'], round(hit['score'], 6)) for hit in hits]
+                        for hits in (bm25_results, dense_results)])
+    return results
+
+
+def test_snapshot_round_trip(make_system, pet_documents, tmp_path):
+    source = make_system("snapshot_source")
+    assert source.ingest_directory(str(pet_documents))['success']
+    summary = source.save_snapshot(str(tmp_path / "snapshot"))
+    assert summary['success']
+
+    restored = make_system("snapshot_restored")
+    assert restored.load_snapshot(str(tmp_path / "snapshot"))
+
+    assert restored.bm25_retriever.get_chunk_ids() == source.bm25_retriever.get_chunk_ids()
+    assert retrieval(restored) == retrieval(source)
+    # The copied manifest leaves nothing to re-ingest
+    result = restored.ingest_directory(str(pet_documents))
+    assert (result['files_processed'], result['documents_processed']) == (0, 0)
+
+
+def test_snapshot_with_other_config_is_rejected(make_system, pet_documents, tmp_path):
+    source = make_system("snapshot_source")
+    source.ingest_directory(str(pet_documents))
+    source.save_snapshot(str(tmp_path / "snapshot"))
+
+    other = make_system("snapshot_other")
+    other.document_processor.chunk_size += 100
+
+    assert other.config_fingerprint() != source.config_fingerprint()
+    assert not other.load_snapshot(str(tmp_path / "snapshot"))
+    assert other.bm25_retriever is None
+
+
+def test_fingerprint_records_the_effective_embedding_backend(make_system):
+    system = make_system()
+    if system.vector_manager.vector_store.use_openai:
+        pytest.skip("OPENAI_API_KEY is set, so OpenAI embeddings are actually used")
+    fingerprint = system.config_fingerprint()
+
+    # Asking for OpenAI embeddings without an API key falls back to the local model
+    system.use_openai = True
+
+    assert system.config_fingerprint() == fingerprint
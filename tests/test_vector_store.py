@@ -0,0 +1,53 @@
+"""
+VectorStore ingest embedding
+"""
+import numpy as np
+
+
+class PoolCountingModel:
+    """SentenceTransformer stand-in that records multi-process pool starts and stops"""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.started = 0
+        self.stopped = 0
+
+    def start_multi_process_pool(self, target_devices):
+        self.started += 1
+        return object()
+
+    def stop_multi_process_pool(self, pool):
+        self.stopped += 1
+
+    def encode_multi_process(self, texts, pool, batch_size, chunk_size):
+        return self.embeddings.embed_documents(texts)
+
+
+def test_encode_pool_is_shared_by_batches(make_system):
+    vector_store = make_system().vector_manager.vector_store
+    model = PoolCountingModel(vector_store.base_embeddings)
+    vector_store.base_embeddings.client = model
+    texts = [f"text number {i} about cats" for i in range(10)]
+    expected = vector_store.embed_texts(texts, num_workers=1, batch_size=2)
+
+    # Without a block every multi-process call starts and stops its own pool
+    vector_store.embed_texts(texts, num_workers=2, batch_size=2)
+    assert (model.started, model.stopped) == (1, 1)
+
+    with vector_store.encode_pool():
+        for _ in range(3):
+            embeddings = vector_store.embed_texts(texts, num_workers=2, batch_size=2)
+            assert np.allclose(embeddings, expected)
+        assert (model.started, model.stopped) == (2, 1)
+    assert (model.started, model.stopped) == (2, 2)
+
+
+def test_encode_pool_is_not_started_without_work(make_system):
+    vector_store = make_system().vector_manager.vector_store
+    model = PoolCountingModel(vector_store.base_embeddings)
+    vector_store.base_embeddings.client = model
+
+    with vector_store.encode_pool():
+        vector_store.embed_texts(["one short text"], num_workers=2, batch_size=2)
+
+    assert (model.started, model.stopped) == (0, 0)